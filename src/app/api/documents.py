@@ -0,0 +1,67 @@
+from fastapi import APIRouter, Depends, File, HTTPException, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from pathlib import Path
+
+from src.app.auth import get_current_user
+from src.app.api.ingest import save_uploads
+from src.app.services.compaction import COMPACTOR
+from src.app.services.doc_registry import DocumentRegistry
+from src.app.services.ingest_jobs import INGEST_JOBS, JobQueueFull
+from src.app.services.ingest_service import delete_source
+from src.app.services.registry import get_embedder, get_vector_store
+from src.utils.logger import get_logger
+
+router = APIRouter(prefix="/documents")
+logger = get_logger(__name__)
+
+
+@router.get("")
+def list_documents(user=Depends(get_current_user)):
+    registry = DocumentRegistry()
+    return {
+        "documents": [
+            {"name": Path(key).name, "path": key, "chunks": len(doc["chunks"]), "file_hash": doc["file_hash"]}
+            for key, doc in registry.documents.items()
+        ]
+    }
+
+
+@router.delete("/{name}")
+async def delete_document(name: str, user=Depends(get_current_user)):
+    """Tombstone every chunk of the document (file name or full path, ignoring case); hidden from search at once."""
+    result = await run_in_threadpool(delete_source, name)
+    if not result["documents"] and not result["retired_chunks"]:
+        raise HTTPException(status_code=404, detail=f"No indexed document named '{name}'")
+    logger.info(f"[DOCUMENTS] user={user.get('sub')} deleted {name} ({result['retired_chunks']} chunks)")
+    return result
+
+
+@router.put("/{name}")
+async def replace_document(name: str, file: UploadFile = File(...), user=Depends(get_current_user)):
+    """
+    Upload a new version under `name` and queue its ingestion: unchanged chunks are kept,
+    changed ones re-embedded and the rest tombstoned.
+    """
+    file.filename = Path(name).name
+    paths = await run_in_threadpool(save_uploads, [file])
+    try:
+        job = INGEST_JOBS.submit(paths)
+    except JobQueueFull:
+        raise HTTPException(status_code=503, detail="Ingestion queue full, please retry", headers={"Retry-After": "30"})
+    return {"status": job.status, "job_id": job.id}
+
+
+@router.get("/compaction")
+def compaction_status(user=Depends(get_current_user)):
+    store = get_vector_store()
+    return {
+        **COMPACTOR.status(),
+        "retired": int(len(store.retired)),
+        "garbage_ratio": round(store.garbage_ratio(), 4),
+    }
+
+
+@router.post("/compaction")
+def start_compaction(user=Depends(get_current_user)):
+    started = COMPACTOR.maybe_start(get_embedder().dim, force=True)
+    return {"started": started, **COMPACTOR.status()}
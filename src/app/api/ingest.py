@@ -0,0 +1,52 @@
+from fastapi import APIRouter, Depends, File, HTTPException, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from typing import List
+import shutil
+
+from src.app.auth import get_current_user
+from src.app.services.ingest_jobs import INGEST_JOBS, JobQueueFull
+from src.utils.config import UPLOAD_DIR
+from src.utils.logger import get_logger
+
+router = APIRouter()
+logger = get_logger(__name__)
+
+
+def save_uploads(files: List[UploadFile]) -> List[str]:
+    paths = []
+    for f in files:
+        dest = UPLOAD_DIR / f.filename
+        with open(dest, "wb") as buffer:
+            shutil.copyfileobj(f.file, buffer)
+        paths.append(str(dest))
+    return paths
+
+
+@router.post("/ingest")
+async def ingest(files: List[UploadFile] = File(...), user=Depends(get_current_user)):
+    """Save the uploads and queue an ingestion job; poll /ingest/{job_id} for progress."""
+    # file copies and ingestion both stay off the event loop
+    paths = await run_in_threadpool(save_uploads, files)
+    try:
+        job = INGEST_JOBS.submit(paths)
+    except JobQueueFull:
+        raise HTTPException(status_code=503, detail="Ingestion queue full, please retry", headers={"Retry-After": "30"})
+    logger.info(f"[INGEST] user={user.get('sub')} job={job.id} files={len(paths)}")
+    return {"status": job.status, "job_id": job.id}
+
+
+@router.get("/ingest/{job_id}")
+def ingest_status(job_id: str, user=Depends(get_current_user)):
+    job = INGEST_JOBS.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown ingestion job")
+    return job.to_dict()
+
+
+@router.delete("/ingest/{job_id}")
+def cancel_ingest(job_id: str, user=Depends(get_current_user)):
+    """Queued jobs are dropped; a running job stops after its current batch (resumable later)."""
+    job = INGEST_JOBS.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown ingestion job")
+    return job.to_dict()
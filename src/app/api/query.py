@@ -1,14 +1,32 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool, iterate_in_threadpool
+from fastapi.responses import StreamingResponse
 from src.app.services.embedder import Embedder
-from src.app.services.vector_store import FaissStore
-from src.app.services.llm_client import LLMClient
+from src.app.services.llm_client import GenerationCancelled
 from src.app.services.reranker import CrossEncoderReranker
+from src.app.services.cascade import CASCADE
+from src.app.services import metrics
+from src.app.services.registry import get_embedder, get_reranker, get_vector_store
+from src.app.services.scheduler import InferenceScheduler, QueueFullError, QueueTimeout, get_scheduler
 from src.app.auth import get_current_user
 from src.app.services.cache import SEARCH_CACHE
+from src.app.services.answer_cache import ANSWER_CACHE
+from src.app.services.filters import SearchFilter, make_filter
+from src.utils.config import (
+    BATCH_MAX_QUERIES, RETRIEVAL_K, CONTEXT_RERANK_MIN_SCORE, CONTEXT_RERANK_MARGIN,
+    CONTEXT_MIN_SIMILARITY, CONTEXT_RELATIVE_SCORE,
+)
 from src.utils.logger import get_logger
+from pydantic import BaseModel
+from typing import List, Optional
+from contextlib import contextmanager
+import asyncio
 import re
 import html
+import json
+import threading
 import time
+import numpy as np
 
 router = APIRouter()
 logger = get_logger(__name__)
@@ -23,18 +41,9 @@ def is_greeting(text: str) -> bool:
     return any(t == g or t.startswith(g + " ") for g in GREETING_KEYWORDS)
 
 # ---- NEW: improved prompt template ----
-LLM_PROMPT_TEMPLATE = """You are an enterprise knowledge assistant. Use ONLY the information in the Context to answer the Question.
-
-INSTRUCTIONS:
-- Read the Context and then answer the Question directly in your own words.
-- Keep the answer concise, factual, and actionable (1-6 sentences).
-- If the context doesn't contain enough information to answer, respond exactly: "I don't know."
-- Do NOT repeat sentences verbatim from the Context (no copy-paste).
-- Do NOT output HTML, XML, or any markup.
-- Do NOT hallucinate or invent facts.
-- If multiple context parts have relevant details, combine them into a short direct answer.
-
-Context:
+# Only the per-request part; the fixed instructions live in llm_client.PROMPT_PREFIX
+# so their KV cache can be evaluated once and reused.
+LLM_PROMPT_TEMPLATE = """Context:
 {context}
 
 Question:
@@ -69,14 +78,241 @@ def choose_sources(chunks):
             sources.append(fname)
     return sources
 
+GREETING_ANSWER = "Hello! I'm your enterprise knowledge assistant. How can I help you today?"
+
+
+def build_candidates(faiss_hits):
+    """Step 3: candidate list with basic filtering."""
+    candidates = []
+    for h in faiss_hits:
+        text = (h.get("text") or "").strip()
+        if not text or len(text) < 40:
+            continue
+        candidate = {
+            "id": h.get("id"),
+            "text": text,
+            "meta": h.get("meta", {}),
+            "faiss_score": float(h.get("score", 0.0))
+        }
+        if "fused" in h:
+            candidate["fused_score"] = float(h["fused"])   # RRF score: the retrieval order in hybrid mode
+        candidates.append(candidate)
+    return candidates
+
+
+def select_context(reranked, candidates):
+    """Steps 5-8: threshold, dedupe and truncate reranked chunks into (top_chunks, context)."""
+    # 5) dynamic score thresholding to remove weakly relevant chunks
+    if reranked and "rerank_score" in reranked[0]:
+        # cross-encoder logits (unscored tail drops out): absolute floor and a margin below the best
+        scores = [c.get("rerank_score", float("-inf")) for c in reranked]
+        threshold = max(CONTEXT_RERANK_MIN_SCORE, max(scores) - CONTEXT_RERANK_MARGIN)
+    else:
+        # reranking skipped: the score that ordered the list, RRF for hybrid hits, else dense cosine
+        fused = bool(reranked) and all("fused_score" in c for c in reranked)
+        scores = [c["fused_score"] if fused else c.get("faiss_score", 0.0) for c in reranked]
+        top_score = max(scores) if reranked else 0.0
+        threshold = max(0.0 if fused else CONTEXT_MIN_SIMILARITY, CONTEXT_RELATIVE_SCORE * top_score)
+    filtered = [c for c, s in zip(reranked, scores) if s >= threshold]
+
+    if not filtered:
+        # fallback to top 2 from reranked if filtering removed everything
+        filtered = reranked[:2]
+
+    # 6) deduplicate very similar chunks (exact-text dedupe)
+    unique_texts = set()
+    unique_chunks = []
+    for c in filtered:
+        t = clean_text_for_model(c.get("text", ""))
+        # simple dedupe by exact text; could add fuzzy dedupe later
+        if t and t not in unique_texts:
+            unique_texts.add(t)
+            unique_chunks.append({**c, "clean_text": t})
+
+    # 7) take the top N (small) high quality chunks to form context
+    # keep max 2-3 high quality chunks to avoid noise
+    TOP_K = 3
+    top_chunks = unique_chunks[:TOP_K]
+
+    # if still empty, fallback to best FAISS hits
+    if not top_chunks and candidates:
+        top_chunks = [{"clean_text": clean_text_for_model(c["text"]), "meta": c.get("meta", {})} for c in candidates[:2]]
+
+    # 8) build context (sanitize and truncate)
+    context_parts = []
+    for c in top_chunks:
+        txt = c.get("clean_text") or clean_text_for_model(c.get("text", ""))
+        # truncate each chunk to a safe length (e.g., 1500 chars) to keep prompt length reasonable
+        if len(txt) > 1500:
+            txt = txt[:1500]
+        context_parts.append(txt)
+    context = "\n\n".join(context_parts)
+    if len(context) > 4500:
+        context = context[:4500]  # safety truncation
+
+    logger.debug("Context sent to LLM:\n%s", context)
+    return top_chunks, context
+
+
+def retrieve_context(q: str, embedder: Embedder, reranker: CrossEncoderReranker, flt: Optional[SearchFilter] = None):
+    """
+    Retrieval half of the pipeline (embed -> FAISS -> rerank -> threshold -> dedupe).
+    `flt` restricts the FAISS search itself to some documents / pages.
+    Returns (top_chunks, context); top_chunks is empty when nothing usable was found.
+    """
+    # 1) embed query
+    q_emb = embedder.embed_query(q)
+
+    # 2) FAISS search (with cache, keyed by content version so new ingests and deletes are visible)
+    store = get_vector_store()
+    # request a few more candidates to give reranker options
+    cache_key = f"search::{store.content_version}::{flt.key() if flt else ''}::{q}"
+    faiss_hits = SEARCH_CACHE.get_or_compute(cache_key, lambda: store.search(q_emb, k=RETRIEVAL_K, flt=flt, query_text=q)[0])
+
+    # 3) build candidate list with basic filtering
+    candidates = build_candidates(faiss_hits)
+    if not candidates:
+        logger.info("No valid candidates found")
+        return [], ""
+
+    # 4) rerank none, the head or all candidates depending on how decisive FAISS was
+    reranked, _ = CASCADE.rerank(reranker, q, candidates)
+
+    return select_context(reranked, candidates)
+
+
+def retrieve_contexts_batch(queries: List[str], q_embs: np.ndarray, reranker: CrossEncoderReranker, flt: Optional[SearchFilter] = None):
+    """
+    Batched retrieval: one FAISS (+ BM25) search over the (N, d) query matrix, one hydration pass
+    and one cross-encoder pass over the (query, chunk) pairs the cascade selects.
+    Returns [(top_chunks, context)] aligned with `queries`.
+    """
+    store = get_vector_store()
+    all_hits = store.search(q_embs, k=RETRIEVAL_K, flt=flt, query_text=queries)
+    all_candidates = [build_candidates(hits) for hits in all_hits]
+
+    with_candidates = [i for i, c in enumerate(all_candidates) if c]
+    reranked = [ranked for ranked, _ in CASCADE.rerank_batch(
+        reranker,
+        [queries[i] for i in with_candidates],
+        [all_candidates[i] for i in with_candidates],
+    )]
+
+    results = [([], "")] * len(queries)
+    for i, ranked in zip(with_candidates, reranked):
+        results[i] = select_context(ranked, all_candidates[i])
+    return results
+
+
+def finalize_answer(raw_answer: str):
+    """Final sanitization & quality checks; returns None for low quality answers."""
+    answer = (raw_answer or "").strip()
+    # remove any stray tags or angle brackets as extra safety
+    answer = re.sub(r"<[^>]+>", "", answer)
+    answer = answer.replace("&lt;", "").replace("&gt;", "")
+    answer = " ".join(answer.split())
+
+    # Reject answers that are clearly placeholders or too short / vague
+    if not answer or len(answer) < 15 or answer.lower().startswith("i don't know") or "the context" in answer.lower():
+        return None
+    return answer
+
+
+# ---- LLM slot handling ----
+@contextmanager
+def llm_slot(scheduler: InferenceScheduler, cancel_event: threading.Event):
+    """Scheduler slot with queue/deadline failures mapped to HTTP errors."""
+    try:
+        with scheduler.slot(cancel_event) as lease:
+            yield lease
+    except QueueFullError:
+        raise HTTPException(status_code=503, detail="Server busy, please retry", headers={"Retry-After": "5"})
+    except QueueTimeout:
+        raise HTTPException(status_code=503, detail="Timed out waiting for the model", headers={"Retry-After": "5"})
+    except GenerationCancelled:
+        if cancel_event.is_set():
+            raise HTTPException(status_code=499, detail="Client closed request")
+        raise HTTPException(status_code=504, detail="Generation deadline exceeded")
+
+
+async def run_until_disconnected(request: Request, cancel_event: threading.Event, fn, *args):
+    """Run a blocking pipeline in the threadpool; set cancel_event if the client goes away."""
+    task = asyncio.ensure_future(run_in_threadpool(fn, *args))
+    while True:
+        done, _ = await asyncio.wait({task}, timeout=0.25)
+        if done:
+            return task.result()
+        if not cancel_event.is_set() and await request.is_disconnected():
+            logger.info("Client disconnected, cancelling request")
+            cancel_event.set()
+
+
+def answer_query(q: str, embedder, reranker, scheduler: InferenceScheduler, cancel_event: threading.Event, flt: Optional[SearchFilter] = None):
+    """Blocking /chat pipeline (steps 1-11)."""
+    # quick greeting shortcut
+    if is_greeting(q):
+        return {"query": q, "answer": GREETING_ANSWER, "sources": []}
+
+    # 0) semantic answer cache: paraphrases of answered questions skip rerank + LLM
+    # (answers are cached for the whole corpus, so filtered questions bypass it)
+    q_emb = embedder.embed_query(q)
+    version = get_vector_store().content_version
+    hit = ANSWER_CACHE.lookup(q_emb, version) if flt is None else None
+    if hit:
+        logger.info(f"Answer cache hit (similarity={hit['similarity']:.3f}, cached query='{hit['query']}')")
+        return {"query": q, "answer": hit["answer"], "sources": hit["sources"], "cached": True}
+
+    # 1-8) retrieval + context
+    top_chunks, context = retrieve_context(q, embedder, reranker, flt)
+    if not top_chunks:
+        return {"query": q, "answer": "I don't know.", "sources": []}
+
+    # 9) build final prompt and call LLM (through the scheduler)
+    prompt = LLM_PROMPT_TEMPLATE.format(context=context, question=q)
+
+    with llm_slot(scheduler, cancel_event) as lease:
+        raw_answer = lease.llm.generate(prompt, should_stop=lease.should_stop)  # returns cleaned plain text per LLMClient contract
+
+    # 10) final sanitization & quality checks
+    answer = finalize_answer(raw_answer)
+    if answer is None:
+        logger.info("LLM output was low quality or insufficient, returning fallback")
+        return {"query": q, "answer": "I don't know.", "sources": choose_sources(top_chunks)}
+
+    # 11) return sources (filename only)
+    sources = choose_sources(top_chunks)
+    if flt is None:
+        ANSWER_CACHE.store(q_emb, q, answer, sources, version)
+
+    return {
+        "query": q,
+        "answer": answer,
+        "sources": sources
+    }
+
+
 @router.get("/chat")
-def chat(q: str, user=Depends(get_current_user)):
+async def chat(
+    request: Request,
+    q: str,
+    source: Optional[List[str]] = Query(None),
+    page_from: Optional[int] = None,
+    page_to: Optional[int] = None,
+    timings: bool = False,
+    user=Depends(get_current_user),
+    embedder: Embedder = Depends(get_embedder),
+    reranker: CrossEncoderReranker = Depends(get_reranker),
+    scheduler: InferenceScheduler = Depends(get_scheduler),
+):
     """
     Improved chat endpoint with:
     - better prompt
     - score thresholding + deduplication
     - tightened context size (small, high-quality)
     - final answer validation
+    - bounded LLM queue (503 when full) and cancellation on client disconnect
+    - optional `source` (repeatable) / `page_from` / `page_to` filters applied inside the FAISS search
+    - `timings=true` adds the time spent per pipeline stage and the LLM token counts
     """
     start_time = time.time()
     try:
@@ -85,123 +321,228 @@ def chat(q: str, user=Depends(get_current_user)):
         q = q.strip()
         logger.info(f"[CHAT] user={user.get('username')} query={q}")
 
-        # quick greeting shortcut
-        if is_greeting(q):
-            return {"query": q, "answer": "Hello! I'm your enterprise knowledge assistant. How can I help you today?", "sources": []}
+        cancel_event = threading.Event()
+        spent = {} if timings else None
+        result = await run_until_disconnected(
+            request, cancel_event, metrics.collected(answer_query, spent), q, embedder, reranker, scheduler, cancel_event,
+            make_filter(source, page_from, page_to),
+        )
 
-        # 1) embed query
-        embedder = Embedder()
-        q_emb = embedder.embed_query(q)
-        dim = len(q_emb)
-
-        # 2) FAISS search (with cache)
-        cache_key = f"search::{q}"
-        cached = SEARCH_CACHE.get(cache_key)
-        if cached:
-            logger.info("Cache hit for search")
-            faiss_hits = cached
+        elapsed = time.time() - start_time
+        logger.info(f"[SUCCESS] Answered query in {elapsed:.2f}s - query='{q}'")
+        if spent is not None:
+            result = {**result, "timings": {**metrics.breakdown(spent), "total": round(elapsed, 4)}}
+        return result
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        elapsed = time.time() - start_time
+        logger.error(f"[ERROR] chat failed after {elapsed:.2f}s: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
+
+
+# ---- Batch chat ----
+class BatchChatRequest(BaseModel):
+    queries: List[str]
+    sources: Optional[List[str]] = None   # restrict every query to these documents
+    page_from: Optional[int] = None
+    page_to: Optional[int] = None
+    timings: bool = False   # per-stage time summed over the batch
+
+
+def answer_queries_batch(queries: List[str], embedder, reranker, scheduler: InferenceScheduler, cancel_event: threading.Event, flt: Optional[SearchFilter] = None):
+    """Batched /chat pipeline: shared embedding/FAISS/rerank pass, then one LLM call per query."""
+    results = [None] * len(queries)
+    pending = []
+    for i, q in enumerate(queries):
+        if not q:
+            results[i] = {"query": q, "answer": "I don't know.", "sources": []}
+        elif is_greeting(q):
+            results[i] = {"query": q, "answer": GREETING_ANSWER, "sources": []}
+        else:
+            pending.append(i)
+    if not pending:
+        return results
+
+    # 0-1) embed all queries at once, then answer cache
+    q_embs = embedder.embed_queries([queries[i] for i in pending])
+    version = get_vector_store().content_version
+    to_retrieve = []
+    for row, i in enumerate(pending):
+        hit = ANSWER_CACHE.lookup(q_embs[row], version) if flt is None else None
+        if hit:
+            results[i] = {"query": queries[i], "answer": hit["answer"], "sources": hit["sources"], "cached": True}
         else:
-            store = FaissStore(dim)
-            # request a few more candidates to give reranker options
-            results = store.search(q_emb, k=20)
-            faiss_hits = results[0]
-            SEARCH_CACHE.set(cache_key, faiss_hits)
-
-        # 3) build candidate list with basic filtering
-        candidates = []
-        for h in faiss_hits:
-            text = (h.get("text") or "").strip()
-            if not text or len(text) < 40:
-                continue
-            candidates.append({
-                "id": h.get("id"),
-                "text": text,
-                "meta": h.get("meta", {}),
-                "faiss_score": float(h.get("score", 0.0))
-            })
-
-        if not candidates:
-            logger.info("No valid candidates found")
-            return {"query": q, "answer": "I don't know.", "sources": []}
-
-        # 4) rerank using cross-encoder
-        reranker = CrossEncoderReranker()
-        reranked = reranker.rerank(q, candidates)  # expected: list of dicts with 'text' and 'score' keys
-
-        # 5) dynamic score thresholding to remove weakly relevant chunks
-        # compute top_score and keep chunks >= fraction of top_score
-        top_score = max([c.get("score", 0.0) for c in reranked]) if reranked else 0.0
-        threshold = max(0.10, 0.45 * top_score)  # keep this tunable
-        filtered = [c for c in reranked if c.get("score", 0.0) >= threshold]
-
-        if not filtered:
-            # fallback to top 2 from reranked if filtering removed everything
-            filtered = reranked[:2]
-
-        # 6) deduplicate very similar chunks (exact-text dedupe)
-        unique_texts = set()
-        unique_chunks = []
-        for c in filtered:
-            t = clean_text_for_model(c.get("text", ""))
-            # simple dedupe by exact text; could add fuzzy dedupe later
-            if t and t not in unique_texts:
-                unique_texts.add(t)
-                unique_chunks.append({**c, "clean_text": t})
-
-        # 7) take the top N (small) high quality chunks to form context
-        # keep max 2-3 high quality chunks to avoid noise
-        TOP_K = 3
-        top_chunks = unique_chunks[:TOP_K]
-
-        # if still empty, fallback to best FAISS hits
-        if not top_chunks and candidates:
-            top_chunks = [{"clean_text": clean_text_for_model(c["text"]), "meta": c.get("meta", {})} for c in candidates[:2]]
-
-        # 8) build context (sanitize and truncate)
-        context_parts = []
-        for c in top_chunks:
-            txt = c.get("clean_text") or clean_text_for_model(c.get("text", ""))
-            # truncate each chunk to a safe length (e.g., 1500 chars) to keep prompt length reasonable
-            if len(txt) > 1500:
-                txt = txt[:1500]
-            context_parts.append(txt)
-        context = "\n\n".join(context_parts)
-        if len(context) > 4500:
-            context = context[:4500]  # safety truncation
-
-        logger.debug("Context sent to LLM:\n%s", context)
-
-        # 9) build final prompt and call LLM
+            to_retrieve.append((row, i))
+    if not to_retrieve:
+        return results
+
+    # 2-8) batched retrieval
+    rows = [row for row, _ in to_retrieve]
+    contexts = retrieve_contexts_batch([queries[i] for _, i in to_retrieve], q_embs[rows], reranker, flt)
+
+    # 9-11) generation, one scheduler slot per query
+    for (row, i), (top_chunks, context) in zip(to_retrieve, contexts):
+        q = queries[i]
+        if not top_chunks:
+            results[i] = {"query": q, "answer": "I don't know.", "sources": []}
+            continue
         prompt = LLM_PROMPT_TEMPLATE.format(context=context, question=q)
+        with llm_slot(scheduler, cancel_event) as lease:
+            raw_answer = lease.llm.generate(prompt, should_stop=lease.should_stop)
+        answer = finalize_answer(raw_answer)
+        sources = choose_sources(top_chunks)
+        if answer is None:
+            results[i] = {"query": q, "answer": "I don't know.", "sources": sources}
+            continue
+        if flt is None:
+            ANSWER_CACHE.store(q_embs[row], q, answer, sources, version)
+        results[i] = {"query": q, "answer": answer, "sources": sources}
+    return results
+
+
+@router.post("/chat/batch")
+async def chat_batch(
+    request: Request,
+    body: BatchChatRequest,
+    user=Depends(get_current_user),
+    embedder: Embedder = Depends(get_embedder),
+    reranker: CrossEncoderReranker = Depends(get_reranker),
+    scheduler: InferenceScheduler = Depends(get_scheduler),
+):
+    """Answer N queries with one embedding, FAISS and rerank pass (offline / bulk use)."""
+    if not body.queries:
+        raise HTTPException(status_code=400, detail="queries cannot be empty")
+    if len(body.queries) > BATCH_MAX_QUERIES:
+        raise HTTPException(status_code=400, detail=f"At most {BATCH_MAX_QUERIES} queries per batch")
+    queries = [(q or "").strip() for q in body.queries]
+
+    start_time = time.time()
+    try:
+        cancel_event = threading.Event()
+        spent = {} if body.timings else None
+        results = await run_until_disconnected(
+            request, cancel_event, metrics.collected(answer_queries_batch, spent), queries, embedder, reranker, scheduler, cancel_event,
+            make_filter(body.sources, body.page_from, body.page_to),
+        )
+        elapsed = time.time() - start_time
+        logger.info(f"[SUCCESS] Answered {len(queries)} batched queries in {elapsed:.2f}s")
+        if spent is not None:
+            return {"results": results, "timings": {**metrics.breakdown(spent), "total": round(elapsed, 4)}}
+        return {"results": results}
+    except HTTPException:
+        raise
+    except Exception as e:
+        elapsed = time.time() - start_time
+        logger.error(f"[ERROR] chat batch failed after {elapsed:.2f}s: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
+
 
-        llm = LLMClient()
-        raw_answer = llm.generate(prompt)  # returns cleaned plain text per LLMClient contract
+# ---- Streaming chat (Server-Sent Events) ----
+def sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
 
-        # 10) final sanitization & quality checks
-        answer = (raw_answer or "").strip()
-        # remove any stray tags or angle brackets as extra safety
-        answer = re.sub(r"<[^>]+>", "", answer)
-        answer = answer.replace("&lt;", "").replace("&gt;", "")
-        answer = " ".join(answer.split())
 
-        # Reject answers that are clearly placeholders or too short / vague
-        if not answer or len(answer) < 15 or answer.lower().startswith("i don't know") or "the context" in answer.lower():
-            logger.info("LLM output was low quality or insufficient, returning fallback")
-            return {"query": q, "answer": "I don't know.", "sources": choose_sources(top_chunks)}
+def stream_query(q: str, embedder, reranker, scheduler: InferenceScheduler, cancel_event: threading.Event, flt: Optional[SearchFilter] = None):
+    """Blocking SSE event generator for /chat/stream."""
+    start_time = time.time()
+    ttft = None
+    try:
+        if is_greeting(q):
+            yield sse_event("sources", {"sources": []})
+            yield sse_event("done", {"answer": GREETING_ANSWER, "sources": []})
+            return
 
-        # 11) return sources (filename only)
+        q_emb = embedder.embed_query(q)
+        version = get_vector_store().content_version
+        hit = ANSWER_CACHE.lookup(q_emb, version) if flt is None else None
+        if hit:
+            logger.info(f"Answer cache hit (similarity={hit['similarity']:.3f}, cached query='{hit['query']}')")
+            yield sse_event("sources", {"sources": hit["sources"]})
+            yield sse_event("token", {"text": hit["answer"]})
+            yield sse_event("done", {"answer": hit["answer"], "sources": hit["sources"], "cached": True,
+                                     "ttft": round(time.time() - start_time, 3)})
+            return
+
+        top_chunks, context = retrieve_context(q, embedder, reranker, flt)
         sources = choose_sources(top_chunks)
+        yield sse_event("sources", {"sources": sources, "retrieval_time": round(time.time() - start_time, 3)})
+        if not top_chunks:
+            yield sse_event("done", {"answer": "I don't know.", "sources": []})
+            return
 
+        prompt = LLM_PROMPT_TEMPLATE.format(context=context, question=q)
+        raw_answer = ""
+        with llm_slot(scheduler, cancel_event) as lease:
+            for kind, text in lease.llm.stream(prompt, should_stop=lease.should_stop):
+                if kind == "final":
+                    raw_answer = text
+                    continue
+                if kind == "token" and ttft is None:
+                    ttft = time.time() - start_time
+                yield sse_event(kind, {"text": text})
+
+        answer = finalize_answer(raw_answer)
+        if answer is None:
+            answer = "I don't know."
+        elif flt is None:
+            ANSWER_CACHE.store(q_emb, q, answer, sources, version)
         elapsed = time.time() - start_time
-        logger.info(f"[SUCCESS] Answered query in {elapsed:.2f}s - query='{q}'")
-
-        return {
-            "query": q,
+        logger.info(f"[SUCCESS] Streamed answer in {elapsed:.2f}s (ttft={ttft if ttft is None else round(ttft, 2)}s) - query='{q}'")
+        yield sse_event("done", {
             "answer": answer,
-            "sources": sources
-        }
-
+            "sources": sources,
+            "ttft": None if ttft is None else round(ttft, 3),
+            "elapsed": round(elapsed, 3),
+            **lease.timings(),
+        })
+    except HTTPException as e:
+        yield sse_event("error", {"status": e.status_code, "detail": e.detail})
     except Exception as e:
         elapsed = time.time() - start_time
-        logger.error(f"[ERROR] chat failed after {elapsed:.2f}s: {e}", exc_info=True)
-        raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
+        logger.error(f"[ERROR] chat stream failed after {elapsed:.2f}s: {e}", exc_info=True)
+        yield sse_event("error", {"status": 500, "detail": f"An error occurred: {str(e)}"})
+
+
+@router.get("/chat/stream")
+def chat_stream(
+    request: Request,
+    q: str,
+    source: Optional[List[str]] = Query(None),
+    page_from: Optional[int] = None,
+    page_to: Optional[int] = None,
+    user=Depends(get_current_user),
+    embedder: Embedder = Depends(get_embedder),
+    reranker: CrossEncoderReranker = Depends(get_reranker),
+    scheduler: InferenceScheduler = Depends(get_scheduler),
+):
+    """
+    Same pipeline as /chat, streamed as SSE:
+    `sources` right after retrieval, `token` per cleaned text delta (`reset` if the model
+    revealed a late reasoning block), then `done` with the validated answer and timings.
+    """
+    if not q or not q.strip():
+        raise HTTPException(status_code=400, detail="Query cannot be empty")
+    q = q.strip()
+    logger.info(f"[CHAT-STREAM] user={user.get('username')} query={q}")
+
+    cancel_event = threading.Event()
+    flt = make_filter(source, page_from, page_to)
+
+    async def events():
+        try:
+            async for item in iterate_in_threadpool(stream_query(q, embedder, reranker, scheduler, cancel_event, flt)):
+                if await request.is_disconnected():
+                    logger.info("Client disconnected, cancelling stream")
+                    break
+                yield item
+        finally:
+            # stops a queued or generating request at its next check
+            cancel_event.set()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
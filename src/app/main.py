@@ -1,20 +1,32 @@
-from fastapi import FastAPI, UploadFile, File
-from pathlib import Path
-from typing import List
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import PlainTextResponse
+from typing import List, Optional
 
-from src.app.services.ingest_service import ingest_paths
 from src.app.services.embedder import Embedder
-from src.app.services.vector_store import FaissStore
-from src.utils.config import DATA_DIR
+from src.app.services.vector_store import FaissStore, STORE
+from src.app.services import metrics
+from src.app.services.registry import MODELS, get_embedder, get_vector_store
+from src.app.services.scheduler import SCHEDULER
+from src.app.services.cache import EMBED_CACHE, SEARCH_CACHE, RERANK_CACHE
+from src.app.services.answer_cache import ANSWER_CACHE
+from src.app.services.cascade import CASCADE
+from src.app.services.filters import make_filter
+from src.app.services.ingest_jobs import INGEST_JOBS
+from src.app.services.compaction import COMPACTOR, MERGER
+from src.app.services.shards import ROUTER
+from src.utils.config import BATCH_MAX_QUERIES
+from pydantic import BaseModel
 from src.app.api.query import router as chat_router
+from src.app.api.ingest import router as ingest_router
+from src.app.api.documents import router as documents_router
 from src.utils.logger import get_logger
 from fastapi import Depends
-from src.app.auth import get_current_user
 from src.app.auth_routes import router as auth_router
 
 
-import shutil
 import os
+import threading
+import time
 
 logger = get_logger(__name__)
 logger.info("Starting FastAPI app")
@@ -23,29 +35,163 @@ app = FastAPI()
 
 app.include_router(auth_router)
 app.include_router(chat_router)
+app.include_router(ingest_router)
+app.include_router(documents_router)
 
-UPLOAD_DIR = DATA_DIR / "uploads"
-UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
 
-@app.post("/ingest")
-async def ingest(files: List[UploadFile] = File(...),user=Depends(get_current_user)):
-    paths = []
-    for f in files:
-        dest = UPLOAD_DIR / f.filename
-        with open(dest, "wb") as buffer:
-            shutil.copyfileobj(f.file, buffer)
-        paths.append(str(dest))
+@app.middleware("http")
+async def request_latency(request: Request, call_next):
+    t0 = time.perf_counter()
+    response = await call_next(request)
+    # route template, so /documents/{name} is one series; unmatched paths are not recorded
+    route = request.scope.get("route")
+    if route is not None:
+        metrics.REQUEST_SECONDS.observe(time.perf_counter() - t0, route.path)
+    return response
 
-    result = ingest_paths(paths)
-    return {"status": "ok", "result": result}
+
+@app.on_event("startup")
+def warm_up_models():
+    # load models and the resident index once per process;
+    # liveness answers immediately, readiness flips when the models are loaded
+    # (and every shard worker answers, when sharding is on)
+    def _warm():
+        MODELS.warm_up()
+        if not MODELS.is_ready():
+            return
+        if ROUTER is not None:
+            ROUTER.wait_ready(get_embedder().dim)   # shard workers load their segments, not this process
+        else:
+            get_vector_store()
+
+    threading.Thread(target=_warm, name="warmup", daemon=True).start()
+
+
+@app.get("/health/live")
+def live():
+    return {"status": "alive", "uptime": MODELS.status()["uptime"]}
+
+
+@app.get("/health/ready")
+def ready():
+    status = {**MODELS.status(), "scheduler": SCHEDULER.stats()}
+    if ROUTER is not None:
+        status["shards_ready"] = ROUTER.is_ready()
+    if not MODELS.is_ready() or not status.get("shards_ready", True):
+        raise HTTPException(status_code=503, detail=status)
+    return status
+
+@app.get("/stats")
+def stats():
+    return {
+        "pid": os.getpid(),   # each worker of `python -m src.app.serve` reports its own stats
+        "embedder": get_embedder().stats() if MODELS.is_loaded("embedder") else None,
+        "caches": [EMBED_CACHE.stats(), SEARCH_CACHE.stats(), RERANK_CACHE.stats()],
+        "answer_cache": ANSWER_CACHE.stats(),
+        "rerank_cascade": CASCADE.stats(),
+        "scheduler": SCHEDULER.stats(),
+        "ingest_jobs": INGEST_JOBS.stats(),
+        "compaction": COMPACTOR.status(),
+        "segment_merge": MERGER.status(),
+        "shards": ROUTER.stats() if ROUTER is not None else None,
+    }
+
+def metric_families():
+    """Gauges and counters read from the services' own stats at scrape time."""
+    caches = [EMBED_CACHE.stats(), SEARCH_CACHE.stats(), RERANK_CACHE.stats()]
+    answers = ANSWER_CACHE.stats()
+    lookups = answers["hits"] + answers["misses"]
+    scheduler = SCHEDULER.stats()
+    ingest = INGEST_JOBS.stats()
+    families = [
+        ("rag_cache_hit_ratio", "gauge", "Hit ratio per cache",
+         [({"cache": c["name"]}, c["hit_ratio"]) for c in caches]
+         + [({"cache": "answer"}, round(answers["hits"] / lookups, 4) if lookups else 0.0)]),
+        ("rag_cache_hits_total", "counter", "Cache hits",
+         [({"cache": c["name"]}, c["hits"]) for c in caches] + [({"cache": "answer"}, answers["hits"])]),
+        ("rag_cache_misses_total", "counter", "Cache misses",
+         [({"cache": c["name"]}, c["misses"]) for c in caches] + [({"cache": "answer"}, answers["misses"])]),
+        ("rag_cache_bytes", "gauge", "Estimated bytes held per cache", [({"cache": c["name"]}, c["bytes"]) for c in caches]),
+        ("rag_llm_queue_depth", "gauge", "Requests waiting for an LLM slot", [({}, scheduler["queued"])]),
+        ("rag_llm_slots_busy", "gauge", "LLM slots generating", [({}, scheduler["busy"])]),
+        ("rag_llm_requests_total", "counter", "LLM requests by outcome",
+         [({"outcome": key}, scheduler[key]) for key in ("completed", "rejected", "timed_out", "cancelled")]),
+        ("rag_ingest_queue_depth", "gauge", "Ingestion jobs waiting", [({}, ingest["queued"])]),
+        ("rag_ingest_jobs_running", "gauge", "Ingestion jobs running", [({}, ingest["running"])]),
+    ]
+    if MODELS.is_loaded("embedder"):
+        families.append(("rag_embed_queue_depth", "gauge", "Queries waiting for the embedding batcher",
+                         [({}, get_embedder().batcher.depth())]))
+    store = STORE.current()
+    if store is not None:
+        families += [
+            ("rag_index_vectors", "gauge", "Vectors in the resident index", [({}, store.index.ntotal)]),
+            ("rag_index_live_vectors", "gauge", "Vectors not deleted or replaced", [({}, store.index.ntotal - len(store.retired))]),
+            ("rag_index_segments", "gauge", "Index segments", [({}, len(store.index.segments))]),
+            ("rag_index_bytes", "gauge", "Size of the index segment files", [({}, store.index.file_bytes())]),
+            ("rag_index_generation", "gauge", "Published index generation in use", [({}, store.generation)]),
+        ]
+    if ROUTER is not None:
+        shards = ROUTER.stats()
+        families += [
+            ("rag_shard_failures_total", "counter", "Failed shard searches", [({"shard": str(i)}, n) for i, n in enumerate(shards["failures"])]),
+            ("rag_shard_timeouts_total", "counter", "Shard searches past SHARD_TIMEOUT", [({"shard": str(i)}, n) for i, n in enumerate(shards["timeouts"])]),
+            ("rag_shard_partial_results_total", "counter", "Searches answered by only some shards", [({}, shards["partial"])]),
+        ]
+    return families
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    """Prometheus text format; values are per worker process."""
+    return PlainTextResponse(metrics.render(metric_families()), media_type="text/plain; version=0.0.4")
 
 @app.get("/search")
-def search(q: str, k: int = 5):
-    embedder = Embedder()
-    q_emb = embedder.embed_query(q)
+def search(
+    q: str,
+    k: int = 5,
+    nprobe: Optional[int] = None,
+    ef_search: Optional[int] = None,
+    source: Optional[List[str]] = Query(None),   # repeatable: only these documents (path or file name)
+    page_from: Optional[int] = None,
+    page_to: Optional[int] = None,
+    timings: bool = False,   # add a per-stage timing breakdown to the response
+    embedder: Embedder = Depends(get_embedder),
+    store: FaissStore = Depends(get_vector_store),
+):
+    with metrics.collect() as spent:
+        q_emb = embedder.embed_query(q)
+        results = store.search(q_emb, k, nprobe=nprobe, ef_search=ef_search, flt=make_filter(source, page_from, page_to), query_text=q)
+
+    response = {"query": q, "results": results}
+    if timings:
+        response["timings"] = metrics.breakdown(spent)
+    return response
+
+
+class BatchSearchRequest(BaseModel):
+    queries: List[str]
+    k: int = 5
+    nprobe: Optional[int] = None      # IVF lists to scan (ivf_flat / ivf_pq)
+    ef_search: Optional[int] = None   # HNSW search breadth
+    sources: Optional[List[str]] = None   # only these documents (path or file name)
+    page_from: Optional[int] = None
+    page_to: Optional[int] = None
+
 
-    dim = len(q_emb)
-    store = FaissStore(dim)
-    results = store.search(q_emb, k)
+@app.post("/search/batch")
+def search_batch(
+    body: BatchSearchRequest,
+    embedder: Embedder = Depends(get_embedder),
+    store: FaissStore = Depends(get_vector_store),
+):
+    """N queries -> one encode call, one FAISS search over the (N, d) matrix, one hydration pass."""
+    if not body.queries:
+        raise HTTPException(status_code=400, detail="queries cannot be empty")
+    if len(body.queries) > BATCH_MAX_QUERIES:
+        raise HTTPException(status_code=400, detail=f"At most {BATCH_MAX_QUERIES} queries per batch")
 
-    return {"query": q, "results": results}
+    q_embs = embedder.embed_queries(body.queries)
+    flt = make_filter(body.sources, body.page_from, body.page_to)
+    results = store.search(q_embs, body.k, nprobe=body.nprobe, ef_search=body.ef_search, flt=flt, query_text=body.queries)
+    return {"results": [{"query": q, "results": hits} for q, hits in zip(body.queries, results)]}
@@ -0,0 +1,149 @@
+"""
+Multi-worker server: models and the resident index are loaded once in this process, then
+SERVE_WORKERS uvicorn workers are forked and share them copy-on-write.
+
+    python -m src.app.serve --workers 4 --port 8000
+
+Segments are opened memory-mapped (FAISS_MMAP), and chunk texts, vectors and BM25 postings
+are memory-mapped already, so index pages live once in the page cache however many workers
+map them. Each worker reloads new generations on its own; writes from any worker are
+serialized by the cross-process WRITE_LOCK.
+
+Fork safety: the parent only loads the embedder and reranker weights and never runs inference,
+so no torch/OpenMP thread pool exists yet when the workers are forked (a pool created before
+fork() would be dead in the children). The LLM is not loaded in the parent at all: llama.cpp
+starts its own threads and the prefix warm-up evaluates tokens, so each worker builds its
+LLMClient (and warms its prefix KV cache) after the fork. The GGUF weights are memory-mapped,
+so the workers still share them through the page cache.
+"""
+import os
+
+os.environ.setdefault("FAISS_MMAP", "1")   # before the config module is imported
+
+import argparse
+import gc
+import signal
+import socket
+import sys
+import time
+from typing import Dict
+
+import uvicorn
+
+from src.app.main import app
+from src.app.services.registry import MODELS, get_embedder, get_vector_store
+from src.app.services.shards import ROUTER
+from src.utils.config import SERVE_WORKERS, WARMUP_MODELS
+from src.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+RESTART_BACKOFF = 1.0   # seconds before a crashed worker is replaced
+
+
+def preload():
+    """Load the torch models and the index before forking, so workers inherit them."""
+    MODELS.warm_up([name for name in WARMUP_MODELS if name != "llm"])
+    if not MODELS.is_ready():
+        raise SystemExit(f"Model warm-up failed: {MODELS.error}")
+    if ROUTER is not None:
+        # one set of shard workers, shared by every API worker, up before any worker is forked
+        if not ROUTER.wait_ready(get_embedder().dim):
+            raise SystemExit("Shard workers did not become ready")
+    store = get_vector_store()
+    logger.info(f"[SERVE] preloaded models and generation {store.generation}")
+    # objects that exist now are never collected in the workers, so the collector does not
+    # write to (and un-share) the pages that hold them
+    gc.collect()
+    gc.freeze()
+
+
+def run_worker(sock: socket.socket, args):
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(sig, signal.SIG_DFL)
+    # split the cores between workers instead of every worker using all of them
+    try:
+        import torch
+        torch.set_num_threads(max(1, (os.cpu_count() or 1) // max(1, args.workers)))
+    except ImportError:
+        pass
+    if "llm" in WARMUP_MODELS:
+        MODELS.get("llm")   # after the fork: llama.cpp threads and the prefix warm-up are per worker
+    config = uvicorn.Config(app, log_level=args.log_level, timeout_keep_alive=5)
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def fork_worker(sock: socket.socket, args) -> int:
+    pid = os.fork()
+    if pid == 0:
+        code = 0
+        try:
+            run_worker(sock, args)
+        except BaseException:
+            logger.error("[SERVE] worker crashed", exc_info=True)
+            code = 1
+        finally:
+            os._exit(code)
+    logger.info(f"[SERVE] started worker {pid}")
+    return pid
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the API with several workers sharing preloaded models")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=SERVE_WORKERS)
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((args.host, args.port))
+    sock.listen(2048)   # connections queue here until the workers are up
+    sock.set_inheritable(True)
+
+    preload()
+
+    workers: Dict[int, float] = {}
+    for _ in range(max(1, args.workers)):
+        workers[fork_worker(sock, args)] = time.time()
+
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        if pid not in workers:
+            if ROUTER is not None and not stopping and not ROUTER.restart(pid):
+                logger.warning(f"[SERVE] reaped unknown child {pid} with status {status}")
+            continue
+        started = workers.pop(pid)
+        if stopping:
+            continue
+        logger.warning(f"[SERVE] worker {pid} exited with status {status}, restarting")
+        if time.time() - started < RESTART_BACKOFF:
+            time.sleep(RESTART_BACKOFF)
+        workers[fork_worker(sock, args)] = time.time()
+
+    sock.close()
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
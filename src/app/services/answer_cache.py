@@ -0,0 +1,138 @@
+import threading
+import time
+from typing import Dict, List, Optional
+
+import faiss
+import numpy as np
+
+from src.utils.config import (
+    ANSWER_CACHE_ENABLED,
+    ANSWER_CACHE_THRESHOLD,
+    ANSWER_CACHE_SIZE,
+    ANSWER_CACHE_TTL,
+)
+from src.app.services import metrics
+from src.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class SemanticAnswerCache:
+    """
+    Caches final answers keyed by query embedding.
+    A new query is matched against past query embeddings with a small HNSW index
+    (inner product == cosine for normalized embeddings); a hit above `threshold` returns
+    the stored answer and sources. Entries belong to one index content version (changed by
+    ingests and deletes, not by merges or compaction) and the whole cache is dropped as soon
+    as a lookup or store sees a newer one. Versions only grow, so a request that read an older
+    version (it raced an ingest) misses and its answer is not stored.
+    """
+
+    def __init__(
+        self,
+        threshold: float = ANSWER_CACHE_THRESHOLD,
+        max_items: int = ANSWER_CACHE_SIZE,
+        ttl: float = ANSWER_CACHE_TTL,
+        enabled: bool = ANSWER_CACHE_ENABLED,
+    ):
+        self.threshold = threshold
+        self.max_items = max_items
+        self.ttl = ttl
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._index = None
+        self._vectors: List[np.ndarray] = []
+        self._entries: List[Dict] = []   # position == HNSW id
+        self._version = None
+        self.hits = 0
+        self.misses = 0
+
+    def _new_index(self, dim: int):
+        index = faiss.IndexHNSWFlat(dim, 32, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efSearch = 32
+        return index
+
+    def _reset(self, version):
+        self._index = None
+        self._vectors = []
+        self._entries = []
+        self._version = version
+
+    def _current(self, version: int) -> bool:
+        """Move the cache forward to `version`; False if `version` is older than the cached one."""
+        if self._version is not None and version < self._version:
+            return False
+        if version != self._version:
+            if self._entries:
+                logger.info(f"[ANSWER-CACHE] index content version {version}: dropping {len(self._entries)} answers")
+            self._reset(version)
+        return True
+
+    def _rebuild(self, keep: int):
+        """HNSW has no removal, so evict by rebuilding from the newest `keep` entries."""
+        self._vectors = self._vectors[-keep:] if keep else []
+        self._entries = self._entries[-keep:] if keep else []
+        if not self._vectors:
+            self._index = None
+            return
+        self._index = self._new_index(self._vectors[0].shape[0])
+        self._index.add(np.vstack(self._vectors))
+
+    def lookup(self, q_emb: np.ndarray, version: int) -> Optional[Dict]:
+        if not self.enabled:
+            return None
+        with metrics.stage("answer_cache"), self._lock:
+            if not self._current(version) or self._index is None or self._index.ntotal == 0:
+                self.misses += 1
+                return None
+
+            q = np.asarray(q_emb, dtype=np.float32).reshape(1, -1)
+            D, I = self._index.search(q, 1)
+            idx, sim = int(I[0, 0]), float(D[0, 0])
+            if idx < 0 or sim < self.threshold:
+                self.misses += 1
+                return None
+            entry = self._entries[idx]
+            if time.time() - entry["ts"] > self.ttl:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return {**entry, "similarity": sim}
+
+    def store(self, q_emb: np.ndarray, query: str, answer: str, sources: List[str], version: int):
+        if not self.enabled:
+            return
+        vec = np.asarray(q_emb, dtype=np.float32).reshape(-1)
+        with self._lock:
+            if not self._current(version):
+                return
+            if len(self._entries) >= self.max_items:
+                self._rebuild(keep=self.max_items // 2)
+            if self._index is None:
+                self._index = self._new_index(vec.shape[0])
+            self._index.add(vec.reshape(1, -1))
+            self._vectors.append(vec)
+            self._entries.append({
+                "query": query,
+                "answer": answer,
+                "sources": list(sources),
+                "content_version": version,
+                "ts": time.time(),
+            })
+
+    def clear(self):
+        with self._lock:
+            self._reset(self._version)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "content_version": self._version,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+# Singleton answer cache
+ANSWER_CACHE = SemanticAnswerCache()
@@ -1,30 +1,180 @@
+import sys
+import threading
 import time
-from functools import lru_cache
-from typing import Dict, Any
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
 
-# Very small manual cache for search results keyed by query text
-class SimpleCache:
-    def __init__(self, max_items=256, ttl=3600):
-        self.store: Dict[str, Dict[str, Any]] = {}
+import numpy as np
+
+from src.utils.config import EMBED_CACHE_MAX_BYTES, SEARCH_CACHE_MAX_BYTES, RERANK_CACHE_SIZE
+
+
+def estimate_size(value: Any, _depth: int = 0) -> int:
+    """Rough byte size of a cached value (numpy arrays, hit lists, dicts, strings)."""
+    if isinstance(value, np.ndarray):
+        return value.nbytes + 112
+    if isinstance(value, (str, bytes)):
+        return sys.getsizeof(value)
+    if _depth > 4:
+        return sys.getsizeof(value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(
+            estimate_size(k, _depth + 1) + estimate_size(v, _depth + 1) for k, v in value.items()
+        )
+    if isinstance(value, (list, tuple, set)):
+        return sys.getsizeof(value) + sum(estimate_size(v, _depth + 1) for v in value)
+    return sys.getsizeof(value)
+
+
+class _Entry:
+    __slots__ = ("value", "expires", "size")
+
+    def __init__(self, value, expires, size):
+        self.value = value
+        self.expires = expires
+        self.size = size
+
+
+class _Flight:
+    __slots__ = ("event", "value", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class LRUCache:
+    """
+    Thread-safe LRU cache with per-entry TTL and an optional byte budget.
+    get/set/evict are O(1) (OrderedDict move_to_end / popitem); entries are evicted
+    least-recently-used first until both max_items and max_bytes hold.
+    get_or_compute() runs one computation per key when several threads miss at once.
+    """
+
+    def __init__(self, max_items: int = 256, ttl: float = 3600, max_bytes: Optional[int] = None, name: str = "cache"):
+        self.name = name
         self.max_items = max_items
         self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._data: "OrderedDict[Hashable, _Entry]" = OrderedDict()
+        self._inflight: Dict[Hashable, _Flight] = {}
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.coalesced = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def _get_locked(self, key):
+        entry = self._data.get(key)
+        if entry is None:
+            return False, None
+        if entry.expires < time.time():
+            self._remove_locked(key)
+            self.expirations += 1
+            return False, None
+        self._data.move_to_end(key)
+        return True, entry.value
+
+    def _remove_locked(self, key):
+        entry = self._data.pop(key)
+        self.bytes -= entry.size
+
+    def get(self, key: Hashable, default=None):
+        with self._lock:
+            found, value = self._get_locked(key)
+            if found:
+                self.hits += 1
+                return value
+            self.misses += 1
+            return default
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        size = estimate_size(value) if self.max_bytes else 0
+        if self.max_bytes and size > self.max_bytes:
+            return  # larger than the whole budget; never cache
+        expires = time.time() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            if key in self._data:
+                self._remove_locked(key)
+            self._data[key] = _Entry(value, expires, size)
+            self.bytes += size
+            while len(self._data) > self.max_items or (self.max_bytes and self.bytes > self.max_bytes):
+                oldest_key, oldest = self._data.popitem(last=False)
+                self.bytes -= oldest.size
+                self.evictions += 1
+
+    def delete(self, key: Hashable):
+        with self._lock:
+            if key in self._data:
+                self._remove_locked(key)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.bytes = 0
+
+    def get_or_compute(self, key: Hashable, fn: Callable[[], Any], ttl: Optional[float] = None):
+        """Return the cached value or compute it once, even if many threads miss together."""
+        with self._lock:
+            found, value = self._get_locked(key)
+            if found:
+                self.hits += 1
+                return value
+            self.misses += 1
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _Flight()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = fn()
+            self.set(key, flight.value, ttl)
+            return flight.value
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            flight.event.set()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "name": self.name,
+                "items": len(self._data),
+                "max_items": self.max_items,
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "coalesced": self.coalesced,
+            }
+
 
-    def get(self, key: str):
-        entry = self.store.get(key)
-        if not entry:
-            return None
-        if time.time() - entry["ts"] > self.ttl:
-            del self.store[key]
-            return None
-        return entry["value"]
-
-    def set(self, key: str, value: Any):
-        if len(self.store) >= self.max_items:
-            # pop oldest
-            oldest_key = min(self.store.keys(), key=lambda k: self.store[k]["ts"])
-            del self.store[oldest_key]
-        self.store[key] = {"value": value, "ts": time.time()}
+# Backwards-compatible name
+SimpleCache = LRUCache
 
 # Singleton cache instances
-EMBED_CACHE = SimpleCache(max_items=1024, ttl=3600)
-SEARCH_CACHE = SimpleCache(max_items=512, ttl=600)
+EMBED_CACHE = LRUCache(max_items=1024, ttl=3600, max_bytes=EMBED_CACHE_MAX_BYTES, name="embed")
+SEARCH_CACHE = LRUCache(max_items=512, ttl=600, max_bytes=SEARCH_CACHE_MAX_BYTES, name="search")
+# (normalized query, chunk id) -> cross-encoder score; chunk ids are never reused, so no invalidation
+RERANK_CACHE = LRUCache(max_items=RERANK_CACHE_SIZE, ttl=24 * 3600, name="rerank")
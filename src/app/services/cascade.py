@@ -0,0 +1,185 @@
+import threading
+import time
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from src.app.services import metrics
+from src.app.services.reranker import CrossEncoderReranker
+from src.utils.config import (
+    RERANK_CASCADE, CASCADE_SKIP_MARGIN, CASCADE_SKIP_Z, CASCADE_FEW_MARGIN, CASCADE_FEW_N,
+    CASCADE_FUSED_SKIP_MARGIN, CASCADE_FUSED_FEW_MARGIN, CASCADE_STEP, CASCADE_STABLE_K, HYBRID_RRF_K,
+)
+from src.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Cascade modes
+SKIP = "skip"   # retrieval is decisive: keep the retrieval order
+FEW = "few"     # rerank only the head of the list
+ALL = "all"     # rerank step by step until the top-k stops changing
+MODES = (SKIP, FEW, ALL)
+
+
+def retrieval_confidence(candidates: List[Dict]) -> Dict:
+    """
+    Margin between the two best retrieval scores and how far the best one stands out (z-score),
+    on the score the candidates are ordered by: RRF scores for hybrid hits (in units of a first
+    rank in one list, 1 / (HYBRID_RRF_K + 1)), FAISS scores otherwise.
+    """
+    fused = bool(candidates) and all("fused_score" in c for c in candidates)
+    if fused:
+        values = [c["fused_score"] * (HYBRID_RRF_K + 1) for c in candidates]
+    else:
+        values = [c.get("faiss_score", 0.0) for c in candidates]
+    scores = np.sort(np.asarray(values, dtype=np.float64))[::-1]
+    if len(scores) < 2:
+        return {"margin": float("inf"), "z": float("inf"), "fused": fused}
+    std = scores.std()
+    return {
+        "margin": float(scores[0] - scores[1]),
+        "z": float((scores[0] - scores.mean()) / std) if std > 0 else 0.0,
+        "fused": fused,
+    }
+
+
+class RerankCascade:
+    """
+    Decides per query how much of the candidate list goes through the cross-encoder:
+    none when the top hit clearly dominates, the first `few_n` when it leads by a
+    smaller margin, otherwise all of them in steps of `step`, stopping once the top
+    `stable_k` is unchanged by a step that found nothing better. Hybrid candidates are
+    ordered by RRF score and use the fused_* margins. Candidates left unscored keep
+    their retrieval order after the reranked ones and carry no rerank_score.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = RERANK_CASCADE,
+        skip_margin: float = CASCADE_SKIP_MARGIN,
+        skip_z: float = CASCADE_SKIP_Z,
+        few_margin: float = CASCADE_FEW_MARGIN,
+        few_n: int = CASCADE_FEW_N,
+        fused_skip_margin: float = CASCADE_FUSED_SKIP_MARGIN,
+        fused_few_margin: float = CASCADE_FUSED_FEW_MARGIN,
+        step: int = CASCADE_STEP,
+        stable_k: int = CASCADE_STABLE_K,
+    ):
+        self.enabled = enabled
+        self.skip_margin = skip_margin
+        self.skip_z = skip_z
+        self.few_margin = few_margin
+        self.few_n = few_n
+        self.fused_skip_margin = fused_skip_margin
+        self.fused_few_margin = fused_few_margin
+        self.step = max(1, step)
+        self.stable_k = stable_k
+        self._lock = threading.Lock()
+        self.decisions = {mode: 0 for mode in MODES}
+        self.pairs_scored = 0
+        self.pairs_skipped = 0
+        self.early_stops = 0
+
+    def decide(self, candidates: List[Dict]) -> Tuple[str, Dict]:
+        conf = retrieval_confidence(candidates)
+        if not self.enabled:
+            return ALL, conf
+        skip_margin, few_margin = (
+            (self.fused_skip_margin, self.fused_few_margin) if conf["fused"] else (self.skip_margin, self.few_margin)
+        )
+        if conf["margin"] >= skip_margin and conf["z"] >= self.skip_z:
+            return SKIP, conf
+        if conf["margin"] >= few_margin:
+            return FEW, conf
+        return ALL, conf
+
+    def _order(self, candidates: List[Dict], n_scored: int) -> List[Dict]:
+        """Candidates are in retrieval order: the scored head sorted by rerank score, then the rest."""
+        head = sorted(candidates[:n_scored], key=lambda c: c["rerank_score"], reverse=True)
+        return head + candidates[n_scored:]
+
+    def _record(self, query: str, mode: str, conf: Dict, scored: int, total: int, early: bool, t0: float) -> Dict:
+        decision = {
+            "mode": mode,
+            "margin": round(conf["margin"], 4),
+            "z": round(conf["z"], 2),
+            "fused": conf["fused"],
+            "reranked": scored,
+            "candidates": total,
+            "early_stop": early,
+            "ms": round((time.perf_counter() - t0) * 1000, 2),
+        }
+        with self._lock:
+            self.decisions[mode] += 1
+            self.pairs_scored += scored
+            self.pairs_skipped += total - scored
+            self.early_stops += int(early)
+        logger.info(f"[CASCADE] {decision} query='{query}'")
+        return decision
+
+    def rerank(self, reranker: CrossEncoderReranker, query: str, candidates: List[Dict]) -> Tuple[List[Dict], Dict]:
+        """Returns (ranked candidates, decision)."""
+        t0 = time.perf_counter()
+        candidates = list(candidates)   # retrieval order (dense, or fused with BM25)
+        mode, conf = self.decide(candidates)
+        limit = {SKIP: 0, FEW: min(self.few_n, len(candidates)), ALL: len(candidates)}[mode]
+
+        # FEW mode (and a disabled cascade) scores its whole selection in one pass
+        step = self.step if mode == ALL and self.enabled else max(1, limit)
+        scored, early, top = 0, False, None
+        while scored < limit:
+            chunk = candidates[scored: min(limit, scored + step)]
+            scores = reranker.score([query] * len(chunk), [c["text"] for c in chunk], [c.get("id") for c in chunk])
+            for c, s in zip(chunk, scores):
+                c["rerank_score"] = float(s)
+            scored += len(chunk)
+            if scored >= limit:
+                break
+            # stable: the step just scored moved nothing into (or within) the top-k
+            ranked = sorted(candidates[:scored], key=lambda c: c["rerank_score"], reverse=True)
+            new_top = [id(c) for c in ranked[: self.stable_k]]
+            if new_top == top:
+                early = True
+                break
+            top = new_top
+
+        decision = self._record(query, mode, conf, scored, len(candidates), early, t0)
+        metrics.record("rerank", time.perf_counter() - t0)
+        return self._order(candidates, scored), decision
+
+    def rerank_batch(self, reranker: CrossEncoderReranker, queries: List[str], candidate_lists: List[List[Dict]]):
+        """Per-query decisions, one scoring pass over every selected pair (no early stopping)."""
+        t0 = time.perf_counter()
+        plans = []
+        for query, cands in zip(queries, candidate_lists):
+            cands = list(cands)
+            mode, conf = self.decide(cands)
+            limit = {SKIP: 0, FEW: min(self.few_n, len(cands)), ALL: len(cands)}[mode]
+            plans.append((query, cands, mode, conf, limit))
+
+        flat = [(query, c) for query, cands, _, _, limit in plans for c in cands[:limit]]
+        scores = reranker.score([q for q, _ in flat], [c["text"] for _, c in flat], [c.get("id") for _, c in flat])
+        for (_, c), s in zip(flat, scores):
+            c["rerank_score"] = float(s)
+        metrics.record("rerank", time.perf_counter() - t0)
+
+        return [
+            (self._order(cands, limit), self._record(query, mode, conf, limit, len(cands), False, t0))
+            for query, cands, mode, conf, limit in plans
+        ]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            total = self.pairs_scored + self.pairs_skipped
+            return {
+                "enabled": self.enabled,
+                "decisions": dict(self.decisions),
+                "pairs_scored": self.pairs_scored,
+                "pairs_skipped": self.pairs_skipped,
+                "skipped_ratio": round(self.pairs_skipped / total, 4) if total else 0.0,
+                "early_stops": self.early_stops,
+            }
+
+
+# Singleton cascade
+CASCADE = RerankCascade()
@@ -0,0 +1,243 @@
+from typing import List, Dict, Optional
+import json
+import os
+import shutil
+import numpy as np
+from pathlib import Path
+from src.utils.config import CHUNK_STORE_DIR
+
+# Column files (raw little-endian arrays, append-only)
+TEXT_FILE = "text.bin"            # utf-8 chunk texts back to back
+OFFSETS_FILE = "offsets.i64"      # count + 1 byte offsets into text.bin
+SOURCE_FILE = "source_id.i32"     # index into sources.json
+PAGE_FILE = "page.i32"            # -1 when the document has no pages
+CHUNK_INDEX_FILE = "chunk_index.i32"
+ID_FILE = "id.i64"                # FAISS id of each row, ascending (absent = row number)
+STATE_FILE = "state.json"         # committed row count + source table
+
+
+def _write_json_atomic(path: Path, data):
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    with open(tmp, "w") as f:
+        json.dump(data, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def _memmap(path: Path, dtype, count: int) -> np.ndarray:
+    if count <= 0:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r", shape=(count,))
+
+
+class ChunkBatch:
+    """
+    Result of a vectorized gather: columns are numpy arrays aligned with the requested ids,
+    text stays in the memory-mapped arena until text(i) decodes it.
+    """
+
+    def __init__(self, store: "ChunkStore", ids: np.ndarray):
+        self.store = store
+        self.ids = ids
+        self.rows = store.rows(ids)
+        self.valid = self.rows >= 0
+        safe = np.where(self.valid, self.rows, 0)
+        if store.count:
+            self.starts = store.offsets[safe]
+            self.ends = store.offsets[safe + 1]
+            self.source_ids = store.source_ids[safe]
+            self.pages = store.pages[safe]
+            self.chunk_indexes = store.chunk_indexes[safe]
+        else:
+            self.starts = self.ends = self.source_ids = self.pages = self.chunk_indexes = np.zeros(len(ids), dtype=np.int64)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def text(self, i: int) -> str:
+        if not self.valid[i]:
+            return ""
+        return self.store.arena[self.starts[i]:self.ends[i]].tobytes().decode("utf-8", errors="ignore")
+
+    def source(self, i: int) -> str:
+        return self.store.sources[self.source_ids[i]] if self.valid[i] else ""
+
+    def meta(self, i: int) -> Dict:
+        if not self.valid[i]:
+            return {}
+        meta = {"source": self.source(i), "chunk_index": int(self.chunk_indexes[i])}
+        if self.pages[i] >= 0:
+            meta["page"] = int(self.pages[i])
+        return meta
+
+
+class ChunkStore:
+    """
+    Columnar, append-only chunk storage addressed by FAISS id.
+
+    Rows are kept in ascending id order; ids are dense until compaction drops the rows of
+    deleted chunks, after which id -> row is a binary search over id.i64.
+    Reads are memory-mapped snapshots of the first `count` rows, so a store opened by a
+    reader is unaffected by later appends. Writers append to every column file and then
+    commit by rewriting state.json; rows past the committed count are discarded on the
+    next append, so a crash mid-write never exposes partial chunks.
+    """
+
+    def __init__(self, root: Path = CHUNK_STORE_DIR):
+        self.root = Path(root)
+        finish_swap(self.root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._load()
+
+    def _load(self):
+        state = self._read_state()
+        self.count: int = state["count"]
+        self.sources: List[str] = state["sources"]
+        self._source_lookup = {s: i for i, s in enumerate(self.sources)}
+
+        self.offsets = _memmap(self.root / OFFSETS_FILE, np.int64, self.count + 1 if self.count else 0)
+        self.source_ids = _memmap(self.root / SOURCE_FILE, np.int32, self.count)
+        self.pages = _memmap(self.root / PAGE_FILE, np.int32, self.count)
+        self.chunk_indexes = _memmap(self.root / CHUNK_INDEX_FILE, np.int32, self.count)
+        arena_len = int(self.offsets[-1]) if self.count else 0
+        self.arena = _memmap(self.root / TEXT_FILE, np.uint8, arena_len)
+        # stores written before ids could have gaps have no id column: id == row
+        id_path = self.root / ID_FILE
+        self.dense = not id_path.exists() or id_path.stat().st_size < self.count * 8
+        self.ids = np.arange(self.count, dtype=np.int64) if self.dense else _memmap(id_path, np.int64, self.count)
+        self._source_rows = None   # per-source row lists, built on first use
+
+    def _read_state(self) -> Dict:
+        try:
+            with open(self.root / STATE_FILE, "r") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {"count": 0, "sources": []}
+
+    def __len__(self):
+        return self.count
+
+    # ---- reads ----
+    def rows(self, ids) -> np.ndarray:
+        """Row of each id, -1 for ids that are not (or no longer) stored."""
+        ids = np.asarray(ids, dtype=np.int64)
+        if self.dense or not self.count:
+            return np.where((ids >= 0) & (ids < self.count), ids, -1)
+        pos = np.searchsorted(self.ids, ids)
+        found = (ids >= 0) & (pos < self.count) & (self.ids[np.minimum(pos, self.count - 1)] == ids)
+        return np.where(found, pos, -1)
+
+    def gather(self, ids) -> ChunkBatch:
+        """Vectorized lookup of any number of ids (e.g. a flattened (nq, k) FAISS result)."""
+        return ChunkBatch(self, np.asarray(ids, dtype=np.int64).ravel())
+
+    def _rows_by_source(self):
+        """(rows grouped by source, group bounds): rows of source s are rows[bounds[s]:bounds[s + 1]]."""
+        if self._source_rows is None:
+            order = np.argsort(np.asarray(self.source_ids), kind="stable")
+            bounds = np.searchsorted(np.asarray(self.source_ids)[order], np.arange(len(self.sources) + 1))
+            self._source_rows = (order, bounds)
+        return self._source_rows
+
+    def rows_for_sources(self, sources: List[str]) -> np.ndarray:
+        """Ascending rows of every chunk of the given sources (exact stored names)."""
+        order, bounds = self._rows_by_source()
+        src_ids = [self._source_lookup[s] for s in sources if s in self._source_lookup]
+        if not src_ids:
+            return np.zeros(0, dtype=np.int64)
+        return np.sort(np.concatenate([order[bounds[i]:bounds[i + 1]] for i in src_ids]))
+
+    def ids_for_source(self, source: str) -> np.ndarray:
+        return np.asarray(self.ids[self.rows_for_sources([source])], dtype=np.int64)
+
+    # ---- writes ----
+    def append(self, start_id: int, texts: List[str], metadatas: List[Dict], ids: Optional[np.ndarray] = None) -> int:
+        """
+        Append rows for ids start_id .. start_id + len(texts) - 1 (or the ascending `ids`)
+        in one write per column and return the first new row. Committed rows with an
+        id >= the first new id (an orphaned tail from an interrupted add) are overwritten.
+        """
+        n = len(texts)
+        if n == 0:
+            return self.count
+        ids = np.arange(start_id, start_id + n, dtype=np.int64) if ids is None else np.asarray(ids, dtype=np.int64)
+        row = int(np.searchsorted(self.ids, ids[0]))
+
+        encoded = [t.encode("utf-8") for t in texts]
+        lengths = np.fromiter((len(b) for b in encoded), dtype=np.int64, count=n)
+        base = int(self.offsets[row]) if row else 0
+        new_offsets = base + np.cumsum(lengths)
+
+        source_ids = np.empty(n, dtype=np.int32)
+        pages = np.empty(n, dtype=np.int32)
+        chunk_indexes = np.empty(n, dtype=np.int32)
+        sources = list(self.sources)
+        lookup = dict(self._source_lookup)
+        for i, meta in enumerate(metadatas):
+            src = meta.get("source", "") or ""
+            if src not in lookup:
+                lookup[src] = len(sources)
+                sources.append(src)
+            source_ids[i] = lookup[src]
+            page = meta.get("page")
+            pages[i] = -1 if page is None else int(page)
+            chunk_indexes[i] = int(meta.get("chunk_index", i))
+
+        self._write_column(TEXT_FILE, base, b"".join(encoded))
+        if row == 0:
+            self._write_column(OFFSETS_FILE, 0, np.zeros(1, dtype=np.int64).tobytes() + new_offsets.tobytes())
+        else:
+            self._write_column(OFFSETS_FILE, (row + 1) * 8, new_offsets.tobytes())
+        self._write_column(SOURCE_FILE, row * 4, source_ids.tobytes())
+        self._write_column(PAGE_FILE, row * 4, pages.tobytes())
+        self._write_column(CHUNK_INDEX_FILE, row * 4, chunk_indexes.tobytes())
+        if self.dense:
+            # the first write of the id column also materializes the implicit ids before `row`
+            self._write_column(ID_FILE, 0, np.arange(row, dtype=np.int64).tobytes() + ids.tobytes())
+        else:
+            self._write_column(ID_FILE, row * 8, ids.tobytes())
+
+        # commit point
+        _write_json_atomic(self.root / STATE_FILE, {"count": row + n, "sources": sources})
+        self._load()
+        return row
+
+    def _write_column(self, name: str, offset: int, payload: bytes):
+        path = self.root / name
+        mode = "r+b" if path.exists() else "wb"
+        with open(path, mode) as f:
+            f.truncate(offset)
+            f.seek(offset)
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+
+
+# ---- compaction: rebuild into a sibling directory, then swap it in ----
+def compact_dir(root: Path) -> Path:
+    return root.with_name(root.name + ".compact")
+
+
+def finish_swap(root: Path):
+    """Complete a swap that was interrupted between its two renames."""
+    staged = compact_dir(root)
+    if not root.exists() and staged.exists():
+        try:
+            os.replace(staged, root)
+        except OSError:
+            pass  # another process finished it
+
+
+def swap_in(root: Path):
+    """Replace `root` by its compacted copy; open readers keep their mmaps of the old files."""
+    staged, old = compact_dir(root), root.with_name(root.name + ".old")
+    shutil.rmtree(old, ignore_errors=True)
+    os.replace(root, old)
+    try:
+        os.replace(staged, root)
+    except FileNotFoundError:
+        # a reader opening the store in between ran finish_swap() and completed the swap
+        if staged.exists() or not root.exists():
+            raise
+    shutil.rmtree(old, ignore_errors=True)
@@ -0,0 +1,129 @@
+import threading
+import time
+from typing import Dict, Optional
+
+from src.app.services.vector_store import FaissStore, STORE, WRITE_LOCK
+from src.app.services.shards import ROUTER
+from src.utils.config import COMPACT_GARBAGE_RATIO, COMPACT_MIN_RETIRED, SEGMENT_MAX_COUNT, SEGMENT_MERGE_FANIN
+from src.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class Compactor:
+    """
+    Runs FaissStore.compact() in a background thread once retired (deleted or replaced)
+    chunks make up more than `garbage_ratio` of the index. Holds the write lock while it
+    runs, so ingestion waits and searches keep using the published generation.
+    """
+
+    def __init__(self, garbage_ratio: float = COMPACT_GARBAGE_RATIO, min_retired: int = COMPACT_MIN_RETIRED):
+        self.garbage_ratio = garbage_ratio
+        self.min_retired = min_retired
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self.runs = 0
+        self.last_report: Optional[Dict] = None
+        self.last_error: Optional[str] = None
+
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def needed(self, store: FaissStore) -> bool:
+        return len(store.retired) >= self.min_retired and store.garbage_ratio() > self.garbage_ratio
+
+    def maybe_start(self, dim: int, force: bool = False) -> bool:
+        """Start a compaction if the garbage threshold is exceeded (or force); False if not started."""
+        with self._lock:
+            if self.is_running():
+                return False
+            # with sharding the router reads tombstones and sizes from disk instead of loading the index
+            if not force and not self.needed(ROUTER if ROUTER is not None else STORE.get(dim)):
+                return False
+            self._thread = threading.Thread(target=self._run, args=(dim, force), name="compaction", daemon=True)
+            self._thread.start()
+            return True
+
+    def _run(self, dim: int, force: bool):
+        try:
+            with WRITE_LOCK:
+                store = FaissStore(dim)
+                if not force and not self.needed(store):
+                    return
+                report = store.compact()
+            STORE.invalidate()
+            self.runs += 1
+            self.last_report = {**report, "finished_at": time.time()}
+            self.last_error = None
+        except Exception as e:
+            self.last_error = str(e)
+            logger.error(f"[COMPACTION] failed: {e}", exc_info=True)
+
+    def status(self) -> Dict:
+        return {
+            "running": self.is_running(),
+            "runs": self.runs,
+            "garbage_ratio_threshold": self.garbage_ratio,
+            "last": self.last_report,
+            "error": self.last_error,
+        }
+
+
+class SegmentMerger:
+    """
+    Folds small segments (one per ingest batch) into larger ones in a background thread,
+    so searches fan out over a bounded number of segments. Each merge is published on
+    its own; the write lock is released between merges so ingestion is not starved.
+    """
+
+    def __init__(self, max_segments: int = SEGMENT_MAX_COUNT, fanin: int = SEGMENT_MERGE_FANIN):
+        self.max_segments = max_segments
+        self.fanin = fanin
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self.merges = 0
+        self.last_report: Optional[Dict] = None
+        self.last_error: Optional[str] = None
+
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def maybe_start(self, dim: int) -> bool:
+        with self._lock:
+            view = ROUTER if ROUTER is not None else STORE.get(dim).index
+            if self.is_running() or view.max_shard_segments() <= self.max_segments:
+                return False
+            self._thread = threading.Thread(target=self._run, args=(dim,), name="segment-merge", daemon=True)
+            self._thread.start()
+            return True
+
+    def _run(self, dim: int):
+        try:
+            while True:
+                t0 = time.time()
+                with WRITE_LOCK:
+                    report = FaissStore(dim).merge_segments(self.max_segments, self.fanin)
+                if report is None:
+                    return
+                STORE.invalidate()
+                self.merges += 1
+                self.last_report = {**report, "seconds": round(time.time() - t0, 3), "finished_at": time.time()}
+                self.last_error = None
+                logger.info(f"[MERGE] {report}")
+        except Exception as e:
+            self.last_error = str(e)
+            logger.error(f"[MERGE] failed: {e}", exc_info=True)
+
+    def status(self) -> Dict:
+        return {
+            "running": self.is_running(),
+            "merges": self.merges,
+            "max_segments": self.max_segments,
+            "last": self.last_report,
+            "error": self.last_error,
+        }
+
+
+# Singleton compactor and segment merger
+COMPACTOR = Compactor()
+MERGER = SegmentMerger()
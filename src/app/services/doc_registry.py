@@ -0,0 +1,106 @@
+import hashlib
+import json
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from src.app.services.chunk_store import _write_json_atomic
+from src.app.services.filters import source_matches
+from src.utils.config import DOC_REGISTRY_PATH
+
+HASH_BLOCK = 1 << 20
+
+
+def file_hash(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def chunk_hash(text: str, page: Optional[int]) -> str:
+    # the page is part of the identity so a kept chunk's metadata stays correct
+    return hashlib.sha1(f"{-1 if page is None else page}\0{text}".encode("utf-8")).hexdigest()
+
+
+def source_key(path: str) -> str:
+    return str(Path(path).resolve())
+
+
+class DocumentRegistry:
+    """
+    What has been ingested, per document: the file's content hash and the
+    (chunk hash, FAISS id) pairs of its live chunks. Lets ingestion skip unchanged files,
+    re-embed only new chunks and retire the ids of chunks that disappeared.
+    Persisted as one JSON file, replaced atomically by the (single) writer.
+    """
+
+    def __init__(self, path: Path = DOC_REGISTRY_PATH):
+        self.path = Path(path)
+        state = self._read()
+        self.documents: Dict[str, Dict] = state.get("documents", {})
+        # checkpoint: paths of an ingest that has started but not finished
+        self.pending: List[str] = state.get("pending", [])
+
+    def _read(self) -> Dict:
+        try:
+            with open(self.path, "r") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def save(self):
+        _write_json_atomic(self.path, {"documents": self.documents, "pending": self.pending})
+
+    def is_pending(self, path: str) -> bool:
+        return path in self.pending
+
+    def is_unchanged(self, path: str, digest: str) -> bool:
+        doc = self.documents.get(source_key(path))
+        return doc is not None and doc["file_hash"] == digest
+
+    def is_known(self, path: str) -> bool:
+        return source_key(path) in self.documents
+
+    def diff(
+        self, path: str, hashes: List[str], previous: Optional[List[Tuple[str, int]]] = None
+    ) -> Tuple[List[int], Dict[int, int], List[int]]:
+        """
+        Match a document's new chunk hashes against the registered ones (or `previous`
+        for a document ingested before the registry existed).
+        Returns (positions needing embedding, {position: kept id}, ids to retire);
+        repeated chunks are matched one-to-one.
+        """
+        if previous is None:
+            previous = self.documents.get(source_key(path), {"chunks": []})["chunks"]
+        available = defaultdict(list)
+        for h, idx in previous:
+            available[h].append(idx)
+
+        new_positions, kept = [], {}
+        for pos, h in enumerate(hashes):
+            if available[h]:
+                kept[pos] = available[h].pop(0)
+            else:
+                new_positions.append(pos)
+        retired = [idx for ids in available.values() for idx in ids]
+        return new_positions, kept, retired
+
+    def record(self, path: str, digest: str, chunks: List[Tuple[str, int]]):
+        self.documents[source_key(path)] = {"file_hash": digest, "chunks": [[h, int(i)] for h, i in chunks]}
+        self.finish(path)
+
+    def finish(self, path: str):
+        if path in self.pending:
+            self.pending.remove(path)
+
+    def forget(self, source: str) -> List[str]:
+        """Drop documents whose path or file name is `source` (source_matches); returns the removed keys."""
+        keys = [k for k in self.documents if source_matches(k, source)]
+        for k in keys:
+            del self.documents[k]
+        return keys
+
+    def live_ids(self) -> int:
+        return sum(len(doc["chunks"]) for doc in self.documents.values())
@@ -1,22 +1,218 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, List
+
 from sentence_transformers import SentenceTransformer
-from src.utils.config import EMBEDDER_MODEL
+from src.utils.config import (
+    EMBEDDER_MODEL, EMBEDDER_BACKEND, EMBEDDER_ONNX_FILE, EMBED_BATCH_WAIT_MS, EMBED_BATCH_MAX,
+    EMBED_DOC_BATCH_SIZE,
+)
+from src.app.services import metrics
 from src.app.services.cache import EMBED_CACHE
+from src.utils.logger import get_logger
 import numpy as np
 
+logger = get_logger(__name__)
+
+BACKENDS = ("torch", "int8", "onnx")
+
+
+def load_sentence_transformer(model_name: str, backend: str):
+    """
+    SentenceTransformer on the requested CPU backend; returns (model, backend actually used).
+    onnx needs sentence-transformers with ONNX Runtime support and falls back to int8;
+    int8 is PyTorch dynamic quantization of the Linear layers.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown embedder backend: {backend} (expected one of {', '.join(BACKENDS)})")
+    if backend == "onnx":
+        try:
+            model_kwargs = {"file_name": EMBEDDER_ONNX_FILE} if EMBEDDER_ONNX_FILE else {}
+            return SentenceTransformer(model_name, backend="onnx", model_kwargs=model_kwargs), "onnx"
+        except (TypeError, ImportError, ValueError, OSError) as e:
+            logger.warning(f"[EMBEDDER] ONNX backend unavailable ({e}), using int8")
+            backend = "int8"
+
+    model = SentenceTransformer(model_name)
+    if backend == "int8":
+        import torch
+        torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+    return model, backend
+
+
+class ModelGate:
+    """
+    One forward pass at a time (concurrent passes only fight over the same cores).
+    Query batches waiting for the model go before the next document sub-batch, so a
+    running ingest delays a query by at most one sub-batch.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._busy = False
+        self._urgent = 0
+
+    @contextmanager
+    def hold(self, urgent: bool):
+        with self._cond:
+            if urgent:
+                self._urgent += 1
+            try:
+                while self._busy or (not urgent and self._urgent):
+                    self._cond.wait()
+            finally:
+                if urgent:
+                    self._urgent -= 1
+            self._busy = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._busy = False
+                self._cond.notify_all()
+
+
+class _Pending:
+    __slots__ = ("text", "event", "value", "error")
+
+    def __init__(self, text: str):
+        self.text = text
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class QueryBatcher:
+    """
+    Dynamic micro-batching for single-query embeddings: the first request waits up to
+    `wait_ms` for others to arrive, then all of them (at most `max_batch`) are encoded
+    in one forward pass by a background thread.
+    """
+
+    def __init__(self, encode, wait_ms: float = EMBED_BATCH_WAIT_MS, max_batch: int = EMBED_BATCH_MAX):
+        self._encode = encode
+        self.wait = wait_ms / 1000
+        self.max_batch = max(1, max_batch)
+        self._cond = threading.Condition()
+        self._queue = deque()
+        self._thread = None
+
+    def depth(self) -> int:
+        """Queries waiting to be encoded."""
+        return len(self._queue)
+
+    def embed(self, text: str) -> np.ndarray:
+        pending = _Pending(text)
+        with self._cond:
+            if self._thread is None:
+                # started lazily so importing the module has no side effects
+                self._thread = threading.Thread(target=self._run, name="embed-batcher", daemon=True)
+                self._thread.start()
+            self._queue.append(pending)
+            self._cond.notify()
+        pending.event.wait()
+        if pending.error is not None:
+            raise pending.error
+        return pending.value
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._queue:
+                    self._cond.wait()
+                deadline = time.monotonic() + self.wait
+                while len(self._queue) < self.max_batch:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch = [self._queue.popleft() for _ in range(min(self.max_batch, len(self._queue)))]
+            try:
+                for p, emb in zip(batch, self._encode([p.text for p in batch])):
+                    p.value = emb
+            except Exception as e:
+                for p in batch:
+                    p.error = e
+            finally:
+                for p in batch:
+                    p.event.set()
+
+
 class Embedder:
-    def __init__(self, model_name: str = EMBEDDER_MODEL):
-        print("Loading embedder:", model_name)
-        self.model = SentenceTransformer(model_name)
+    def __init__(self, model_name: str = EMBEDDER_MODEL, backend: str = EMBEDDER_BACKEND):
+        print("Loading embedder:", model_name, f"({backend})")
+        self.model, self.backend = load_sentence_transformer(model_name, backend)
+        self.dim = self.model.get_sentence_embedding_dimension()
+        self.gate = ModelGate()
+        self.batcher = QueryBatcher(self._encode_queries)
+        self.doc_batch_size = max(1, EMBED_DOC_BATCH_SIZE)
+        self._lock = threading.Lock()
+        self.counters = {
+            "query_texts": 0, "query_batches": 0, "query_seconds": 0.0,
+            "document_texts": 0, "document_batches": 0, "document_seconds": 0.0,
+        }
+
+    def _count(self, kind: str, texts: int, seconds: float):
+        with self._lock:
+            self.counters[f"{kind}_texts"] += texts
+            self.counters[f"{kind}_batches"] += 1
+            self.counters[f"{kind}_seconds"] += seconds
+
+    def _encode_queries(self, texts: List[str]) -> np.ndarray:
+        with self.gate.hold(urgent=True):
+            t0 = time.perf_counter()
+            embs = self.model.encode(texts, batch_size=len(texts), show_progress_bar=False,
+                                     convert_to_numpy=True, normalize_embeddings=True)
+        self._count("query", len(texts), time.perf_counter() - t0)
+        return embs
 
     def embed_documents(self, texts: list) -> np.ndarray:
-        # returns numpy array (n, d)
-        embeddings = self.model.encode(texts, show_progress_bar=True, convert_to_numpy=True, normalize_embeddings=True)
-        return embeddings
+        """
+        (n, d) document embeddings. Texts are sorted by length and encoded in sub-batches of
+        similar length (less padding); the model is released between sub-batches so
+        queries are not stuck behind a whole ingest batch.
+        """
+        if not texts:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        order = np.argsort([len(t) for t in texts], kind="stable")
+        out = np.empty((len(texts), self.dim), dtype=np.float32)
+        for s in range(0, len(order), self.doc_batch_size):
+            idx = order[s:s + self.doc_batch_size]
+            with self.gate.hold(urgent=False):
+                t0 = time.perf_counter()
+                out[idx] = self.model.encode([texts[i] for i in idx], batch_size=len(idx), show_progress_bar=False,
+                                             convert_to_numpy=True, normalize_embeddings=True)
+            self._count("document", len(idx), time.perf_counter() - t0)
+        return out
 
     def embed_query(self, text: str):
-        cache_hit = EMBED_CACHE.get(("q", text))
-        if cache_hit is not None:
-            return cache_hit
-        emb = self.model.encode([text], convert_to_numpy=True, normalize_embeddings=True)[0]
-        EMBED_CACHE.set(("q", text), emb)
-        return emb
+        # concurrent misses on the same text share one encode; different texts share a batch
+        with metrics.stage("embed"):
+            return EMBED_CACHE.get_or_compute(("q", text), lambda: self.batcher.embed(text))
+
+    def embed_queries(self, texts: list) -> np.ndarray:
+        """(n, d) query embeddings; cache misses are encoded together in one call."""
+        keys = [("q", t) for t in texts]
+        with metrics.stage("embed"):
+            cached = [EMBED_CACHE.get(k) for k in keys]
+            missing = sorted({t for t, c in zip(texts, cached) if c is None})
+            if missing:
+                embs = self._encode_queries(missing)
+                fresh = dict(zip(missing, embs))
+                for t, emb in fresh.items():
+                    EMBED_CACHE.set(("q", t), emb)
+                cached = [c if c is not None else fresh[t] for t, c in zip(texts, cached)]
+        return np.vstack(cached).astype(np.float32) if cached else np.zeros((0, self.dim), dtype=np.float32)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            c = dict(self.counters)
+        return {
+            "backend": self.backend,
+            **{k: round(v, 3) if isinstance(v, float) else v for k, v in c.items()},
+            "avg_query_batch": round(c["query_texts"] / c["query_batches"], 2) if c["query_batches"] else 0.0,
+            "query_texts_per_s": round(c["query_texts"] / c["query_seconds"], 1) if c["query_seconds"] else 0.0,
+            "document_texts_per_s": round(c["document_texts"] / c["document_seconds"], 1) if c["document_seconds"] else 0.0,
+        }
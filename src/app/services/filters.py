@@ -0,0 +1,60 @@
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+
+
+def source_matches(stored: str, name: str) -> bool:
+    """
+    Whether `name` names the stored source: its full path or its file name, ignoring case.
+    Search filters, DELETE /documents/{name} and the document registry all match this way.
+    """
+    name = name.lower()
+    return stored.lower() == name or Path(stored).name.lower() == name
+
+
+class SearchFilter:
+    """
+    Restricts a search to some documents and/or a page range. Sources match stored
+    sources as source_matches() does.
+    """
+
+    def __init__(self, sources: Optional[List[str]] = None, page_from: Optional[int] = None, page_to: Optional[int] = None):
+        self.sources = sorted({s.strip() for s in sources or [] if s and s.strip()})
+        self.page_from = page_from
+        self.page_to = page_to
+
+    def is_empty(self) -> bool:
+        return not self.sources and self.page_from is None and self.page_to is None
+
+    def key(self) -> str:
+        """Stable string for cache keys."""
+        return f"{'|'.join(self.sources)}:{self.page_from}:{self.page_to}"
+
+    def matching_sources(self, stored: List[str]) -> List[str]:
+        return [s for s in stored if any(source_matches(s, name) for name in self.sources)]
+
+    def rows(self, chunks) -> np.ndarray:
+        """Ascending chunk-store rows that pass the filter."""
+        if self.sources:
+            rows = chunks.rows_for_sources(self.matching_sources(chunks.sources))
+        else:
+            rows = np.arange(len(chunks), dtype=np.int64)
+        if self.page_from is not None or self.page_to is not None:
+            pages = np.asarray(chunks.pages)[rows]
+            keep = pages >= 0   # chunks without pages never match a page range
+            if self.page_from is not None:
+                keep &= pages >= self.page_from
+            if self.page_to is not None:
+                keep &= pages <= self.page_to
+            rows = rows[keep]
+        return rows
+
+    def to_dict(self):
+        return {"sources": self.sources, "page_from": self.page_from, "page_to": self.page_to}
+
+
+def make_filter(sources: Optional[List[str]] = None, page_from: Optional[int] = None, page_to: Optional[int] = None) -> Optional[SearchFilter]:
+    """SearchFilter from request parameters, None when nothing is restricted."""
+    flt = SearchFilter(sources, page_from, page_to)
+    return None if flt.is_empty() else flt
@@ -0,0 +1,195 @@
+import math
+from typing import Dict, Optional
+
+import faiss
+import numpy as np
+
+from src.utils.config import (
+    FAISS_INDEX_TYPE,
+    FAISS_NLIST,
+    FAISS_NPROBE,
+    FAISS_PQ_M,
+    FAISS_PQ_NBITS,
+    FAISS_HNSW_M,
+    FAISS_EF_SEARCH,
+    FAISS_EF_CONSTRUCTION,
+)
+
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw", "sq8")
+
+# types whose stored codes are lossy; searches over them are re-scored with the full vectors
+COMPRESSED_TYPES = ("ivf_pq", "sq8")
+
+# k-means wants ~39 points per centroid before faiss warns about the training set
+MIN_POINTS_PER_CENTROID = 39
+MIN_NLIST = 8
+# per-dimension min/max of the int8 scalar quantizer need a reasonable sample
+MIN_SQ_TRAIN = 256
+
+
+def default_params() -> Dict:
+    """Index parameters from the environment; build params are frozen into the manifest."""
+    return {
+        "type": FAISS_INDEX_TYPE or "flat",
+        "nlist": FAISS_NLIST,          # 0 = choose from corpus size at training time
+        "nprobe": FAISS_NPROBE,
+        "pq_m": FAISS_PQ_M,
+        "pq_nbits": FAISS_PQ_NBITS,
+        "M": FAISS_HNSW_M,
+        "ef_search": FAISS_EF_SEARCH,
+        "ef_construction": FAISS_EF_CONSTRUCTION,
+    }
+
+
+def choose_nlist(n: int, params: Dict) -> int:
+    if params.get("nlist"):
+        return int(params["nlist"])
+    return max(1, min(int(4 * math.sqrt(max(n, 1))), n // MIN_POINTS_PER_CENTROID))
+
+
+def can_build(kind: str, n: int, params: Dict) -> bool:
+    """True when `n` vectors are enough to train an index of this kind."""
+    if kind in ("flat", "hnsw"):
+        return True
+    if kind == "sq8":
+        return n >= MIN_SQ_TRAIN
+    nlist = choose_nlist(n, params)
+    if nlist < MIN_NLIST or n < nlist * MIN_POINTS_PER_CENTROID:
+        return False
+    if kind == "ivf_pq":
+        return n >= (2 ** int(params["pq_nbits"])) * MIN_POINTS_PER_CENTROID
+    return True
+
+
+def build_index(kind: str, dim: int, params: Dict, train_vectors: Optional[np.ndarray] = None) -> faiss.Index:
+    """Empty (trained) inner-product index of the requested kind; resolved nlist is written back to params."""
+    if kind not in INDEX_TYPES:
+        raise ValueError(f"Unknown FAISS index type '{kind}', expected one of {INDEX_TYPES}")
+
+    if kind == "flat":
+        return faiss.IndexFlatIP(dim)
+
+    if kind == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, int(params["M"]), faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = int(params["ef_construction"])
+        index.hnsw.efSearch = int(params["ef_search"])
+        return index
+
+    if train_vectors is None or not can_build(kind, train_vectors.shape[0], params):
+        raise ValueError(f"Not enough vectors to train a {kind} index")
+
+    if kind == "sq8":
+        index = faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_INNER_PRODUCT)
+        index.train(np.ascontiguousarray(train_vectors, dtype=np.float32))
+        return index
+
+    nlist = choose_nlist(train_vectors.shape[0], params)
+    params["nlist"] = nlist
+    if kind == "ivf_flat":
+        spec = f"IVF{nlist},Flat"
+    else:
+        spec = f"IVF{nlist},PQ{int(params['pq_m'])}x{int(params['pq_nbits'])}"
+    index = faiss.index_factory(dim, spec, faiss.METRIC_INNER_PRODUCT)
+    index.train(np.ascontiguousarray(train_vectors, dtype=np.float32))
+    faiss.extract_index_ivf(index).nprobe = int(params["nprobe"])
+    return index
+
+
+def is_id_mapped(index: faiss.Index) -> bool:
+    return isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2))
+
+
+def base_index(index: faiss.Index) -> faiss.Index:
+    """The index doing the work, underneath an id map."""
+    return faiss.downcast_index(index.index) if is_id_mapped(index) else faiss.downcast_index(index)
+
+
+def id_mapped(index: faiss.Index) -> faiss.Index:
+    """Wrap an empty index so vectors are added under explicit (stable) ids."""
+    return faiss.IndexIDMap2(index)
+
+
+def index_kind(index: faiss.Index) -> str:
+    base = base_index(index)
+    if isinstance(base, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(base, faiss.IndexScalarQuantizer):
+        return "sq8"
+    if isinstance(base, faiss.IndexIVFPQ):
+        return "ivf_pq"
+    if isinstance(base, faiss.IndexIVF):
+        return "ivf_flat"
+    return "flat"
+
+
+def apply_search_defaults(index: faiss.Index, params: Dict):
+    """Set the persisted nprobe / efSearch on a freshly loaded index."""
+    kind = index_kind(index)
+    if kind in ("ivf_flat", "ivf_pq"):
+        faiss.extract_index_ivf(base_index(index)).nprobe = int(params.get("nprobe") or FAISS_NPROBE)
+    elif kind == "hnsw":
+        base_index(index).hnsw.efSearch = int(params.get("ef_search") or FAISS_EF_SEARCH)
+
+
+def search_parameters(index: faiss.Index, nprobe: Optional[int] = None, ef_search: Optional[int] = None, sel=None):
+    """
+    Per-request search knobs as a faiss SearchParameters object (None when not applicable),
+    so concurrent requests never mutate the shared index. `sel` is an IDSelector over
+    (external) ids; only those ids are scored.
+    """
+    kind = index_kind(index)
+    if (nprobe or sel is not None) and kind in ("ivf_flat", "ivf_pq"):
+        nprobe = int(nprobe or faiss.extract_index_ivf(base_index(index)).nprobe)
+        return faiss.SearchParametersIVF(nprobe=nprobe) if sel is None else faiss.SearchParametersIVF(nprobe=nprobe, sel=sel)
+    if (ef_search or sel is not None) and kind == "hnsw":
+        ef_search = int(ef_search or base_index(index).hnsw.efSearch)
+        return faiss.SearchParametersHNSW(efSearch=ef_search) if sel is None else faiss.SearchParametersHNSW(efSearch=ef_search, sel=sel)
+    if sel is not None:
+        return faiss.SearchParameters(sel=sel)
+    return None
+
+
+def all_vectors(index: faiss.Index) -> np.ndarray:
+    """Reconstruct every stored vector of a positional (not id-mapped) index in id order (decoded for PQ)."""
+    n = index.ntotal
+    if n == 0:
+        return np.zeros((0, index.d), dtype=np.float32)
+    if index_kind(index) in ("ivf_flat", "ivf_pq"):
+        faiss.extract_index_ivf(index).make_direct_map()
+    return index.reconstruct_n(0, n)
+
+
+def index_bytes(index: faiss.Index) -> int:
+    """Serialized size of the index, a close proxy for its resident memory."""
+    return int(faiss.serialize_index(index).nbytes)
+
+
+def describe(index: faiss.Index, params: Dict) -> Dict:
+    kind = index_kind(index)
+    info = {"type": kind, "ntotal": int(index.ntotal), "dim": int(index.d), "id_mapped": is_id_mapped(index)}
+    if kind in ("ivf_flat", "ivf_pq"):
+        ivf = faiss.extract_index_ivf(base_index(index))
+        info.update({"nlist": int(ivf.nlist), "nprobe": int(ivf.nprobe)})
+        if kind == "ivf_pq":
+            info.update({"pq_m": int(params.get("pq_m")), "pq_nbits": int(params.get("pq_nbits"))})
+    elif kind == "hnsw":
+        hnsw = base_index(index).hnsw
+        info.update({"M": int(params.get("M")), "ef_search": int(hnsw.efSearch), "ef_construction": int(hnsw.efConstruction)})
+    return info
+
+
+if __name__ == "__main__":
+    # python -m src.app.services.index_factory <flat|ivf_flat|ivf_pq|hnsw|sq8>
+    import sys
+    from src.app.services.registry import get_embedder
+    from src.app.services.vector_store import FaissStore, STORE, WRITE_LOCK
+
+    target = sys.argv[1] if len(sys.argv) > 1 else (FAISS_INDEX_TYPE or "flat")
+    # the rebuild is published like an ingest, so it must not interleave with other writers
+    with WRITE_LOCK:
+        store = FaissStore(get_embedder().dim)
+        print("Before:", describe(store.index.main, store.index_params))
+        store.migrate(target)
+        print("After: ", describe(store.index.main, store.index_params))
+    STORE.invalidate()
+    print("Memory:", store.memory_report())
@@ -0,0 +1,174 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from typing import Dict, List, Optional
+
+from src.app.services.ingest_service import ingest_paths, IngestCancelled
+from src.utils.config import INGEST_MAX_JOBS, INGEST_QUEUE_DEPTH, INGEST_JOB_HISTORY
+from src.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Job states
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED = (DONE, FAILED, CANCELLED)
+
+
+class JobQueueFull(Exception):
+    """Too many ingestion jobs waiting."""
+
+
+class IngestProgress:
+    """Per-stage counters, updated by the ingest pipeline as it goes."""
+
+    STAGES = ("documents", "parsed_pages", "chunks", "embedded", "indexed")
+
+    def __init__(self, documents: int):
+        self._lock = threading.Lock()
+        self.total_documents = documents
+        self.counts = {stage: 0 for stage in self.STAGES}
+
+    def add(self, stage: str, n: int = 1):
+        with self._lock:
+            self.counts[stage] += n
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {"total_documents": self.total_documents, **self.counts}
+
+
+class IngestJob:
+    def __init__(self, paths: List[str]):
+        self.id = uuid.uuid4().hex
+        self.paths = paths
+        self.status = QUEUED
+        self.progress = IngestProgress(len(paths))
+        self.cancel_event = threading.Event()
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.result: Optional[Dict] = None
+        self.error: Optional[str] = None
+
+    def to_dict(self) -> Dict:
+        end = self.finished_at or time.time()
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "files": [p.split("/")[-1].split("\\")[-1] for p in self.paths],
+            "progress": self.progress.snapshot(),
+            "queued_for": round((self.started_at or end) - self.created_at, 3),
+            "elapsed": round(end - self.started_at, 3) if self.started_at else 0.0,
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+class IngestJobQueue:
+    """
+    Background ingestion: jobs wait in a bounded FIFO and are run by `max_jobs` worker
+    threads, so ingestion never runs on the event loop and at most `max_jobs` ingests
+    compete with query serving. Finished jobs are kept (last `history`) for status polling.
+    """
+
+    def __init__(self, max_jobs: int = INGEST_MAX_JOBS, max_queue: int = INGEST_QUEUE_DEPTH, history: int = INGEST_JOB_HISTORY):
+        self.max_jobs = max(1, max_jobs)
+        self.max_queue = max(0, max_queue)
+        self.history = history
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+        self._queue = deque()
+        self._jobs: "OrderedDict[str, IngestJob]" = OrderedDict()
+        self._workers: List[threading.Thread] = []
+        self.running = 0
+
+    def _ensure_workers(self):
+        # started lazily so importing the module has no side effects
+        if self._workers:
+            return
+        for i in range(self.max_jobs):
+            t = threading.Thread(target=self._work, name=f"ingest-worker-{i}", daemon=True)
+            t.start()
+            self._workers.append(t)
+
+    def submit(self, paths: List[str]) -> IngestJob:
+        job = IngestJob(paths)
+        with self._cond:
+            if len(self._queue) >= self.max_queue:
+                raise JobQueueFull(f"Ingestion queue full ({len(self._queue)} waiting)")
+            self._jobs[job.id] = job
+            self._queue.append(job)
+            self._trim()
+            self._ensure_workers()
+            self._cond.notify()
+        logger.info(f"[INGEST-JOBS] queued {job.id} ({len(paths)} files)")
+        return job
+
+    def get(self, job_id: str) -> Optional[IngestJob]:
+        return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> Optional[IngestJob]:
+        """Queued jobs are dropped; running jobs stop after the current micro-batch is committed."""
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None or job.status in FINISHED:
+                return job
+            job.cancel_event.set()
+            if job.status == QUEUED:
+                self._queue.remove(job)
+                job.status = CANCELLED
+                job.finished_at = time.time()
+        return job
+
+    def _trim(self):
+        """Called with the lock held: forget the oldest finished jobs beyond the history size."""
+        finished = [jid for jid, j in self._jobs.items() if j.status in FINISHED]
+        for jid in finished[: max(0, len(finished) - self.history)]:
+            del self._jobs[jid]
+
+    def _work(self):
+        while True:
+            with self._cond:
+                while not self._queue:
+                    self._cond.wait()
+                job = self._queue.popleft()
+                job.status = RUNNING
+                job.started_at = time.time()
+                self.running += 1
+            try:
+                job.result = ingest_paths(job.paths, progress=job.progress, should_stop=job.cancel_event.is_set)
+                job.status = DONE
+            except IngestCancelled:
+                job.status = CANCELLED
+            except Exception as e:
+                job.status = FAILED
+                job.error = str(e)
+                logger.error(f"[INGEST-JOBS] {job.id} failed: {e}", exc_info=True)
+            finally:
+                job.finished_at = time.time()
+                with self._cond:
+                    self.running -= 1
+                    self._trim()
+            logger.info(f"[INGEST-JOBS] {job.id} {job.status} in {job.finished_at - job.started_at:.2f}s")
+
+    def stats(self) -> Dict:
+        with self._lock:
+            by_status = {}
+            for job in self._jobs.values():
+                by_status[job.status] = by_status.get(job.status, 0) + 1
+            return {
+                "max_jobs": self.max_jobs,
+                "running": self.running,
+                "queued": len(self._queue),
+                "max_queue": self.max_queue,
+                "jobs": by_status,
+            }
+
+
+# Singleton ingestion queue
+INGEST_JOBS = IngestJobQueue()
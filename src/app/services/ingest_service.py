@@ -1,42 +1,224 @@
-from src.ingestion.loaders import load_document 
-from src.ingestion.splitter import document_to_chunks 
-from src.app.services.embedder import Embedder 
-from src.app.services.vector_store import FaissStore 
-from src.utils.config import EMBEDDER_MODEL 
+from src.ingestion.parallel_loader import load_documents_parallel
+from src.ingestion.splitter import document_to_chunks
+from src.app.services.registry import get_embedder
+from src.app.services.vector_store import FaissStore, STORE, WRITE_LOCK
+from src.app.services.compaction import COMPACTOR, MERGER
+from src.app.services.doc_registry import DocumentRegistry, file_hash, chunk_hash
+from src.app.services.filters import source_matches
+from src.utils.config import INGEST_BATCH_SIZE, INGEST_MAX_BUFFER_MB
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
 import numpy as np
 
-def ingest_paths(paths: list):
-    # 1) load raw docs
-    docs = [load_document(p) for p in paths]
-
-    # 2) split into chunks
-    all_chunks = []
-    metadatas = []
-    texts = []        # NEW
-
-    print("STEP 2: Splitting into chunks...", flush=True)
-    for doc in docs:
-        chunks = document_to_chunks(doc)
-        print(f"  Loaded {len(chunks)} chunks from {doc['source']}", flush=True)
-
-        for i, c in enumerate(chunks):
-            meta = {"source": c["source"], "chunk_index": i}
-            metadatas.append(meta)
-            texts.append(c["text"])   # IMPORTANT
-            all_chunks.append(c["text"])
-
-    # 3) embed chunks
-    print("STEP 3: Embedding chunks...", flush=True)
-    embedder = Embedder()
-    embeddings = embedder.embed_documents(all_chunks)
-    print("  Embeddings generated.", flush=True)
-
-    dim = embeddings.shape[1]
-
-    # 4) add to faiss
-    print("STEP 4: Saving to FAISS...", flush=True)
-    store = FaissStore(dim)
-    store.add(embeddings, metadatas, texts)
-    print("  Added to FAISS.", flush=True)
-
-    return {"ingested": len(all_chunks)}
+
+class IngestCancelled(Exception):
+    """should_stop() returned True; batches committed so far stay (the run is resumable)."""
+
+
+class _NoProgress:
+    def add(self, stage: str, n: int = 1):
+        pass
+
+
+def legacy_chunks(store: FaissStore, source: str):
+    """
+    (chunk hash, id) pairs of every live chunk the store holds for `source`: documents
+    ingested before the registry existed, or partly added by an interrupted ingest.
+    """
+    ids = store.chunks.ids_for_source(source)
+    ids = ids[~np.isin(ids, store.retired)]
+    batch = store.chunks.gather(ids)
+    return [
+        (chunk_hash(batch.text(j), batch.meta(j).get("page")), int(ids[j]))
+        for j in range(len(batch))
+    ]
+
+
+class DocPlan:
+    """One changed document: its chunk hashes and the ids assigned so far (kept or newly added)."""
+
+    def __init__(self, path: str, digest: str, hashes: List[str], kept: Dict[int, int], n_new: int):
+        self.path = path
+        self.digest = digest
+        self.hashes = hashes
+        self.ids = dict(kept)
+        self.outstanding = n_new   # new chunks not committed to FAISS yet
+
+    def record(self, registry: DocumentRegistry):
+        registry.record(self.path, self.digest, [(h, self.ids[pos]) for pos, h in enumerate(self.hashes)])
+
+
+def micro_batches(items: Iterator[Tuple], dim: int) -> Iterator[List[Tuple]]:
+    """Group (plan, position, text, meta) items into batches bounded by count and bytes."""
+    budget = INGEST_MAX_BUFFER_MB * 1024 * 1024
+    batch, size = [], 0
+    for item in items:
+        batch.append(item)
+        size += len(item[2]) * 4 + dim * 4   # worst-case utf-8 text + float32 embedding
+        if len(batch) >= INGEST_BATCH_SIZE or size >= budget:
+            yield batch
+            batch, size = [], 0
+    if batch:
+        yield batch
+
+
+def ingest_paths(paths: list, progress=None, should_stop: Optional[Callable[[], bool]] = None):
+    """
+    Streaming ingest: load -> split -> diff -> embed + commit in micro-batches.
+    Memory is bounded by the loader's in-flight tasks plus one batch, whatever the upload size.
+    Each batch is committed to FAISS and the run is checkpointed in the document registry,
+    so an interrupted ingest resumes where it stopped when the same paths are ingested again.
+    WRITE_LOCK is held only while a batch is committed; parsing and embedding run without it.
+    `progress.add(stage, n)` receives documents / parsed_pages / chunks / embedded / indexed
+    counts; `should_stop` is checked between documents and batches (raises IngestCancelled).
+    """
+    progress = progress or _NoProgress()
+    should_stop = should_stop or (lambda: False)
+
+    def check_cancelled():
+        if should_stop():
+            raise IngestCancelled()
+
+    registry = DocumentRegistry()
+
+    # 1) skip files whose bytes did not change since the last ingest
+    print("STEP 1: Hashing documents...", flush=True)
+    digests = {p: file_hash(p) for p in paths}
+    changed = [p for p in paths if not registry.is_unchanged(p, digests[p])]
+    print(f"  {len(paths) - len(changed)} unchanged, {len(changed)} new or modified", flush=True)
+    stats = {"ingested": 0, "skipped_documents": len(paths) - len(changed), "kept_chunks": 0, "retired_chunks": 0, "failed": {}}
+    progress.add("documents", len(paths) - len(changed))
+    if not changed:
+        return stats
+    check_cancelled()
+
+    with WRITE_LOCK:
+        registry = DocumentRegistry()   # re-read: another ingest may have committed meanwhile
+        resuming = {p for p in changed if registry.is_pending(p)}
+        if resuming:
+            print(f"  resuming {len(resuming)} interrupted document(s)", flush=True)
+        registry.pending = sorted(set(registry.pending) | set(changed))
+        registry.save()
+
+    # parsing, diffing and embedding read a snapshot without the lock; only commit() writes
+    embedder = get_embedder()
+    store = FaissStore(embedder.dim)
+    stale: List[int] = []          # ids to retire at the next commit
+    finished: List[DocPlan] = []   # documents complete once the next commit lands
+    failed: List[str] = []
+
+    def commit(batch: List[Tuple] = (), embeddings: Optional[np.ndarray] = None):
+        """Under WRITE_LOCK: retire, add one micro-batch, publish and checkpoint the registry."""
+        nonlocal store, registry
+        with WRITE_LOCK:
+            # pick up what other writers published since the snapshot (loaded segments are reused)
+            store = FaissStore(embedder.dim, previous=store)
+            registry = DocumentRegistry()
+            store.retire(stale, publish=not batch)
+            if batch:
+                start_id = store._id_counter
+                store.add(embeddings, [meta for _, _, _, meta in batch], [text for _, _, text, _ in batch])
+                # a document is complete once its last new chunk is in FAISS
+                for offset, (plan, pos, _, _) in enumerate(batch):
+                    plan.ids[pos] = start_id + offset
+                    plan.outstanding -= 1
+                    if plan.outstanding == 0:
+                        finished.append(plan)
+            for plan in finished:
+                plan.record(registry)
+            for path in failed:
+                registry.finish(path)
+            registry.save()
+        stale.clear()
+        finished.clear()
+        failed.clear()
+
+    def new_chunks():
+        """Parse in the process pool, split and diff; yield only the chunks that need embedding."""
+        for path, doc, error in load_documents_parallel(changed):
+            check_cancelled()
+            progress.add("documents")
+            if error:
+                print(f"  FAILED {path}: {error}", flush=True)
+                stats["failed"][path] = error
+                failed.append(path)
+                continue
+            progress.add("parsed_pages", len(doc["pages"]) if "pages" in doc else 1)
+            chunks = document_to_chunks(doc)
+            del doc
+            progress.add("chunks", len(chunks))
+            print(f"  Loaded {len(chunks)} chunks from {path}", flush=True)
+            hashes = [chunk_hash(c["text"], c["meta"].get("page")) for c in chunks]
+
+            # unknown or interrupted documents are diffed against what the store holds for them
+            previous = legacy_chunks(store, path) if path in resuming or not registry.is_known(path) else None
+            new_positions, kept, retired = registry.diff(path, hashes, previous)
+            stale.extend(retired)
+            stats["kept_chunks"] += len(kept)
+            stats["retired_chunks"] += len(retired)
+            progress.add("embedded", len(kept))
+            progress.add("indexed", len(kept))
+
+            plan = DocPlan(path, digests[path], hashes, kept, len(new_positions))
+            if not new_positions:
+                finished.append(plan)
+                continue
+            for pos in new_positions:
+                c = chunks[pos]
+                yield plan, pos, c["text"], {"source": c["source"], "chunk_index": pos, "page": c["meta"].get("page")}
+
+    # 2) embed and commit one micro-batch at a time
+    print("STEP 2: Loading, embedding and indexing in micro-batches...", flush=True)
+    try:
+        for batch in micro_batches(new_chunks(), embedder.dim):
+            check_cancelled()
+            embeddings = embedder.embed_documents([text for _, _, text, _ in batch])
+            progress.add("embedded", len(batch))
+            commit(batch, embeddings)
+            progress.add("indexed", len(batch))
+            stats["ingested"] += len(batch)
+            print(f"  committed {len(batch)} chunks ({stats['ingested']} total)", flush=True)
+    finally:
+        # also on cancellation/failure: commit the retirements and finished documents queued so far
+        if stale or finished or failed:
+            commit()
+        STORE.invalidate()
+    print(f"  Added {stats['ingested']} chunks, retired {stats['retired_chunks']}.", flush=True)
+    if not COMPACTOR.maybe_start(embedder.dim):
+        MERGER.maybe_start(embedder.dim)   # compaction already leaves a single segment
+    return stats
+
+
+def delete_source(source: str) -> Dict:
+    """
+    Remove a document (full path or file name, ignoring case) from search immediately:
+    its chunk ids are tombstoned and published; compaction reclaims them later.
+    """
+    with WRITE_LOCK:
+        registry = DocumentRegistry()
+        dim = get_embedder().dim
+        store = FaissStore(dim)
+        ids = [store.chunks.ids_for_source(s) for s in store.chunks.sources if source_matches(s, source)]
+        ids = np.concatenate(ids) if ids else np.zeros(0, dtype=np.int64)
+        ids = ids[~np.isin(ids, store.retired)]
+        forgotten = registry.forget(source)
+        store.retire(ids)
+        registry.save()
+    STORE.invalidate()
+    COMPACTOR.maybe_start(dim)
+    return {"source": source, "documents": len(forgotten), "retired_chunks": int(len(ids))}
+
+
+def resume_pending():
+    """Re-run the documents of an interrupted ingest; the ones already committed are skipped by hash."""
+    pending = [p for p in DocumentRegistry().pending if Path(p).exists()]
+    if not pending:
+        return {"ingested": 0}
+    return ingest_paths(pending)
+
+
+if __name__ == "__main__":
+    # python -m src.app.services.ingest_service [--resume | <paths>...]
+    import sys
+    args = sys.argv[1:]
+    print(resume_pending() if args == ["--resume"] else ingest_paths(args))
@@ -0,0 +1,217 @@
+import json
+import math
+import os
+import re
+import shutil
+import uuid
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from src.utils.config import FAISS_DIR, BM25_K1, BM25_B
+
+# Identifiers keep their inner punctuation ("err-4012", "hr_policy.v2") and also index their parts
+TOKEN_RE = re.compile(r"[a-z0-9]+(?:[-_./][a-z0-9]+)*")
+STOPWORDS = frozenset(
+    "a an and are as at be but by for from has have how i in is it its of on or that the this to "
+    "was what when where which who why will with you your".split()
+)
+
+# Files of one lexical segment (raw little-endian arrays, memory-mapped read-only)
+VOCAB_FILE = "vocab.json"          # term -> term number
+OFFSETS_FILE = "offsets.i64"       # term t's postings are [offsets[t], offsets[t + 1])
+DOCS_FILE = "docs.i32"             # posting -> document position, ascending within a term
+TF_FILE = "tf.u16"                 # posting -> term frequency (clipped)
+MAX_TF_FILE = "max_tf.u16"         # term -> largest tf, for the score upper bound
+DOC_IDS_FILE = "doc_ids.i64"       # document position -> chunk id
+DOC_LEN_FILE = "doc_len.i32"       # document position -> token count
+
+
+def tokenize(text: str) -> List[str]:
+    tokens = []
+    for tok in TOKEN_RE.findall(text.lower()):
+        if tok in STOPWORDS:
+            continue
+        tokens.append(tok)
+        if not tok.isalnum():
+            tokens.extend(p for p in re.split(r"[-_./]", tok) if p and p not in STOPWORDS)
+    return tokens
+
+
+def _memmap(path: Path, dtype) -> np.ndarray:
+    size = path.stat().st_size if path.exists() else 0
+    if size == 0:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r")
+
+
+class LexicalSegment:
+    """
+    BM25 postings of the chunks of one index segment, immutable once written.
+    Postings are flat arrays (doc position + tf per posting, one offset per term), memory-mapped,
+    so a segment costs page cache rather than heap; only the vocabulary dict is resident.
+    """
+
+    def __init__(self, path: str):
+        self.path = path   # relative to FAISS_DIR, as listed in the manifest
+        root = FAISS_DIR / path
+        with open(root / VOCAB_FILE, "r") as f:
+            self.vocab: Dict[str, int] = json.load(f)
+        self.offsets = _memmap(root / OFFSETS_FILE, np.int64)
+        self.docs = _memmap(root / DOCS_FILE, np.int32)
+        self.tf = _memmap(root / TF_FILE, np.uint16)
+        self.max_tf = _memmap(root / MAX_TF_FILE, np.uint16)
+        self.doc_ids = _memmap(root / DOC_IDS_FILE, np.int64)
+        self.doc_len = _memmap(root / DOC_LEN_FILE, np.int32)
+        self.min_len = int(self.doc_len.min()) if len(self.doc_len) else 0
+        self.total_len = int(np.asarray(self.doc_len, dtype=np.int64).sum())
+
+    @property
+    def n_docs(self) -> int:
+        return len(self.doc_ids)
+
+    def df(self, term: str) -> int:
+        t = self.vocab.get(term)
+        return 0 if t is None else int(self.offsets[t + 1] - self.offsets[t])
+
+    def nbytes(self) -> int:
+        root = FAISS_DIR / self.path
+        return sum(f.stat().st_size for f in root.iterdir() if f.is_file())
+
+    def search(self, terms: Dict[str, float], k: int, avgdl: float, skip: Optional[np.ndarray] = None, theta: float = 0.0):
+        """
+        Top-k (scores, chunk ids) for {term: idf}. Terms are taken by decreasing score upper
+        bound (MaxScore): once the bounds of the remaining terms cannot lift an unseen
+        document above the current k-th score `theta`, their postings are only probed for
+        the documents already in the candidate set, and candidates that can no longer reach
+        theta are dropped. `skip` masks document positions (retired or filtered out).
+        """
+        plan = []
+        for term, idf in terms.items():
+            t = self.vocab.get(term)
+            if t is None:
+                continue
+            max_tf = float(self.max_tf[t])
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * self.min_len / avgdl)
+            plan.append((idf * max_tf * (BM25_K1 + 1) / (max_tf + norm), idf, int(self.offsets[t]), int(self.offsets[t + 1])))
+        plan.sort(reverse=True)
+        bounds = np.cumsum([p[0] for p in plan][::-1])[::-1] if plan else []
+
+        cand = np.zeros(0, dtype=np.int32)
+        scores = np.zeros(0, dtype=np.float32)
+        for i, (_, idf, lo, hi) in enumerate(plan):
+            docs = np.asarray(self.docs[lo:hi])
+            tf = np.asarray(self.tf[lo:hi], dtype=np.float32)
+            if bounds[i] <= theta:
+                # no unseen document can reach the top-k: score the candidates only
+                if not len(cand):
+                    break
+                pos = np.minimum(np.searchsorted(docs, cand), len(docs) - 1)
+                hit = docs[pos] == cand
+                docs, tf, target = docs[pos[hit]], tf[pos[hit]], np.flatnonzero(hit)
+            else:
+                if skip is not None:
+                    keep = ~skip[docs]
+                    docs, tf = docs[keep], tf[keep]
+                merged = np.union1d(cand, docs).astype(np.int32)
+                scores_m = np.zeros(len(merged), dtype=np.float32)
+                scores_m[np.searchsorted(merged, cand)] = scores
+                cand, scores = merged, scores_m
+                target = np.searchsorted(cand, docs)
+            dl = np.asarray(self.doc_len[docs], dtype=np.float32)
+            scores[target] += idf * tf * (BM25_K1 + 1) / (tf + BM25_K1 * (1 - BM25_B + BM25_B * dl / avgdl))
+
+            if len(scores) >= k:
+                theta = max(theta, float(np.partition(scores, len(scores) - k)[len(scores) - k]))
+                rest = bounds[i + 1] if i + 1 < len(bounds) else 0.0
+                alive = scores + rest >= theta
+                cand, scores = cand[alive], scores[alive]
+
+        if not len(cand):
+            return np.zeros(0, dtype=np.float32), np.zeros(0, dtype=np.int64)
+        top = np.argsort(-scores, kind="stable")[:k]
+        return scores[top], np.asarray(self.doc_ids[cand[top]], dtype=np.int64)
+
+
+def write_lexical(ids: Iterable[int], texts: Iterable[str]) -> LexicalSegment:
+    """Build and persist the postings of (id, text) pairs (written to a tmp dir, then renamed)."""
+    path = f"segments/lex-{uuid.uuid4().hex[:16]}"
+    root = FAISS_DIR / path
+    tmp = root.with_name(root.name + ".tmp")
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+
+    postings: Dict[str, List[Tuple[int, int]]] = {}
+    doc_ids, doc_len = [], []
+    for pos, (chunk_id, text) in enumerate(zip(ids, texts)):
+        tokens = tokenize(text)
+        doc_ids.append(int(chunk_id))
+        doc_len.append(len(tokens))
+        for term, tf in Counter(tokens).items():
+            postings.setdefault(term, []).append((pos, tf))
+
+    terms = sorted(postings)
+    counts = np.fromiter((len(postings[t]) for t in terms), dtype=np.int64, count=len(terms))
+    offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+    docs = np.fromiter((p for t in terms for p, _ in postings[t]), dtype=np.int32, count=int(offsets[-1]))
+    tf = np.fromiter((min(f, 65535) for t in terms for _, f in postings[t]), dtype=np.uint16, count=int(offsets[-1]))
+    max_tf = np.array([max(f for _, f in postings[t]) for t in terms], dtype=np.int64).clip(max=65535).astype(np.uint16)
+
+    with open(tmp / VOCAB_FILE, "w") as f:
+        json.dump({t: i for i, t in enumerate(terms)}, f)
+    for name, arr in (
+        (OFFSETS_FILE, offsets), (DOCS_FILE, docs), (TF_FILE, tf), (MAX_TF_FILE, max_tf),
+        (DOC_IDS_FILE, np.asarray(doc_ids, dtype=np.int64)), (DOC_LEN_FILE, np.asarray(doc_len, dtype=np.int32)),
+    ):
+        with open(tmp / name, "wb") as f:
+            f.write(np.ascontiguousarray(arr).tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+    os.replace(tmp, root)
+    return LexicalSegment(path)
+
+
+def collection_stats(query: str, segments: List[LexicalSegment]) -> Tuple[int, int, Dict[str, int]]:
+    """(documents, total length, {term: document frequency}) of the query's terms over `segments`."""
+    dfs = {}
+    for term in set(tokenize(query)):
+        df = sum(s.df(term) for s in segments)
+        if df:
+            dfs[term] = df
+    return sum(s.n_docs for s in segments), sum(s.total_len for s in segments), dfs
+
+
+def bm25_weights(n_docs: int, total_len: int, dfs: Dict[str, int]) -> Tuple[Dict[str, float], float]:
+    """({term: idf}, average document length) from collection statistics (summed across shards if need be)."""
+    if not n_docs:
+        return {}, 1.0
+    avgdl = max(1.0, total_len / n_docs)
+    terms = {term: math.log(1 + (n_docs - df + 0.5) / (df + 0.5)) for term, df in dfs.items() if df}
+    return terms, avgdl
+
+
+def bm25_terms(query: str, segments: List[LexicalSegment]) -> Tuple[Dict[str, float], float]:
+    """({term: idf}, average document length) with collection statistics summed over `segments`."""
+    return bm25_weights(*collection_stats(query, segments))
+
+
+def rrf_fuse(rankings: List[np.ndarray], k: int, c: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Reciprocal rank fusion of id rankings (-1 = empty): top-k (ids, scores) by sum of 1 / (c + rank)."""
+    fused: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, i in enumerate(int(x) for x in ranking if x >= 0):
+            fused[i] = fused.get(i, 0.0) + 1.0 / (c + rank + 1)
+    best = sorted(fused.items(), key=lambda kv: -kv[1])[:k]
+    return np.array([i for i, _ in best], dtype=np.int64), np.array([s for _, s in best], dtype=np.float32)
+
+
+if __name__ == "__main__":
+    # python -m src.app.services.lexical   (backfill postings for segments indexed before hybrid search)
+    from src.app.services.registry import get_embedder
+    from src.app.services.vector_store import FaissStore, STORE, WRITE_LOCK
+    with WRITE_LOCK:
+        built = FaissStore(get_embedder().dim).build_lexical()
+    STORE.invalidate()
+    print(f"Built BM25 postings for {built} segment(s)")
@@ -1,23 +1,160 @@
 import re
 import os
-from llama_cpp import Llama
+import time
+from typing import Callable, Iterator, List, Optional, Tuple
 from pathlib import Path
+from src.utils.config import LLM_THREADS, LLM_SLOTS, LLM_PREFIX_CACHE
+from src.app.services import metrics
 from src.utils.logger import get_logger
 
 LLAMA_MODEL_PATH = Path(os.getenv("LLAMA_MODEL_PATH"))
 logger = get_logger(__name__)
 
-class LLMClient:
+SYSTEM_PROMPT = (
+    "You are an enterprise HR assistant. "
+    "Use ONLY the provided context. "
+    "Provide a clear factual answer. "
+    "If answer is not in the context, reply: 'I don't know.' "
+    "Output plain text only."
+)
+
+INSTRUCTIONS = """You are an enterprise knowledge assistant. Use ONLY the information in the Context to answer the Question.
+
+INSTRUCTIONS:
+- Read the Context and then answer the Question directly in your own words.
+- Keep the answer concise, factual, and actionable (1-6 sentences).
+- If the context doesn't contain enough information to answer, respond exactly: "I don't know."
+- Do NOT repeat sentences verbatim from the Context (no copy-paste).
+- Do NOT output HTML, XML, or any markup.
+- Do NOT hallucinate or invent facts.
+- If multiple context parts have relevant details, combine them into a short direct answer.
+
+"""
+
+# Identical for every request, so it comes first and its KV state is cached
+PROMPT_PREFIX = f"{SYSTEM_PROMPT}\n\n{INSTRUCTIONS}"
+
+SAMPLING = {"max_tokens": 700, "temperature": 0.6, "top_p": 0.9, "repeat_penalty": 1.05}
+
+
+class GenerationCancelled(Exception):
+    """Raised when a generation is stopped early (client gone or deadline passed)."""
+
+
+class AnswerStreamFilter:
+    """
+    Incremental counterpart of LLMClient.extract_final_answer for streamed completions.
+    feed() returns events: ("token", text) for cleaned text that is safe to show, and
+    ("reset", "") when a late </think> turns everything shown so far into reasoning.
+    Text that could still turn into a tag, an entity or an "Answer:" label is held back
+    until the next piece arrives.
+    """
+
+    HOLD_TOKENS = ("&lt;", "&gt;", "Answer:", "Final answer:")
+    MAX_TAG_HOLD = 64
+
     def __init__(self):
+        self.raw = ""
+        self._answer_from = None   # offset in raw where the answer starts; None while thinking/undecided
+        self._reset_sanitizer()
+
+    def _reset_sanitizer(self):
+        self._pending = ""
+        self._emitted = False
+        self._space = False
+
+    def feed(self, text: str) -> List[Tuple[str, str]]:
+        self.raw += text
+        events = []
+
+        end_think = self.raw.rfind("</think>")
+        if end_think != -1 and end_think + len("</think>") != self._answer_from:
+            # (new) end of the reasoning block: restart the answer after it
+            if self._emitted:
+                events.append(("reset", ""))
+            self._reset_sanitizer()
+            self._answer_from = end_think + len("</think>")
+            delta = self._push(self.raw[self._answer_from:])
+        elif self._answer_from is None:
+            head = self.raw.lstrip()
+            if head.startswith("<think>") or "<think>".startswith(head):
+                return events  # inside (or possibly opening) a reasoning block
+            self._answer_from = 0
+            delta = self._push(self.raw)
+        else:
+            delta = self._push(text)
+
+        if delta:
+            events.append(("token", delta))
+        return events
+
+    def flush(self) -> List[Tuple[str, str]]:
+        if self._answer_from is None:
+            # never left the reasoning block: same as the batch path, keep everything
+            self._answer_from = 0
+            self._pending = self.raw
+        delta = self._clean(self._pending)
+        self._pending = ""
+        return [("token", delta)] if delta else []
+
+    def _push(self, text: str) -> str:
+        buf = self._pending + text
+        cut = len(buf)
+
+        lt = buf.rfind("<")
+        if lt != -1 and ">" not in buf[lt:] and len(buf) - lt <= self.MAX_TAG_HOLD:
+            cut = lt
+        for tok in self.HOLD_TOKENS:
+            for n in range(min(len(tok) - 1, len(buf)), 0, -1):
+                if buf.endswith(tok[:n]):
+                    cut = min(cut, len(buf) - n)
+                    break
+
+        ready, self._pending = buf[:cut], buf[cut:]
+        return self._clean(ready)
+
+    def _clean(self, text: str) -> str:
+        if not text:
+            return ""
+        text = re.sub(r"<[^>]+>", "", text)
+        text = text.replace("&lt;", "").replace("&gt;", "")
+        text = re.sub(r"`+", "", text)
+        text = re.sub(r"\*+", "", text)
+        text = text.replace("Answer:", "").replace("Final answer:", "")
+        if not text:
+            return ""
+
+        words = text.split()
+        if not words:
+            self._space = self._space or self._emitted
+            return ""
+        out = " " if self._emitted and (self._space or text[0].isspace()) else ""
+        out += " ".join(words)
+        self._space = text[-1].isspace()
+        self._emitted = True
+        return out
+
+
+class LLMClient:
+    def __init__(self, n_threads: int = max(1, LLM_THREADS // LLM_SLOTS)):
+        # imported here so the stream filter and the scheduler load without llama.cpp
+        from llama_cpp import Llama
+        # threads are split across scheduler slots so concurrent slots don't oversubscribe the CPU
         self.llm = Llama(
             model_path=str(LLAMA_MODEL_PATH),
             n_ctx=8192,
-            n_threads=8,
+            n_threads=n_threads,
             temperature=0.6,
             top_p=0.9,
             repeat_penalty=1.05,
             verbose=False
         )
+        self.prefix_cache = LLM_PREFIX_CACHE
+        self._prefix_tokens: Optional[List[int]] = None
+        self._prefix_state = None
+        self.prefix_restores = 0
+        if self.prefix_cache:
+            self.warm_prefix()
 
     # ---------------------------------------------------------
     # Extract final answer after </think>
@@ -55,44 +192,119 @@ class LLMClient:
     # ---------------------------------------------------------
     # Main generation method
     # ---------------------------------------------------------
-    def generate(self, prompt: str) -> str:
+    def build_prompt(self, prompt: str) -> str:
+        return (
+            f"{PROMPT_PREFIX}"
+            f"{prompt}\n\n"
+            f"Answer:"
+        )
+
+    # ---------------------------------------------------------
+    # Prompt prefix KV cache
+    # ---------------------------------------------------------
+    def warm_prefix(self):
+        """Evaluate PROMPT_PREFIX once and snapshot the llama.cpp state right after it."""
+        if self._prefix_state is not None:
+            return
+        self._prefix_tokens = self.llm.tokenize(PROMPT_PREFIX.encode("utf-8"), add_bos=True)
+        self.llm.reset()
+        self.llm.eval(self._prefix_tokens)
+        self._prefix_state = self.llm.save_state()
+        logger.info(f"Cached KV state for {len(self._prefix_tokens)} prefix tokens")
+
+    def _prompt_tokens(self, prompt: str):
+        """
+        Prefix and suffix are tokenized separately so the prefix tokens are byte-identical on
+        every call; llama_cpp then skips evaluating the longest prefix already in its KV cache.
+        If the cache no longer starts with the prefix, the snapshot is restored first.
+        """
+        if not self.prefix_cache:
+            return self.build_prompt(prompt)
+
+        self.warm_prefix()
+        n = len(self._prefix_tokens)
+        if self.llm.n_tokens < n or list(self.llm.input_ids[:n]) != self._prefix_tokens:
+            self.llm.load_state(self._prefix_state)
+            self.prefix_restores += 1
+        suffix = self.llm.tokenize(f"{prompt}\n\nAnswer:".encode("utf-8"), add_bos=False)
+        return self._prefix_tokens + suffix
+
+    def postprocess(self, output: str) -> str:
+        final = self.extract_final_answer(output)
+
+        # Final safety pass
+        final = re.sub(r"<[^>]+>", "", final)
+        final = final.replace("&lt;", "").replace("&gt;", "")
+        final = " ".join(final.split()).strip()
+
+        # Ensure it's valid
+        if final == "" or final.lower().startswith("context") or len(final) < 2:
+            return "I don't know."
+
+        return final
+
+    def _completion(self, prompt: str) -> Iterator[str]:
+        """
+        Streamed completion text pieces. Records prompt eval (until the first token) and
+        generation time plus token counts, also when the caller stops early.
+        """
+        tokens = self._prompt_tokens(prompt)
+        n_prompt = len(tokens) if isinstance(tokens, list) else len(self.llm.tokenize(tokens.encode("utf-8")))
+        n_completion = 0
+        t0 = time.perf_counter()
+        first = None
+        try:
+            for chunk in self.llm.create_completion(prompt=tokens, stream=True, **SAMPLING):
+                if first is None:
+                    first = time.perf_counter()
+                choice = chunk["choices"][0]
+                if choice.get("finish_reason") is None:
+                    n_completion += 1   # one chunk per sampled token; the last one only carries the finish reason
+                yield choice.get("text") or ""
+        finally:
+            end = time.perf_counter()
+            first = first or end
+            metrics.record_llm(n_prompt, n_completion, first - t0, end - first)
+
+    def generate(self, prompt: str, should_stop: Optional[Callable[[], bool]] = None) -> str:
+        """
+        Blocking generation. The completion is streamed internally, so with `should_stop`
+        it can be abandoned between tokens (raises GenerationCancelled).
+        """
         try:
-            system_prompt = (
-                "You are an enterprise HR assistant. "
-                "Use ONLY the provided context. "
-                "Provide a clear factual answer. "
-                "If answer is not in the context, reply: 'I don't know.' "
-                "Output plain text only."
-            )
-
-            full_prompt = (
-                f"{system_prompt}\n\n"
-                f"{prompt}\n\n"
-                f"Answer:"
-            )
-
-            raw = self.llm.create_completion(
-                prompt=full_prompt,
-                max_tokens=700,
-                temperature=0.6,
-                top_p=0.9,
-                repeat_penalty=1.05
-            )
-
-            output = raw["choices"][0]["text"]
-            final = self.extract_final_answer(output)
-
-            # Final safety pass
-            final = re.sub(r"<[^>]+>", "", final)
-            final = final.replace("&lt;", "").replace("&gt;", "")
-            final = " ".join(final.split()).strip()
-
-            # Ensure it's valid
-            if final == "" or final.lower().startswith("context") or len(final) < 2:
-                return "I don't know."
-
-            return final
+            output = ""
+            for piece in self._completion(prompt):
+                if should_stop is not None and should_stop():
+                    raise GenerationCancelled()
+                output += piece
 
+            return self.postprocess(output)
+
+        except GenerationCancelled:
+            raise
         except Exception as e:
             logger.error(f"LLM error: {e}")
             return "I don't know."
+
+    # ---------------------------------------------------------
+    # Streaming generation
+    # ---------------------------------------------------------
+    def stream(self, prompt: str, should_stop: Optional[Callable[[], bool]] = None) -> Iterator[Tuple[str, str]]:
+        """
+        Yields ("token", text) / ("reset", "") events as the model produces tokens,
+        then a single ("final", answer) with the same post-processing as generate().
+        """
+        filt = AnswerStreamFilter()
+        try:
+            for piece in self._completion(prompt):
+                if should_stop is not None and should_stop():
+                    raise GenerationCancelled()
+                if piece:
+                    yield from filt.feed(piece)
+            yield from filt.flush()
+            yield ("final", self.postprocess(filt.raw))
+        except GenerationCancelled:
+            raise
+        except Exception as e:
+            logger.error(f"LLM stream error: {e}")
+            yield ("final", "I don't know.")
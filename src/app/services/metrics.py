@@ -0,0 +1,151 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# Prometheus text exposition (format 0.0.4) without the client library: a few fixed histograms
+# updated by the pipeline, plus gauges/counters read from the services' stats at scrape time.
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+TOKEN_BUCKETS = (16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192)
+RATE_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """Cumulative-bucket histogram with one label (e.g. stage="rerank"); thread-safe."""
+
+    def __init__(self, name: str, help: str, buckets: Iterable[float], label: str):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(sorted(buckets))
+        self.label = label
+        self._lock = threading.Lock()
+        self._series: Dict[str, List] = {}   # label value -> [bucket counts..., +Inf count, sum]
+
+    def observe(self, value: float, label_value: str):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_value)
+            if series is None:
+                series = self._series[label_value] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[i] += 1
+            series[-1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {k: list(v) for k, v in self._series.items()}
+        for label_value, counts in sorted(series.items()):
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts[:-1]):
+                cumulative += n
+                labels = _labels({self.label: label_value, "le": _number(float(bound))})
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels({self.label: label_value})} {_number(counts[-1])}")
+            lines.append(f"{self.name}_count{_labels({self.label: label_value})} {cumulative}")
+        return lines
+
+
+STAGE_SECONDS = Histogram("rag_stage_seconds", "Time spent per pipeline stage", LATENCY_BUCKETS, "stage")
+REQUEST_SECONDS = Histogram("rag_request_seconds", "End-to-end request latency per endpoint", LATENCY_BUCKETS, "endpoint")
+LLM_TOKENS = Histogram("rag_llm_tokens", "Prompt and completion tokens per LLM call", TOKEN_BUCKETS, "kind")
+LLM_TOKENS_PER_SECOND = Histogram("rag_llm_tokens_per_second", "LLM throughput per call (prompt eval and generation)", RATE_BUCKETS, "phase")
+HISTOGRAMS = (REQUEST_SECONDS, STAGE_SECONDS, LLM_TOKENS, LLM_TOKENS_PER_SECOND)
+
+
+# ---- per-request breakdown (opt-in) ----
+_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("rag_timings", default=None)
+
+
+@contextmanager
+def collect(timings: Optional[Dict[str, float]] = None):
+    """Stages recorded in this thread/context are also added to `timings` (a fresh dict if None)."""
+    timings = {} if timings is None else timings
+    token = _timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _timings.reset(token)
+
+
+def collected(fn: Callable, timings: Optional[Dict[str, float]]) -> Callable:
+    """`fn` run with collect(timings), e.g. for a threadpool call; `fn` itself when timings is None."""
+    if timings is None:
+        return fn
+
+    def run(*args, **kwargs):
+        with collect(timings):
+            return fn(*args, **kwargs)
+    return run
+
+
+def breakdown(timings: Dict[str, float]) -> Dict[str, float]:
+    """Rounded copy for responses (seconds; token counts stay integers)."""
+    return {k: v if isinstance(v, int) else round(v, 4) for k, v in timings.items()}
+
+
+def record(stage: str, seconds: float):
+    STAGE_SECONDS.observe(seconds, stage)
+    timings = _timings.get()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + seconds
+
+
+@contextmanager
+def stage(name: str):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - t0)
+
+
+def record_llm(prompt_tokens: int, completion_tokens: int, prompt_seconds: float, generation_seconds: float):
+    """One LLM call: prompt eval (until the first token) and generation time, token counts and rates."""
+    record("prompt_eval", prompt_seconds)
+    record("generation", generation_seconds)
+    LLM_TOKENS.observe(prompt_tokens, "prompt")
+    LLM_TOKENS.observe(completion_tokens, "completion")
+    if prompt_seconds > 0:
+        LLM_TOKENS_PER_SECOND.observe(prompt_tokens / prompt_seconds, "prompt_eval")
+    if generation_seconds > 0 and completion_tokens:
+        LLM_TOKENS_PER_SECOND.observe(completion_tokens / generation_seconds, "generation")
+    timings = _timings.get()
+    if timings is not None:
+        timings["prompt_tokens"] = timings.get("prompt_tokens", 0) + prompt_tokens
+        timings["completion_tokens"] = timings.get("completion_tokens", 0) + completion_tokens
+
+
+# ---- exposition ----
+# (name, type, help, [(labels, value)]) for values read from the services at scrape time
+Family = Tuple[str, str, str, List[Tuple[Dict[str, str], float]]]
+
+
+def render(families: Iterable[Family] = ()) -> str:
+    lines: List[str] = []
+    for histogram in HISTOGRAMS:
+        lines.extend(histogram.render())
+    for name, kind, help, samples in families:
+        lines.append(f"# HELP {name} {help}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in samples:
+            lines.append(f"{name}{_labels(labels)} {_number(value)}")
+    return "\n".join(lines) + "\n"
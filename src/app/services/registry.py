@@ -0,0 +1,124 @@
+import threading
+import time
+from typing import Dict, Iterable, Optional
+
+from src.app.services.embedder import Embedder
+from src.app.services.reranker import CrossEncoderReranker
+from src.app.services.llm_client import LLMClient
+from src.app.services.vector_store import FaissStore, STORE
+from src.app.services.shards import ROUTER
+from src.utils.config import WARMUP_MODELS
+from src.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Registry lifecycle states
+STARTING = "starting"
+LOADING = "loading"
+READY = "ready"
+FAILED = "failed"
+
+
+class ModelRegistry:
+    """
+    Process-wide holder for the heavy models.
+    Each model is built at most once per process (double-checked per-model lock),
+    so concurrent first requests wait for the same load instead of loading twice.
+    """
+
+    def __init__(self, factories: Optional[Dict] = None):
+        self._factories = factories or {
+            "embedder": Embedder,
+            "reranker": CrossEncoderReranker,
+            "llm": LLMClient,
+        }
+        self._models: Dict[str, object] = {}
+        self._locks = {name: threading.Lock() for name in self._factories}
+        self.state = STARTING
+        self.error: Optional[str] = None
+        self.started_at = time.time()
+        self.load_seconds: Dict[str, float] = {}
+
+    def get(self, name: str):
+        model = self._models.get(name)
+        if model is not None:
+            return model
+        if name not in self._factories:
+            raise KeyError(f"Unknown model: {name}")
+
+        with self._locks[name]:
+            model = self._models.get(name)
+            if model is None:
+                t0 = time.time()
+                model = self._factories[name]()
+                self.load_seconds[name] = round(time.time() - t0, 3)
+                self._models[name] = model
+                logger.info(f"[REGISTRY] loaded {name} in {self.load_seconds[name]:.2f}s")
+        return model
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self._models
+
+    def warm_up(self, names: Optional[Iterable[str]] = None):
+        """Load the given models (default: WARMUP_MODELS) and flip the readiness state."""
+        names = list(names) if names is not None else WARMUP_MODELS
+        self.state = LOADING
+        try:
+            for name in names:
+                self.get(name)
+        except Exception as e:
+            self.state = FAILED
+            self.error = str(e)
+            logger.error(f"[REGISTRY] warm-up failed: {e}", exc_info=True)
+            return
+        self.state = READY
+        logger.info(f"[REGISTRY] ready: {', '.join(names) or 'no models'}")
+
+    def warm_up_in_background(self, names: Optional[Iterable[str]] = None) -> threading.Thread:
+        t = threading.Thread(target=self.warm_up, args=(names,), name="model-warmup", daemon=True)
+        t.start()
+        return t
+
+    def is_ready(self) -> bool:
+        return self.state == READY
+
+    def status(self) -> Dict:
+        return {
+            "state": self.state,
+            "error": self.error,
+            "uptime": round(time.time() - self.started_at, 1),
+            "loaded": sorted(self._models.keys()),
+            "load_seconds": dict(self.load_seconds),
+        }
+
+
+# Singleton registry instance
+MODELS = ModelRegistry()
+
+
+# ---- FastAPI dependencies (also usable directly from scripts) ----
+def get_embedder() -> Embedder:
+    return MODELS.get("embedder")
+
+
+def get_reranker() -> CrossEncoderReranker:
+    return MODELS.get("reranker")
+
+
+def get_llm() -> LLMClient:
+    return MODELS.get("llm")
+
+
+def get_vector_store() -> FaissStore:
+    """
+    Current resident index; hot-swapped when ingestion publishes a new generation.
+    With sharding enabled this is the shard router, which searches like a FaissStore.
+    """
+    if ROUTER is not None:
+        return ROUTER.get(get_embedder().dim)
+    return STORE.get(get_embedder().dim)
+
+
+def get_full_store() -> FaissStore:
+    """The whole index resident in this process, even with sharding (evaluation and tuning scripts)."""
+    return STORE.get(get_embedder().dim)
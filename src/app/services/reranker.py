@@ -1,20 +1,105 @@
-from sentence_transformers import CrossEncoder
+import re
+from typing import List, Optional
+
+import numpy as np
+
+from src.app.services.cache import RERANK_CACHE, LRUCache
+from src.utils.config import (
+    RERANKER_MODEL, RERANKER_BACKEND, RERANKER_ONNX_FILE, RERANKER_MAX_LENGTH, RERANKER_BATCH_SIZE,
+)
+from src.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+BACKENDS = ("torch", "int8", "onnx")
+
+
+def normalize_query(query: str) -> str:
+    """Case, punctuation and whitespace-insensitive form of a query (rerank cache key)."""
+    return " ".join(re.sub(r"[^\w\s]", " ", query.lower()).split())
+
+
+def load_cross_encoder(model_name: str, backend: str, max_length: Optional[int]):
+    """
+    CrossEncoder on the requested CPU backend; returns (model, backend actually used).
+    onnx needs sentence-transformers with ONNX Runtime support and falls back to int8;
+    int8 is PyTorch dynamic quantization of the Linear layers.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown reranker backend: {backend} (expected one of {', '.join(BACKENDS)})")
+    # imported here so the cascade and the query normalization load without sentence-transformers
+    from sentence_transformers import CrossEncoder
+    if backend == "onnx":
+        try:
+            model_kwargs = {"file_name": RERANKER_ONNX_FILE} if RERANKER_ONNX_FILE else {}
+            return CrossEncoder(model_name, max_length=max_length, backend="onnx", model_kwargs=model_kwargs), "onnx"
+        except (TypeError, ImportError, ValueError, OSError) as e:
+            logger.warning(f"[RERANKER] ONNX backend unavailable ({e}), using int8")
+            backend = "int8"
+
+    model = CrossEncoder(model_name, max_length=max_length)
+    if backend == "int8":
+        import torch
+        torch.quantization.quantize_dynamic(model.model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+    return model, backend
+
 
 class CrossEncoderReranker:
-    def __init__(self, model_name="cross-encoder/ms-marco-MiniLM-L-6-v2"):
-        print("Loading CrossEncoder:", model_name)
-        self.model = CrossEncoder(model_name)
+    def __init__(
+        self,
+        model_name: str = RERANKER_MODEL,
+        backend: str = RERANKER_BACKEND,
+        max_length: Optional[int] = RERANKER_MAX_LENGTH or None,
+        batch_size: int = RERANKER_BATCH_SIZE,
+        cache: Optional[LRUCache] = RERANK_CACHE,
+    ):
+        print("Loading CrossEncoder:", model_name, f"({backend}, max_length={max_length or 'model default'})")
+        self.model, self.backend = load_cross_encoder(model_name, backend, max_length)
+        self.max_length = max_length
+        self.batch_size = batch_size
+        self.cache = cache
+        # cached scores are only valid for the model + settings that produced them
+        self.cache_tag = (model_name, self.backend, max_length)
+
+    def _clip(self, text: str) -> str:
+        # tokens past max_length are truncated anyway; skip tokenizing most of a long chunk
+        return text[: self.max_length * 8] if self.max_length else text
+
+    def score(self, queries: List[str], texts: List[str], ids: List[Optional[int]]) -> np.ndarray:
+        """
+        Cross-encoder score of each (query, text) pair. Pairs whose (normalized query, chunk id)
+        is cached are not scored again; the rest are predicted in batches sorted by length,
+        so each batch pads to similar lengths.
+        """
+        scores = np.zeros(len(texts), dtype=np.float32)
+        keys = [
+            (self.cache_tag, normalize_query(q), int(i)) if self.cache is not None and i is not None else None
+            for q, i in zip(queries, ids)
+        ]
+        todo = []
+        for j, key in enumerate(keys):
+            cached = self.cache.get(key) if key is not None else None
+            if cached is None:
+                todo.append(j)
+            else:
+                scores[j] = cached
+
+        if todo:
+            todo.sort(key=lambda j: len(texts[j]))
+            pairs = [(queries[j], self._clip(texts[j])) for j in todo]
+            fresh = self.model.predict(pairs, batch_size=self.batch_size, show_progress_bar=False)
+            for j, s in zip(todo, fresh):
+                scores[j] = float(s)
+                if keys[j] is not None:
+                    self.cache.set(keys[j], float(s))
+        return scores
 
     def rerank(self, query: str, candidates: list):
         """
         candidates: list of dicts { "text": str, "meta": {...}, "id": int, "score": float }
         Returns reranked list sorted by relevance.
         """
-        # Prepare query-doc pairs for scoring
-        pairs = [(query, c["text"]) for c in candidates]
-
-        # Predict scores
-        scores = self.model.predict(pairs)
+        scores = self.score([query] * len(candidates), [c["text"] for c in candidates], [c.get("id") for c in candidates])
 
         # Assign rerank_score
         for i, c in enumerate(candidates):
@@ -22,3 +107,20 @@ class CrossEncoderReranker:
 
         # Sort descending by rerank_score
         return sorted(candidates, key=lambda x: x["rerank_score"], reverse=True)
+
+    def rerank_batch(self, queries: list, candidate_lists: list):
+        """
+        Rerank several (query, candidates) groups with a single scoring pass.
+        Returns one sorted list per query, like rerank().
+        """
+        flat = [(q, c) for q, cands in zip(queries, candidate_lists) for c in cands]
+        scores = self.score([q for q, _ in flat], [c["text"] for _, c in flat], [c.get("id") for _, c in flat])
+
+        results = []
+        pos = 0
+        for cands in candidate_lists:
+            for c in cands:
+                c["rerank_score"] = float(scores[pos])
+                pos += 1
+            results.append(sorted(cands, key=lambda x: x["rerank_score"], reverse=True))
+        return results
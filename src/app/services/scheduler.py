@@ -0,0 +1,201 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+
+from src.app.services import metrics
+from src.app.services.llm_client import LLMClient, GenerationCancelled
+from src.utils.config import LLM_SLOTS, LLM_QUEUE_DEPTH, LLM_QUEUE_TIMEOUT, LLM_REQUEST_DEADLINE
+from src.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class QueueFullError(Exception):
+    """All slots busy and the wait queue is at capacity."""
+
+
+class QueueTimeout(Exception):
+    """No slot became free before the request's queue deadline."""
+
+
+class _Waiter:
+    def __init__(self, cancel_event: Optional[threading.Event]):
+        self.event = threading.Event()
+        self.cancel_event = cancel_event
+        self.client: Optional[LLMClient] = None
+
+
+class Lease:
+    """A granted slot: the LLMClient to use plus per-request timing and stop checks."""
+
+    def __init__(self, llm: LLMClient, enqueued_at: float, deadline: float, cancel_event: Optional[threading.Event]):
+        self.llm = llm
+        self.enqueued_at = enqueued_at
+        self.started_at = time.time()
+        self.deadline = deadline
+        self.cancel_event = cancel_event
+        self.queue_wait = self.started_at - enqueued_at
+        self.generation_time = 0.0
+
+    def should_stop(self) -> bool:
+        if self.cancel_event is not None and self.cancel_event.is_set():
+            return True
+        return time.time() > self.deadline
+
+    def timings(self) -> Dict:
+        return {"queue_wait": round(self.queue_wait, 3), "generation": round(self.generation_time, 3)}
+
+
+def _default_client(slot: int) -> LLMClient:
+    # slot 0 is the registry's shared client; extra slots get their own llama.cpp context
+    from src.app.services.registry import get_llm   # the registry imports every model backend
+    return get_llm() if slot == 0 else LLMClient()
+
+
+class InferenceScheduler:
+    """
+    Fixed number of LLM slots in front of LLMClient.
+    Requests wait in a bounded FIFO queue; a freed slot is handed directly to the oldest
+    waiter. Full queue -> QueueFullError (serve 503), waiting past the queue timeout ->
+    QueueTimeout, and a set cancel_event drops the request from the queue or stops its
+    generation between tokens.
+    """
+
+    def __init__(
+        self,
+        slots: int = LLM_SLOTS,
+        max_queue: int = LLM_QUEUE_DEPTH,
+        queue_timeout: float = LLM_QUEUE_TIMEOUT,
+        request_deadline: float = LLM_REQUEST_DEADLINE,
+        factory: Optional[Callable[[int], LLMClient]] = None,
+    ):
+        self.slots = max(1, slots)
+        self.max_queue = max(0, max_queue)
+        self.queue_timeout = queue_timeout
+        self.request_deadline = request_deadline
+        self._factory = factory or _default_client
+
+        self._lock = threading.Lock()
+        self._free: List[LLMClient] = []
+        self._created = 0
+        self._waiters = deque()
+
+        self.completed = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.cancelled = 0
+        self._wait_total = 0.0
+        self._gen_total = 0.0
+
+    # ---- slot bookkeeping ----
+    def _try_take(self) -> Optional[LLMClient]:
+        """Called with the lock held. Returns an idle client, or None (create outside the lock)."""
+        if self._free:
+            return self._free.pop()
+        return None
+
+    def _release(self, client: LLMClient):
+        with self._lock:
+            while self._waiters:
+                waiter = self._waiters.popleft()
+                if waiter.cancel_event is not None and waiter.cancel_event.is_set():
+                    continue
+                waiter.client = client
+                waiter.event.set()
+                return
+            self._free.append(client)
+
+    def _acquire(self, cancel_event: Optional[threading.Event], wait_deadline: float) -> LLMClient:
+        create_slot = None
+        with self._lock:
+            if not self._waiters:
+                client = self._try_take()
+                if client is not None:
+                    return client
+                if self._created < self.slots:
+                    create_slot = self._created
+                    self._created += 1
+            if create_slot is None:
+                if len(self._waiters) >= self.max_queue:
+                    self.rejected += 1
+                    raise QueueFullError(f"LLM queue full ({len(self._waiters)} waiting)")
+                waiter = _Waiter(cancel_event)
+                self._waiters.append(waiter)
+
+        if create_slot is not None:
+            try:
+                return self._factory(create_slot)
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+
+        # wait for a hand-off, polling so cancellation and the deadline are noticed
+        while not waiter.event.wait(timeout=0.1):
+            cancelled = cancel_event is not None and cancel_event.is_set()
+            if cancelled or time.time() > wait_deadline:
+                with self._lock:
+                    if waiter.client is None:
+                        self._waiters.remove(waiter)
+                        if cancelled:
+                            self.cancelled += 1
+                            raise GenerationCancelled()
+                        self.timed_out += 1
+                        raise QueueTimeout(f"No LLM slot free after {self.queue_timeout:.0f}s")
+                break  # handed a slot at the last moment
+        return waiter.client
+
+    @contextmanager
+    def slot(self, cancel_event: Optional[threading.Event] = None, queue_timeout: Optional[float] = None):
+        """
+        with scheduler.slot(cancel_event) as lease:
+            lease.llm.generate(prompt, should_stop=lease.should_stop)
+        """
+        enqueued_at = time.time()
+        wait_deadline = enqueued_at + (self.queue_timeout if queue_timeout is None else queue_timeout)
+        client = self._acquire(cancel_event, wait_deadline)
+        lease = Lease(client, enqueued_at, enqueued_at + self.request_deadline, cancel_event)
+        metrics.record("queue_wait", lease.queue_wait)
+        try:
+            yield lease
+        except GenerationCancelled:
+            with self._lock:
+                self.cancelled += 1
+            raise
+        finally:
+            lease.generation_time = time.time() - lease.started_at
+            with self._lock:
+                self.completed += 1
+                self._wait_total += lease.queue_wait
+                self._gen_total += lease.generation_time
+            self._release(client)
+            logger.info(
+                f"[SCHEDULER] queue_wait={lease.queue_wait:.2f}s generation={lease.generation_time:.2f}s "
+                f"waiting={len(self._waiters)}"
+            )
+
+    def stats(self) -> Dict:
+        with self._lock:
+            served = max(1, self.completed)
+            return {
+                "slots": self.slots,
+                "busy": self._created - len(self._free),
+                "queued": len(self._waiters),
+                "max_queue": self.max_queue,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "timed_out": self.timed_out,
+                "cancelled": self.cancelled,
+                "avg_queue_wait": round(self._wait_total / served, 3),
+                "avg_generation": round(self._gen_total / served, 3),
+            }
+
+
+# Singleton scheduler instance
+SCHEDULER = InferenceScheduler()
+
+
+def get_scheduler() -> InferenceScheduler:
+    return SCHEDULER
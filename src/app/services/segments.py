@@ -0,0 +1,220 @@
+import os
+import shutil
+import uuid
+from typing import Callable, Dict, List, Optional, Tuple
+
+import faiss
+import numpy as np
+
+from src.app.services import index_factory
+from src.app.services.lexical import LexicalSegment, bm25_terms, bm25_weights, collection_stats
+from src.utils.config import FAISS_DIR, FAISS_MMAP
+
+SEGMENT_DIR = FAISS_DIR / "segments"
+SEGMENT_DIR.mkdir(parents=True, exist_ok=True)
+
+
+class Segment:
+    """
+    One immutable index file plus the BM25 postings of the same chunks (absent for segments
+    written before hybrid search); paths are relative to FAISS_DIR, as listed in the manifest.
+    `shard` is the shard worker that serves it in sharded mode (always 0 otherwise).
+    """
+
+    def __init__(self, file: str, index: faiss.Index, lexical: Optional[LexicalSegment] = None, shard: int = 0):
+        self.file = file
+        self.index = index
+        self.lexical = lexical
+        self.shard = shard
+
+    @property
+    def ntotal(self) -> int:
+        return int(self.index.ntotal)
+
+    def max_id(self) -> int:
+        if self.ntotal == 0:
+            return -1
+        if not index_factory.is_id_mapped(self.index):
+            return self.ntotal - 1
+        return int(faiss.vector_to_array(self.index.id_map).max())
+
+    def entry(self) -> Dict:
+        entry = {"file": self.file, "ntotal": self.ntotal, "type": index_factory.index_kind(self.index), "shard": self.shard}
+        if self.lexical is not None:
+            entry["lexical"] = self.lexical.path
+        return entry
+
+
+def read_flags() -> int:
+    """
+    faiss.read_index flags: with FAISS_MMAP, inverted lists (and flat codes, on faiss builds
+    that support it) stay in the file's pages, shared by every process that maps the segment.
+    Segments are never modified after they are written, so read-only mappings are enough.
+    """
+    if not FAISS_MMAP:
+        return 0
+    return faiss.IO_FLAG_MMAP | getattr(faiss, "IO_FLAG_MMAP_IFC", 0)
+
+
+def read_segment(entry: Dict, params: Dict) -> Segment:
+    index = faiss.read_index(str(FAISS_DIR / entry["file"]), read_flags())
+    index_factory.apply_search_defaults(index, params)
+    lexical = LexicalSegment(entry["lexical"]) if entry.get("lexical") else None
+    return Segment(entry["file"], index, lexical, int(entry.get("shard", 0)))
+
+
+def write_segment(index: faiss.Index, lexical: Optional[LexicalSegment] = None, shard: int = 0) -> Segment:
+    """Persist a new immutable segment (tmp + fsync + rename); it is live once a manifest lists it."""
+    file = f"segments/seg-{uuid.uuid4().hex[:16]}.faiss"
+    path = FAISS_DIR / file
+    tmp = path.with_suffix(".faiss.tmp")
+    faiss.write_index(index, str(tmp))
+    with open(tmp, "rb+") as f:
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    return Segment(file, index, lexical, shard)
+
+
+def remove_unreferenced(*manifests: Dict):
+    """Delete segment files no manifest in `manifests` lists (the previous one is kept for late readers)."""
+    keep = {entry[key] for m in manifests for entry in m.get("segments", []) for key in ("file", "lexical") if entry.get(key)}
+    legacy = FAISS_DIR / "index.faiss"
+    if legacy.exists() and all("segments" in m for m in manifests) and "index.faiss" not in keep:
+        legacy.unlink()
+    for path in SEGMENT_DIR.glob("seg-*.faiss"):
+        if f"segments/{path.name}" not in keep:
+            try:
+                path.unlink()
+            except OSError:
+                pass
+    for path in SEGMENT_DIR.glob("lex-*"):
+        if f"segments/{path.name}" not in keep and not path.name.endswith(".tmp"):
+            shutil.rmtree(path, ignore_errors=True)
+
+
+class SegmentedIndex:
+    """
+    The searchable index as a list of immutable segments. Every segment is searched
+    with the same query, and the per-segment top-k lists are merged by score.
+    The largest segment is the "main" one: its type and parameters describe the index.
+    """
+
+    def __init__(self, dim: int, segments: List[Segment]):
+        self.d = dim
+        self.segments = segments
+
+    @property
+    def ntotal(self) -> int:
+        return sum(s.ntotal for s in self.segments)
+
+    @property
+    def main(self) -> faiss.Index:
+        if not self.segments:
+            return index_factory.id_mapped(faiss.IndexFlatIP(self.d))
+        return max(self.segments, key=lambda s: s.ntotal).index
+
+    def kind(self) -> str:
+        return index_factory.index_kind(self.main)
+
+    def max_id(self) -> int:
+        return max((s.max_id() for s in self.segments), default=-1)
+
+    def nbytes(self) -> int:
+        return sum(index_factory.index_bytes(s.index) for s in self.segments)
+
+    def file_bytes(self) -> int:
+        """Size of the segment files (cheap, unlike nbytes(), which serializes every segment)."""
+        total = 0
+        for s in self.segments:
+            try:
+                total += os.path.getsize(FAISS_DIR / s.file)
+            except OSError:
+                pass   # merged away since this generation was loaded
+        return total
+
+    def search(self, q: np.ndarray, k: int, nprobe: Optional[int] = None, ef_search: Optional[int] = None, sel=None):
+        """Top-k over all segments; scores are inner products, higher is better. `sel` restricts ids."""
+        nq = q.shape[0]
+        if not self.segments:
+            return np.zeros((nq, k), dtype=np.float32), np.full((nq, k), -1, dtype=np.int64)
+        if len(self.segments) == 1:
+            seg = self.segments[0].index
+            return seg.search(q, k, params=index_factory.search_parameters(seg, nprobe=nprobe, ef_search=ef_search, sel=sel))
+
+        Ds, Is = [], []
+        for s in self.segments:
+            params = index_factory.search_parameters(s.index, nprobe=nprobe, ef_search=ef_search, sel=sel)
+            D, I = s.index.search(q, min(k, max(s.ntotal, 1)), params=params)
+            Ds.append(D)
+            Is.append(I)
+        D = np.concatenate(Ds, axis=1)
+        I = np.concatenate(Is, axis=1)
+        D = np.where(I >= 0, D, -np.inf)
+        order = np.argsort(-D, axis=1, kind="stable")[:, :k]
+        D = np.take_along_axis(D, order, axis=1)
+        I = np.take_along_axis(I, order, axis=1)
+        if I.shape[1] < k:
+            pad = k - I.shape[1]
+            D = np.pad(D, ((0, 0), (0, pad)), constant_values=-np.inf)
+            I = np.pad(I, ((0, 0), (0, pad)), constant_values=-1)
+        D[~np.isfinite(D)] = 0.0
+        return D.astype(np.float32), I
+
+    def shard_totals(self, shards: int) -> List[int]:
+        totals = [0] * max(1, shards)
+        for s in self.segments:
+            totals[s.shard % len(totals)] += s.ntotal
+        return totals
+
+    def max_shard_segments(self) -> int:
+        counts: Dict[int, int] = {}
+        for s in self.segments:
+            counts[s.shard] = counts.get(s.shard, 0) + 1
+        return max(counts.values(), default=0)
+
+    def ids(self) -> np.ndarray:
+        """Sorted ids of every vector in these segments."""
+        parts = [
+            faiss.vector_to_array(s.index.id_map).astype(np.int64) if index_factory.is_id_mapped(s.index)
+            else np.arange(s.ntotal, dtype=np.int64)
+            for s in self.segments
+        ]
+        return np.sort(np.concatenate(parts)) if parts else np.zeros(0, dtype=np.int64)
+
+    def has_lexical(self) -> bool:
+        return any(s.lexical is not None for s in self.segments)
+
+    def lexical_stats(self, query: str) -> Tuple[int, int, Dict[str, int]]:
+        """BM25 collection statistics of the query's terms over the segments that have postings."""
+        return collection_stats(query, [s.lexical for s in self.segments if s.lexical is not None])
+
+    def lexical_search(
+        self,
+        query: str,
+        k: int,
+        skip: Optional[Callable[[LexicalSegment], Optional[np.ndarray]]] = None,
+        stats: Optional[Tuple[int, int, Dict[str, int]]] = None,
+    ):
+        """
+        BM25 top-k (scores, ids) over the segments that have postings; collection statistics
+        span all of them (or are `stats`, summed over every shard, so shard scores compare),
+        and the k-th score found so far prunes the next segment.
+        `skip(lexical)` returns the document positions to ignore (or None).
+        """
+        lexical = [s.lexical for s in self.segments if s.lexical is not None]
+        terms, avgdl = bm25_weights(*stats) if stats is not None else bm25_terms(query, lexical)
+        D, I = np.zeros(0, dtype=np.float32), np.zeros(0, dtype=np.int64)
+        if not terms:
+            return D, I
+        theta = 0.0
+        for lex in sorted(lexical, key=lambda l: -l.n_docs):
+            d, i = lex.search(terms, k, avgdl, skip(lex) if skip else None, theta)
+            D, I = np.concatenate([D, d]), np.concatenate([I, i])
+            order = np.argsort(-D, kind="stable")[:k]
+            D, I = D[order], I[order]
+            if len(D) >= k:
+                theta = float(D[-1])
+        return D, I
+
+    def entries(self) -> List[Dict]:
+        return [s.entry() for s in self.segments]
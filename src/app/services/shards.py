@@ -0,0 +1,391 @@
+import argparse
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from multiprocessing.connection import Client, Listener
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from src.app.services import metrics
+from src.app.services.filters import SearchFilter, make_filter
+from src.app.services.lexical import rrf_fuse
+from src.app.services.chunk_store import ChunkStore
+from src.app.services.vector_store import ResidentStore, read_manifest, read_retired
+from src.utils.config import (
+    DATA_DIR, FAISS_DIR, HYBRID_RRF_K, INDEX_SHARDS, SHARD_ADDRESSES, SHARD_TIMEOUT, SHARD_START_TIMEOUT,
+    SHARD_AUTHKEY, INDEX_RELOAD_INTERVAL,
+)
+from src.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+SOCKET_DIR = DATA_DIR / "shards"
+
+
+def parse_address(address: str):
+    """"host:port" -> TCP address, anything else is a unix socket path."""
+    host, _, port = address.rpartition(":")
+    if host and port.isdigit():
+        return host, int(port)
+    return address
+
+
+# ---- shard worker ----
+def serve_shard(shard: int, address: str, authkey: bytes):
+    """
+    Serve searches over one shard's segments until the process is stopped.
+    Each request is (op, arguments) and is answered with ("ok", result) or ("error", message):
+    "ping" loads the shard's store and returns its generation (the startup handshake),
+    "stats" returns the shard's BM25 collection statistics per query row (None if not hybrid),
+    "search" its unfused dense and BM25 top-k per row (FaissStore.search_parts).
+    The shard store is resident and reloads on new generations like the API's own store.
+    """
+    store = ResidentStore(shard=shard)
+    address = parse_address(address)
+    if isinstance(address, str) and os.path.exists(address):
+        os.unlink(address)   # stale socket of a previous worker
+    listener = Listener(address, authkey=authkey)
+    logger.info(f"[SHARDS] shard {shard} listening on {address}")
+
+    def handle(conn):
+        with conn:
+            while True:
+                try:
+                    op, args = conn.recv()
+                except (EOFError, OSError):
+                    return
+                try:
+                    if op == "ping":
+                        result = store.get(args["dim"]).generation
+                    elif op == "stats":
+                        result = store.get(args["dim"]).lexical_stats(args["query_text"])
+                    elif op == "search":
+                        q = np.asarray(args["q"], dtype=np.float32)
+                        flt = make_filter(**args["flt"]) if args["flt"] else None
+                        result = store.get(q.shape[-1]).search_parts(
+                            q, args["k"], nprobe=args["nprobe"], ef_search=args["ef_search"], flt=flt,
+                            query_text=args["query_text"], stats=args["stats"],
+                        )
+                    else:
+                        raise ValueError(f"Unknown operation: {op}")
+                    conn.send(("ok", result))
+                except Exception as e:
+                    logger.error(f"[SHARDS] shard {shard} {op} failed: {e}", exc_info=True)
+                    conn.send(("error", str(e)))
+
+    while True:
+        conn = listener.accept()
+        threading.Thread(target=handle, args=(conn,), name=f"shard-{shard}-conn", daemon=True).start()
+
+
+# ---- router ----
+class ShardRouter:
+    """
+    Scatter-gather search over INDEX_SHARDS shard workers.
+    Every query batch goes to all shards in parallel; each shard returns its own dense top-k
+    and, for hybrid queries, BM25 top-k. Dense lists are merged by score, BM25 lists by BM25
+    score and the two are fused by reciprocal rank once, as a single store would. BM25 scores
+    compare across shards because a first round trip sums the shards' collection statistics
+    (document count, length, term document frequencies) and every shard scores with the
+    totals. A shard that errors or misses `timeout` is left out and the answer is marked
+    partial in the stats.
+    Workers are spawned as local processes on unix sockets, unless `addresses` lists running ones;
+    wait_ready() blocks until every shard has loaded its segments. Besides search the router
+    exposes only what the API reads (generation, content_version, chunks, retired, garbage_ratio), from the
+    manifest and files on disk, so API workers never load the full index.
+    """
+
+    def __init__(self, shards: int = INDEX_SHARDS, addresses: Optional[List[str]] = None, timeout: float = SHARD_TIMEOUT):
+        self.addresses = list(addresses or SHARD_ADDRESSES)
+        self.shards = len(self.addresses) or max(1, shards)
+        self.timeout = timeout
+        self.authkey = SHARD_AUTHKEY.encode() if self.addresses else os.urandom(16)
+        self.dim: Optional[int] = None
+        if self.addresses and len(self.addresses) != INDEX_SHARDS:
+            logger.warning(f"[SHARDS] {len(self.addresses)} shard addresses but INDEX_SHARDS={INDEX_SHARDS}; some segments are not served")
+        self._procs: List[multiprocessing.Process] = []
+        self._owner = os.getpid()   # forked API workers share the parent's shard workers
+        self._pools = [queue.SimpleQueue() for _ in range(self.shards)]   # idle connections per shard
+        # connections opened before a fork (the startup handshake) must not be shared by workers
+        os.register_at_fork(after_in_child=self._drop_connections)
+        self._pool = ThreadPoolExecutor(max_workers=4 * self.shards, thread_name_prefix="shard-query")
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._content_version = 0
+        self._last_check = 0.0
+        self._ready = False
+        self._chunks: Optional[ChunkStore] = None
+        self._retired: Optional[np.ndarray] = None
+        self._view_generation = -1   # generation chunks / retired were read at
+        self.queries = 0
+        self.partial = 0
+        self.failures = [0] * self.shards
+        self.timeouts = [0] * self.shards
+
+    def get(self, dim: int) -> "ShardRouter":
+        self.dim = dim
+        return self
+
+    def start(self):
+        """Spawn the local shard workers (once; a no-op with external addresses)."""
+        if self.addresses or self._procs:
+            return
+        with self._lock:
+            if self._procs:
+                return
+            self._owner = os.getpid()
+            SOCKET_DIR.mkdir(parents=True, exist_ok=True)
+            for shard in range(self.shards):
+                self.addresses.append(str(SOCKET_DIR / f"shard-{shard}.sock"))
+                self._procs.append(self._spawn(shard))
+            logger.info(f"[SHARDS] started {self.shards} local shard workers")
+
+    def _spawn(self, shard: int) -> multiprocessing.Process:
+        ctx = multiprocessing.get_context("spawn")
+        proc = ctx.Process(
+            target=serve_shard, args=(shard, self.addresses[shard], self.authkey), name=f"shard-{shard}", daemon=True,
+        )
+        proc.start()
+        return proc
+
+    def restart(self, pid: int) -> bool:
+        """
+        Replace the local shard worker with process id `pid` after it died (the caller has
+        reaped it); False if `pid` is not one of ours. The new worker listens on the same
+        address, so API workers reconnect on their next query; until it has loaded its
+        segments that shard's answers are missing and searches are marked partial.
+        """
+        with self._lock:
+            for shard, proc in enumerate(self._procs):
+                if proc.pid == pid:
+                    logger.warning(f"[SHARDS] shard {shard} worker {pid} exited, restarting")
+                    self._procs[shard] = self._spawn(shard)
+                    return True
+        return False
+
+    def wait_ready(self, dim: int, timeout: float = SHARD_START_TIMEOUT) -> bool:
+        """
+        Start the workers and ping every shard until it has loaded its segments (or `timeout`
+        passes); connection errors are retried while a worker is still starting.
+        """
+        self.dim = dim
+        self.start()
+        deadline = time.time() + timeout
+        for shard in range(self.shards):
+            while True:
+                try:
+                    generation = self._ask(shard, ("ping", {"dim": dim}), timeout=max(0.1, deadline - time.time()))
+                    break
+                except Exception as e:
+                    if time.time() >= deadline:
+                        logger.error(f"[SHARDS] shard {shard} not ready after {timeout}s: {e}")
+                        return False
+                    time.sleep(0.1)
+            logger.info(f"[SHARDS] shard {shard} ready at generation {generation}")
+        self._ready = True
+        return True
+
+    def is_ready(self) -> bool:
+        return self._ready
+
+    def _poll_manifest(self):
+        """Re-read generation and content version at most every INDEX_RELOAD_INTERVAL."""
+        now = time.time()
+        if now - self._last_check >= INDEX_RELOAD_INTERVAL:
+            self._last_check = now
+            manifest = read_manifest()
+            self._generation = manifest.get("generation", 0)
+            self._content_version = manifest.get("content_version", self._generation)
+
+    @property
+    def generation(self) -> int:
+        self._poll_manifest()
+        return self._generation
+
+    @property
+    def content_version(self) -> int:
+        """Changes only when chunks are added or retired (cache keys use it)."""
+        self._poll_manifest()
+        return self._content_version
+
+    def _refresh_view(self):
+        generation = self.generation
+        if generation != self._view_generation:
+            self._chunks = ChunkStore()   # reopened: compaction swaps the chunk store
+            self._retired = read_retired(FAISS_DIR / "retired.i64")
+            self._view_generation = generation
+
+    @property
+    def chunks(self) -> ChunkStore:
+        self._refresh_view()
+        return self._chunks
+
+    @property
+    def retired(self) -> np.ndarray:
+        self._refresh_view()
+        return self._retired
+
+    def garbage_ratio(self) -> float:
+        ntotal = sum(int(e.get("ntotal", 0)) for e in read_manifest().get("segments", []))
+        return len(self.retired) / max(1, ntotal)
+
+    def max_shard_segments(self) -> int:
+        counts: Dict[int, int] = {}
+        for e in read_manifest().get("segments", []):
+            shard = int(e.get("shard", 0))
+            counts[shard] = counts.get(shard, 0) + 1
+        return max(counts.values(), default=0)
+
+    def _drop_connections(self):
+        self._pools = [queue.SimpleQueue() for _ in range(self.shards)]
+
+    def _connect(self, shard: int):
+        try:
+            return self._pools[shard].get_nowait()
+        except queue.Empty:
+            return Client(parse_address(self.addresses[shard]), authkey=self.authkey)
+
+    def _ask(self, shard: int, request: tuple, timeout: Optional[float] = None):
+        timeout = self.timeout if timeout is None else timeout
+        conn = self._connect(shard)
+        try:
+            conn.send(request)
+            if not conn.poll(timeout):
+                raise TimeoutError(f"shard {shard} did not answer within {timeout}s")
+            status, payload = conn.recv()
+        except BaseException:
+            conn.close()   # a late answer must never be read by the next request
+            raise
+        self._pools[shard].put(conn)
+        if status != "ok":
+            raise RuntimeError(f"shard {shard}: {payload}")
+        return payload
+
+    def _scatter(self, request: tuple) -> Dict[int, object]:
+        """Send `request` to every shard in parallel; {shard: result} of those that answered in time."""
+        futures = {self._pool.submit(self._ask, shard, request): shard for shard in range(self.shards)}
+        done, _ = wait(futures, timeout=self.timeout + 0.5)
+        answers = {}
+        for future, shard in futures.items():
+            if future not in done:
+                self.timeouts[shard] += 1
+                logger.warning(f"[SHARDS] shard {shard} timed out")
+                continue
+            try:
+                answers[shard] = future.result()
+            except TimeoutError as e:
+                self.timeouts[shard] += 1
+                logger.warning(f"[SHARDS] {e}")
+            except Exception as e:
+                self.failures[shard] += 1
+                logger.warning(f"[SHARDS] shard {shard} failed: {e}")
+        return answers
+
+    @staticmethod
+    def _sum_stats(answers: List[Optional[List]], rows: int) -> Optional[List]:
+        """Per-row collection statistics summed over the shards (None when no shard is hybrid)."""
+        answers = [a for a in answers if a is not None]
+        if not answers:
+            return None
+        totals = []
+        for row in range(rows):
+            n_docs, total_len, dfs = 0, 0, {}
+            for answer in answers:
+                n, length, shard_dfs = answer[row]
+                n_docs += n
+                total_len += length
+                for term, df in shard_dfs.items():
+                    dfs[term] = dfs.get(term, 0) + df
+            totals.append((n_docs, total_len, dfs))
+        return totals
+
+    @staticmethod
+    def _fuse(dense: List[Dict], lexical: List[Dict], k: int) -> List[Dict]:
+        """Reciprocal rank fusion of the merged lists, as FaissStore._fuse does on one store."""
+        ids, scores = rrf_fuse(
+            [np.array([h["id"] for h in dense], dtype=np.int64), np.array([h["id"] for h in lexical], dtype=np.int64)],
+            k, HYBRID_RRF_K,
+        )
+        by_id = {h["id"]: h for h in lexical}
+        by_id.update((h["id"], h) for h in dense)
+        hits = []
+        for i, fused in zip(ids, scores):
+            hit = dict(by_id[int(i)])
+            hit["score"] = hit.pop("exact", hit["score"])   # exact inner product, like a single store
+            hit.pop("bm25", None)
+            hit["fused"] = float(fused)   # RRF score: the order of hybrid hits
+            hits.append(hit)
+        return hits
+
+    def search(
+        self,
+        query_emb: np.ndarray,
+        k: int = 5,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None,
+        flt: Optional[SearchFilter] = None,
+        query_text=None,
+    ):
+        """Same contract as FaissStore.search: top-k hits per query row, merged across shards."""
+        q = query_emb.reshape(1, -1) if query_emb.ndim == 1 else query_emb
+        complete = True
+        stats = None
+        with metrics.stage("shards"):
+            if query_text is not None:
+                answers = self._scatter(("stats", {"dim": q.shape[-1], "query_text": query_text}))
+                complete = len(answers) == self.shards
+                stats = self._sum_stats(list(answers.values()), q.shape[0])
+            request = ("search", {
+                "q": np.ascontiguousarray(q, dtype=np.float32), "k": k, "nprobe": nprobe, "ef_search": ef_search,
+                "flt": flt.to_dict() if flt else None, "query_text": query_text, "stats": stats,
+            })
+            answers = list(self._scatter(request).values())
+
+        self.queries += 1
+        if not answers:
+            raise RuntimeError("No shard answered the search")
+        if not complete or len(answers) < self.shards:
+            self.partial += 1
+            logger.warning(f"[SHARDS] partial result from {len(answers)}/{self.shards} shards")
+
+        results = []
+        for row in range(q.shape[0]):
+            dense = sorted((h for answer in answers for h in answer[row]["dense"]), key=lambda h: -h["score"])[:k]
+            if stats is None:
+                results.append(dense)
+                continue
+            lexical = sorted((h for answer in answers for h in answer[row]["lexical"]), key=lambda h: -h["bm25"])[:k]
+            results.append(self._fuse(dense, lexical, k))
+        return results
+
+    def stats(self) -> Dict:
+        return {
+            "shards": self.shards,
+            "addresses": list(self.addresses),
+            "timeout": self.timeout,
+            "queries": self.queries,
+            "partial": self.partial,
+            "failures": list(self.failures),
+            "timeouts": list(self.timeouts),
+            "ready": self._ready,
+            "workers_alive": [p.is_alive() for p in self._procs] if self._procs and self._owner == os.getpid() else None,
+        }
+
+
+# Singleton router; only used when more than one shard is configured
+ROUTER = ShardRouter() if INDEX_SHARDS > 1 or SHARD_ADDRESSES else None
+
+
+if __name__ == "__main__":
+    # python -m src.app.services.shards serve --shard 0 --address 0.0.0.0:7100   (SHARD_AUTHKEY must match)
+    parser = argparse.ArgumentParser(description="Run one shard worker")
+    sub = parser.add_subparsers(dest="command", required=True)
+    serve = sub.add_parser("serve")
+    serve.add_argument("--shard", type=int, required=True)
+    serve.add_argument("--address", required=True, help="host:port or unix socket path")
+    args = parser.parse_args()
+    serve_shard(args.shard, args.address, SHARD_AUTHKEY.encode())
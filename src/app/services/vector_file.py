@@ -0,0 +1,69 @@
+import os
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+
+class VectorFile:
+    """
+    Full-precision float32 vectors in a raw append-only file, rows aligned with the chunk store.
+    Opened as a read-only memmap, so exact re-scoring touches only the rows it gathers
+    and the pages stay in the (evictable, shareable) page cache instead of the heap.
+    """
+
+    def __init__(self, path: Path, dim: int):
+        self.path = Path(path)
+        self.dim = dim
+        self._load()
+
+    def _load(self):
+        row_bytes = self.dim * 4
+        size = self.path.stat().st_size if self.path.exists() else 0
+        self.count = size // row_bytes
+        if self.count:
+            self.data = np.memmap(self.path, dtype=np.float32, mode="r", shape=(self.count, self.dim))
+        else:
+            self.data = np.zeros((0, self.dim), dtype=np.float32)
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def nbytes(self) -> int:
+        return self.count * self.dim * 4
+
+    def append(self, start_id: int, vectors: np.ndarray):
+        """Write rows start_id.. (anything past start_id, e.g. from an interrupted add, is replaced)."""
+        if start_id > self.count:
+            raise ValueError(f"Vector file has {self.count} rows, cannot append at {start_id}")
+        payload = np.ascontiguousarray(vectors, dtype=np.float32).tobytes()
+        offset = start_id * self.dim * 4
+        mode = "r+b" if self.path.exists() else "wb"
+        with open(self.path, mode) as f:
+            f.truncate(offset)
+            f.seek(offset)
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        self._load()
+
+    def rescore(self, queries: np.ndarray, I: np.ndarray, k: int, rows: Optional[np.ndarray] = None):
+        """
+        Exact inner products for the (nq, kk) candidate ids in I, returning the best k per row
+        as (D, I) with FAISS conventions (-1 ids for empty slots). `rows` maps each id to its
+        row in this file (-1 when absent); default row == id.
+        """
+        rows = I if rows is None else rows
+        valid = (I >= 0) & (rows >= 0) & (rows < self.count)
+        safe = np.where(valid, rows, 0)
+        cand = self.data[safe]                                   # (nq, kk, d) gather
+        scores = np.einsum("qkd,qd->qk", cand, queries.astype(np.float32))
+        scores[~valid] = -np.inf
+
+        order = np.argsort(-scores, axis=1)[:, :k]
+        D = np.take_along_axis(scores, order, axis=1)
+        ids = np.take_along_axis(np.where(valid, I, -1), order, axis=1)
+        ids[~np.isfinite(D)] = -1
+        D[~np.isfinite(D)] = 0.0
+        return D.astype(np.float32), ids
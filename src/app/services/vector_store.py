@@ -1,76 +1,743 @@
-from typing import List, Dict
+from typing import List, Dict, Optional
+import fcntl
 import faiss
 import numpy as np
 from pathlib import Path
 import json
+import os
+import shutil
+import threading
+import time
 from sqlitedict import SqliteDict
-from src.utils.config import FAISS_DIR, METADATA_PATH
+from src.utils.config import (
+    FAISS_DIR, METADATA_PATH, MANIFEST_PATH, INDEX_RELOAD_INTERVAL, FAISS_INDEX_TYPE,
+    FAISS_EXACT_RESCORE, FAISS_RESCORE_FACTOR, SEGMENT_MAX_COUNT, SEGMENT_MERGE_FANIN, FILTER_EXACT_MAX,
+    HYBRID_SEARCH, HYBRID_RRF_K, INDEX_SHARDS,
+)
+from src.app.services.chunk_store import ChunkStore, compact_dir, swap_in
+from src.app.services.vector_file import VectorFile
+from src.app.services.segments import Segment, SegmentedIndex, read_segment, write_segment, remove_unreferenced
+from src.app.services.filters import SearchFilter
+from src.app.services.lexical import LexicalSegment, write_lexical, rrf_fuse
+from src.app.services import index_factory, metrics
+from src.utils.logger import get_logger
 
 FAISS_DIR.mkdir(parents=True, exist_ok=True)
+logger = get_logger(__name__)
+
+VECTOR_FILE = "vectors.f32"
+LEGACY_INDEX_FILE = "index.faiss"               # single index rewritten on every add (pre-segments)
+TEMPLATE_PATH = FAISS_DIR / "template.faiss"    # empty trained index new segments are cloned from
+COMPACT_BATCH = 4096   # chunks copied per append while compacting
+
+class WriteLock:
+    """
+    Exclusive writer lock, held across threads and across every process that shares the
+    data directory (uvicorn workers): a thread lock plus an flock on FAISS_DIR/write.lock.
+    The lock file is opened per acquisition, so a forked worker never shares the parent's lock.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._fd: Optional[int] = None
+
+    def __enter__(self):
+        self._lock.acquire()
+        try:
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        except BaseException:
+            self._lock.release()
+            raise
+        self._fd = fd
+        return self
+
+    def __exit__(self, *exc):
+        fd, self._fd = self._fd, None
+        try:
+            os.close(fd)   # closing the descriptor releases the flock
+        finally:
+            self._lock.release()
+
+
+# one writer at a time (ingestion, deletes, compaction, merges) in any worker; readers keep
+# using their resident store until the new generation is published
+WRITE_LOCK = WriteLock(FAISS_DIR / "write.lock")
+
+
+# ---- Manifest helpers ----
+def read_manifest() -> Dict:
+    try:
+        with open(MANIFEST_PATH, "r") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {"generation": 0}
+
+
+def write_manifest(manifest: Dict):
+    """Atomically replace the manifest so readers never see a partial file."""
+    tmp = MANIFEST_PATH.with_suffix(".json.tmp")
+    with open(tmp, "w") as f:
+        json.dump(manifest, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, MANIFEST_PATH)
+
+
+def read_retired(path: Path) -> np.ndarray:
+    if not path.exists():
+        return np.zeros(0, dtype=np.int64)
+    return np.fromfile(path, dtype=np.int64)
+
+
+def write_retired(path: Path, ids: np.ndarray):
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    with open(tmp, "wb") as f:
+        f.write(np.ascontiguousarray(ids, dtype=np.int64).tobytes())
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def migrate_sqlite_metadata(chunks: ChunkStore, ntotal: int):
+    """One-off copy of the legacy SqliteDict records into the columnar chunk store."""
+    if len(chunks) >= ntotal or not Path(METADATA_PATH).exists():
+        return
+    texts, metadatas = [], []
+    with SqliteDict(METADATA_PATH, flag="r") as db:
+        for idx in range(len(chunks), ntotal):
+            meta_json = db.get(str(idx), None)
+            record = json.loads(meta_json) if meta_json else {}
+            texts.append(record.pop("text", ""))
+            metadatas.append(record)
+    chunks.append(len(chunks), texts, metadatas)
+    logger.info(f"[STORE] migrated {len(texts)} chunk records from {METADATA_PATH}")
+
 
 class FaissStore:
-    def __init__(self, dim: int):
+    def __init__(self, dim: int, previous: Optional["FaissStore"] = None, shard: Optional[int] = None):
         self.dim = dim
-        self.index_path = FAISS_DIR / "index.faiss"
-        self.meta_db_path = METADATA_PATH
+        # a shard worker loads only its own segments and is read-only; writers load every shard
+        self.shard = shard
+        # generation is read before the index so a concurrent publish is picked up on the next check
+        manifest = read_manifest()
+        self.generation = manifest.get("generation", 0)
+        # bumped only by publishes that add or retire chunks (not merges, compaction or migration),
+        # so result caches keyed on it survive index maintenance
+        self.content_version = manifest.get("content_version", self.generation)
+        self._content_changed = False
+
+        # search defaults come from config, build params from the index that exists;
+        # the target type is FAISS_INDEX_TYPE when set, else whatever was last chosen
+        self.index_params = index_factory.default_params()
+        saved = manifest.get("index", {})
+        for key in ("nlist", "pq_m", "pq_nbits", "M", "ef_construction"):
+            if key in saved:
+                self.index_params[key] = saved[key]
+        if FAISS_INDEX_TYPE is None and saved.get("target"):
+            self.index_params["type"] = saved["target"]
 
-        if self.index_path.exists():
-            self.index = faiss.read_index(str(self.index_path))
-            with SqliteDict(self.meta_db_path, autocommit=True) as db:
-                self._id_counter = db.get("_id_counter", 0)
+        # segments are immutable, so the ones the previous generation already loaded are reused
+        loaded = {(seg.file, seg.lexical and seg.lexical.path): seg for seg in previous.index.segments} if previous is not None else {}
+        if "segments" in manifest:
+            entries = manifest["segments"]
+        elif (FAISS_DIR / LEGACY_INDEX_FILE).exists():
+            entries = [{"file": LEGACY_INDEX_FILE}]   # single index written before segments existed
         else:
-            self.index = faiss.IndexFlatIP(dim)
-            self._id_counter = 0
+            entries = []
+        if shard is not None:
+            entries = [e for e in entries if int(e.get("shard", 0)) % max(1, INDEX_SHARDS) == shard]
+        self.index = SegmentedIndex(dim, [loaded.get((e["file"], e.get("lexical"))) or read_segment(e, self.index_params) for e in entries])
+
+        self.chunks = ChunkStore()
+        migrate_sqlite_metadata(self.chunks, self.index.ntotal)
+        # full-precision copy of every vector (memory-mapped, rows aligned with the chunk store),
+        # used to re-score compressed indexes and to build segments
+        legacy_vectors = FAISS_DIR / VECTOR_FILE
+        if legacy_vectors.exists() and not (self.chunks.root / VECTOR_FILE).exists():
+            try:
+                os.replace(legacy_vectors, self.chunks.root / VECTOR_FILE)
+            except OSError:
+                pass
+        self.vectors = VectorFile(self.chunks.root / VECTOR_FILE, dim)
+        # ids of chunks that were replaced or removed; filtered from searches until compaction drops them
+        self.retired_path = FAISS_DIR / "retired.i64"
+        self.retired = read_retired(self.retired_path)
+        self._lexical_dead: Dict[str, Optional[np.ndarray]] = {}   # per lexical segment, for this store's tombstones
+        self._shard_ids: Optional[np.ndarray] = None
+        # ids are never reused; after compaction the next id is no longer ntotal
+        self._id_counter = max(int(manifest.get("next_id", 0)), self.index.max_id() + 1)
+
+    def _sync_vectors(self):
+        """Backfill the side file of a positional index (decoded if the index is lossy)."""
+        have, ntotal = len(self.vectors), int(self.index.ntotal)
+        if have >= ntotal or len(self.index.segments) != 1:
+            return
+        legacy = self.index.segments[0].index
+        if index_factory.is_id_mapped(legacy):
+            return
+        if index_factory.index_kind(legacy) in index_factory.COMPRESSED_TYPES:
+            logger.warning("[STORE] backfilling full-precision vectors from a compressed index (decoded, not exact)")
+        self.vectors.append(have, index_factory.all_vectors(legacy)[have:])
+        logger.info(f"[STORE] backfilled {ntotal - have} vectors into {self.vectors.path.name}")
+
+    def _ensure_id_map(self):
+        """An index written before ids were explicit uses positions; rebuild it id-mapped (same ids)."""
+        if all(index_factory.is_id_mapped(seg.index) for seg in self.index.segments):
+            return
+        self._sync_vectors()
+        n = int(self.index.ntotal)
+        kind = self.index.kind()
+        self.index.segments = self._build_segments(kind, np.arange(n, dtype=np.int64), self.vectors.data[:n])
+        logger.info(f"[STORE] converted {kind} index with {n} vectors to explicit ids")
+
+    def has_exact_vectors(self) -> bool:
+        return len(self.vectors) >= len(self.chunks) >= self.index.ntotal
+
+    def _live(self):
+        """(ids, rows) of the committed, non-retired chunks, in id order."""
+        n = min(len(self.chunks), len(self.vectors))
+        ids = np.asarray(self.chunks.ids[:n], dtype=np.int64)
+        mask = ids < self._id_counter
+        if len(self.retired):
+            mask &= ~np.isin(ids, self.retired)
+        rows = np.flatnonzero(mask)
+        return ids[rows], rows
+
+    def live_vectors(self):
+        """(ids, float32 vectors) of every searchable chunk, e.g. to build evaluation indexes."""
+        ids, rows = self._live()
+        return ids, np.ascontiguousarray(self.vectors.data[rows], dtype=np.float32)
+
+    # ---- segments ----
+    def _texts(self, ids: np.ndarray) -> List[str]:
+        batch = self.chunks.gather(ids)
+        return [batch.text(j) for j in range(len(batch))]
+
+    def _build_segments(self, kind: str, ids: np.ndarray, vectors: np.ndarray) -> List[Segment]:
+        """
+        Train a `kind` index on `vectors` once, keep its empty trained form as the template,
+        and write one segment per shard (ids partitioned by id % INDEX_SHARDS).
+        """
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        ids = np.ascontiguousarray(ids, dtype=np.int64)
+        base = index_factory.build_index(kind, self.dim, self.index_params, train_vectors=vectors)
+        if kind not in ("flat", "hnsw"):
+            tmp = TEMPLATE_PATH.with_suffix(".faiss.tmp")
+            faiss.write_index(base, str(tmp))
+            os.replace(tmp, TEMPLATE_PATH)
+        shards = max(1, INDEX_SHARDS)
+        segments = []
+        for shard in range(shards):
+            part = ids % shards == shard
+            if not part.any() and (segments or shard < shards - 1):
+                continue   # no empty shard segments, except one for an empty store
+            index = index_factory.id_mapped(base if shards == 1 else faiss.clone_index(base))
+            if part.any():
+                index.add_with_ids(vectors[part], ids[part])
+            segments.append(write_segment(index, lexical=write_lexical(ids[part], self._texts(ids[part])), shard=shard))
+        return segments
+
+    def _empty_segment(self) -> faiss.Index:
+        """Empty id-mapped index of the current kind; trained kinds reuse the stored template."""
+        kind = self.index.kind()
+        if kind in ("flat", "hnsw"):
+            return index_factory.id_mapped(index_factory.build_index(kind, self.dim, dict(self.index_params)))
+        if not TEMPLATE_PATH.exists():
+            # index trained before templates were kept: copy it once without its vectors
+            template = faiss.clone_index(index_factory.base_index(self.index.main))
+            template.reset()
+            faiss.write_index(template, str(TEMPLATE_PATH))
+        index = index_factory.id_mapped(faiss.read_index(str(TEMPLATE_PATH)))
+        index_factory.apply_search_defaults(index, self.index_params)
+        return index
 
     def add(self, embeddings: np.ndarray, metadatas: List[Dict], texts: List[str]):
+        """Append chunks as a new small segment; only the new vectors are written."""
         n = embeddings.shape[0]
-        ids = np.arange(self._id_counter, self._id_counter + n).astype(np.int64)
+        self._ensure_id_map()
+        start_id = self._id_counter
+        ids = np.arange(start_id, start_id + n, dtype=np.int64)
 
-        # Add vectors
-        self.index.add(embeddings)
+        # Save text + metadata columns first (one write per column), then the vectors
+        row = self.chunks.append(start_id, texts, metadatas)
+        self.vectors.append(row, embeddings)
+        self._id_counter += n
+        self._content_changed = True
+        target = self.index_params["type"]
+        if self.index.kind() != target and index_factory.can_build(target, self.index.ntotal + n, self.index_params):
+            # enough vectors to train the configured type: rebuild everything as one segment
+            live_ids, live_rows = self._live()
+            logger.info(f"[STORE] migrating index to {target} at {len(live_ids)} vectors")
+            self.index.segments = self._build_segments(target, live_ids, self.vectors.data[live_rows])
+        else:
+            index = self._empty_segment()
+            index.add_with_ids(np.ascontiguousarray(embeddings, dtype=np.float32), ids)
+            totals = self.index.shard_totals(INDEX_SHARDS)
+            shard = totals.index(min(totals))   # the least loaded shard takes the batch
+            self.index.segments.append(write_segment(index, lexical=write_lexical(ids, texts), shard=shard))
 
-        # Save metadata + text
-        with SqliteDict(self.meta_db_path, autocommit=True) as db:
-            for i, mid in enumerate(ids):
-                record = metadatas[i].copy()
-                record["text"] = texts[i]     # store chunk text
-                db[str(int(mid))] = json.dumps(record)
-            db["_id_counter"] = int(ids[-1] + 1)
+        self.publish()
 
-        self._id_counter += n
-        self.save()
+    def merge_segments(self, max_segments: int = SEGMENT_MAX_COUNT, fanin: int = SEGMENT_MERGE_FANIN) -> Optional[Dict]:
+        """
+        Fold the `fanin` smallest segments of a shard into one once it has more than
+        `max_segments` (tiered merging, so each vector is rewritten O(log n) times). Retired
+        ids are dropped on the way. Returns None when nothing needed merging.
+        """
+        if self.index.max_shard_segments() <= max_segments:
+            return None
+        self._ensure_id_map()
+        segments = self.index.segments
+        by_shard: Dict[int, List[Segment]] = {}
+        for seg in segments:
+            by_shard.setdefault(seg.shard, []).append(seg)
+        shard, group = max(by_shard.items(), key=lambda kv: len(kv[1]))
+        victims = sorted(group, key=lambda seg: seg.ntotal)[:max(2, fanin)]
+        ids = np.sort(np.concatenate([faiss.vector_to_array(seg.index.id_map) for seg in victims]).astype(np.int64))
+        if len(self.retired):
+            ids = ids[~np.isin(ids, self.retired)]
+        rows = self.chunks.rows(ids)
+        keep = (rows >= 0) & (rows < len(self.vectors))
+        ids, rows = ids[keep], rows[keep]
+
+        index = self._empty_segment()
+        if len(ids):
+            index.add_with_ids(np.ascontiguousarray(self.vectors.data[rows], dtype=np.float32), ids)
+        merged = write_segment(index, lexical=write_lexical(ids, self._texts(ids)), shard=shard)
+        self.index.segments = [seg for seg in segments if seg not in victims] + [merged]
+        self.publish()
+        return {"shard": shard, "merged_segments": len(victims), "vectors": int(len(ids)), "segments": len(self.index.segments)}
+
+    def build_lexical(self) -> int:
+        """Write BM25 postings for segments that have none (indexed before hybrid search); returns how many."""
+        self._ensure_id_map()
+        built = 0
+        for seg in self.index.segments:
+            if seg.lexical is None and seg.ntotal:
+                ids = np.sort(faiss.vector_to_array(seg.index.id_map).astype(np.int64))
+                ids = ids[self.chunks.rows(ids) >= 0]
+                seg.lexical = write_lexical(ids, self._texts(ids))
+                built += 1
+        if built:
+            self.publish()
+        return built
+
+    def retire(self, ids, publish: bool = True):
+        """Hide ids from every future search (the vectors stay until merge or compaction)."""
+        ids = np.asarray(list(ids), dtype=np.int64)
+        if not len(ids):
+            return
+        self.retired = np.union1d(self.retired, ids)
+        self._lexical_dead.clear()
+        self._content_changed = True
+        write_retired(self.retired_path, self.retired)
+        if publish:
+            self.publish()
+
+    def publish(self):
+        """Commit point: atomically write the manifest (segment list + generation) so readers reload."""
+        if self.shard is not None:
+            raise RuntimeError("A shard store only holds part of the index and cannot publish")
+        previous = read_manifest()
+        self.generation = previous.get("generation", 0) + 1
+        self.content_version = previous.get("content_version", previous.get("generation", 0)) + int(self._content_changed)
+        self._content_changed = False
+        manifest = {
+            "generation": self.generation,
+            "content_version": self.content_version,
+            "ntotal": int(self.index.ntotal),
+            "next_id": int(self._id_counter),
+            "retired": int(len(self.retired)),
+            "updated_at": time.time(),
+            "segments": self.index.entries(),
+            "index": {
+                **self.index_params,
+                **index_factory.describe(self.index.main, self.index_params),
+                "target": self.index_params["type"],
+            },
+        }
+        write_manifest(manifest)
+        # readers may still be opening the previous generation's files
+        remove_unreferenced(manifest, previous)
+
+    def migrate(self, kind: str):
+        """Rebuild the live vectors as another index type (one segment per shard, ids unchanged) and publish it."""
+        self._ensure_id_map()
+        live_ids, live_rows = self._live()
+        if not index_factory.can_build(kind, len(live_ids), self.index_params):
+            raise ValueError(f"{len(live_ids)} vectors are not enough to train a {kind} index")
+        self.index_params["type"] = kind
+        self.index.segments = self._build_segments(kind, live_ids, self.vectors.data[live_rows])
+        self.publish()
+
+    # ---- compaction ----
+    def garbage_ratio(self) -> float:
+        return len(self.retired) / max(1, int(self.index.ntotal))
 
-    def save(self):
-        faiss.write_index(self.index, str(self.index_path))
+    def footprint(self, n_queries: int = 32, k: int = 10) -> Dict:
+        """Index size, on-disk chunk store size and mean search latency over sampled stored vectors."""
+        info = {
+            "ntotal": int(self.index.ntotal),
+            "segments": len(self.index.segments),
+            "retired": int(len(self.retired)),
+            "garbage_ratio": round(self.garbage_ratio(), 4),
+            "index_bytes": self.index.nbytes(),
+            "chunk_store_bytes": sum(f.stat().st_size for f in self.chunks.root.iterdir() if f.is_file()),
+            "search_ms": None,
+        }
+        if len(self.vectors) and self.index.ntotal:
+            rng = np.random.default_rng(0)
+            rows = rng.choice(len(self.vectors), size=min(n_queries, len(self.vectors)), replace=False)
+            queries = np.ascontiguousarray(self.vectors.data[np.sort(rows)], dtype=np.float32)
+            t0 = time.perf_counter()
+            for q in queries:
+                self.search(q, k)
+            info["search_ms"] = round((time.perf_counter() - t0) / len(queries) * 1000, 3)
+        return info
 
-    def search(self, query_emb: np.ndarray, k: int = 5):
+    def compact(self) -> Dict:
+        """
+        Drop retired chunks for good: the chunk store (with its vector file) is rewritten into
+        a sibling directory and swapped in, and the live vectors become one new segment per shard.
+        Ids do not change, so the document registry stays valid. Returns before/after footprints.
+        """
+        before = self.footprint()
+        t0 = time.time()
+        self._ensure_id_map()
+        live_ids, live_rows = self._live()
+
+        staged = compact_dir(self.chunks.root)
+        shutil.rmtree(staged, ignore_errors=True)
+        out = ChunkStore(staged)
+        out_vectors = VectorFile(staged / VECTOR_FILE, self.dim)
+        for s in range(0, len(live_ids), COMPACT_BATCH):
+            ids, rows = live_ids[s:s + COMPACT_BATCH], live_rows[s:s + COMPACT_BATCH]
+            batch = self.chunks.gather(ids)
+            row = out.append(0, [batch.text(j) for j in range(len(batch))], [batch.meta(j) for j in range(len(batch))], ids=ids)
+            out_vectors.append(row, self.vectors.data[rows])
+
+        kind = self.index.kind()
+        if not index_factory.can_build(kind, len(live_ids), self.index_params):
+            kind = "flat"   # too few vectors left to train; ingestion migrates back once it can
+        segments = self._build_segments(kind, live_ids, out_vectors.data[: len(live_ids)])
+
+        # chunks first: until the manifest lists the new segments, the old segments' dead ids
+        # are still retired (filtered) and simply find no row
+        swap_in(self.chunks.root)
+        self.chunks = ChunkStore()
+        self.vectors = VectorFile(self.chunks.root / VECTOR_FILE, self.dim)
+        self.index.segments = segments
+        self.publish()
+        self.retired = np.zeros(0, dtype=np.int64)
+        self._lexical_dead.clear()
+        write_retired(self.retired_path, self.retired)
+        self.publish()
+
+        after = self.footprint()
+        logger.info(
+            f"[STORE] compacted {before['ntotal']} -> {after['ntotal']} vectors in {time.time() - t0:.2f}s "
+            f"(index {before['index_bytes']} -> {after['index_bytes']} bytes)"
+        )
+        return {"before": before, "after": after, "seconds": round(time.time() - t0, 3)}
+
+    def memory_report(self) -> Dict:
+        """Resident index size vs. the float32 vectors it stands in for (kept on disk, mmapped)."""
+        index_bytes = self.index.nbytes()
+        float_bytes = int(self.index.ntotal) * self.dim * 4
+        return {
+            "type": self.index.kind(),
+            "ntotal": int(self.index.ntotal),
+            "segments": len(self.index.segments),
+            "index_bytes": index_bytes,
+            "float32_bytes": float_bytes,
+            "saved_bytes": float_bytes - index_bytes,
+            "vector_file_bytes": self.vectors.nbytes,
+        }
+
+    def rescoring(self) -> bool:
+        """Compressed index with a complete side file: search wider and re-rank exactly."""
+        return (
+            FAISS_EXACT_RESCORE
+            and self.index.kind() in index_factory.COMPRESSED_TYPES
+            and self.has_exact_vectors()
+        )
+
+    def _drop_retired(self, I: np.ndarray) -> np.ndarray:
+        if not len(self.retired):
+            return I
+        return np.where(np.isin(I, self.retired), -1, I)
+
+    def _take_live(self, D: np.ndarray, I: np.ndarray, k: int):
+        """First k non-retired hits per row, order kept, -1 padded."""
+        I = self._drop_retired(I)
+        order = np.argsort(I == -1, axis=1, kind="stable")[:, :k]
+        return np.take_along_axis(D, order, axis=1), np.take_along_axis(I, order, axis=1)
+
+    # ---- filtered search ----
+    def filter_ids(self, flt: SearchFilter):
+        """(ids, rows) of the live chunks that pass `flt`, in id order."""
+        rows = flt.rows(self.chunks)
+        ids = np.asarray(self.chunks.ids[rows], dtype=np.int64)
+        mask = ids < self._id_counter
+        if len(self.retired):
+            mask &= ~np.isin(ids, self.retired)
+        if self.shard is not None:
+            # the vector file holds every shard's chunks; keep the ones this shard serves
+            if self._shard_ids is None:
+                self._shard_ids = self.index.ids()
+            mask &= np.isin(ids, self._shard_ids)
+        return ids[mask], rows[mask]
+
+    def _exact_search(self, q: np.ndarray, ids: np.ndarray, rows: np.ndarray, k: int):
+        """Brute force over the given rows of the vector file: cost grows with the filter, not the corpus."""
+        keep = rows < len(self.vectors)
+        ids, rows = ids[keep], rows[keep]
+        D = np.zeros((q.shape[0], k), dtype=np.float32)
+        I = np.full((q.shape[0], k), -1, dtype=np.int64)
+        kk = min(k, len(ids))
+        if kk == 0:
+            return D, I
+        scores = np.ascontiguousarray(q, dtype=np.float32) @ np.asarray(self.vectors.data[rows]).T   # (nq, m)
+        top = np.argpartition(-scores, kk - 1, axis=1)[:, :kk]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        D[:, :kk] = np.take_along_axis(top_scores, order, axis=1)
+        I[:, :kk] = ids[np.take_along_axis(top, order, axis=1)]
+        return D, I
+
+    def _selector(self, ids: np.ndarray):
+        """IDSelectorBitmap over `ids`; the bitmap is returned too and must outlive the search."""
+        bitmap = np.zeros(max(1, (int(self._id_counter) + 7) // 8), dtype=np.uint8)
+        np.bitwise_or.at(bitmap, ids >> 3, (1 << (ids & 7)).astype(np.uint8))
+        return faiss.IDSelectorBitmap(len(bitmap), faiss.swig_ptr(bitmap)), bitmap
+
+    def _search_filtered(self, q: np.ndarray, k: int, ids: np.ndarray, rows: np.ndarray, nprobe=None, ef_search=None):
+        if len(ids) <= max(k, FILTER_EXACT_MAX) and self.has_exact_vectors():
+            return self._exact_search(q, ids, rows, k)
+        # broad filter: FAISS skips non-matching ids while scanning (retired ids are not in the bitmap)
+        sel, bitmap = self._selector(ids)
+        if self.rescoring():
+            _, I = self.index.search(q, k * max(1, FAISS_RESCORE_FACTOR), nprobe=nprobe, ef_search=ef_search, sel=sel)
+            D, I = self.vectors.rescore(q, I, k, rows=self.chunks.rows(I))
+        else:
+            D, I = self.index.search(q, k, nprobe=nprobe, ef_search=ef_search, sel=sel)
+        del bitmap
+        return D, I
+
+    # ---- hybrid (BM25 + dense) search ----
+    def hybrid(self) -> bool:
+        """Lexical postings exist and dense scores of lexical-only hits can be computed."""
+        return HYBRID_SEARCH and self.index.has_lexical() and self.has_exact_vectors()
+
+    def _lexical_skip(self, lex: LexicalSegment, allowed: Optional[np.ndarray]) -> Optional[np.ndarray]:
+        """Document positions of `lex` that are retired or outside the filter."""
+        dead = self._lexical_dead.get(lex.path)
+        if dead is None:
+            dead = np.isin(np.asarray(lex.doc_ids), self.retired) if len(self.retired) else None
+            self._lexical_dead[lex.path] = dead
+        if allowed is None:
+            return dead
+        outside = ~np.isin(np.asarray(lex.doc_ids), allowed)
+        return outside if dead is None else outside | dead
+
+    def _dense_scores(self, q: np.ndarray, I: np.ndarray) -> np.ndarray:
+        """Exact inner products of each query with its (nq, k) hits, order kept (0 for empty slots)."""
+        rows = self.chunks.rows(I)
+        valid = (I >= 0) & (rows >= 0) & (rows < len(self.vectors))
+        vecs = self.vectors.data[np.where(valid, rows, 0)]
+        D = np.einsum("qkd,qd->qk", vecs, np.asarray(q, dtype=np.float32))
+        D[~valid] = 0.0
+        return D.astype(np.float32)
+
+    def _fuse(self, q: np.ndarray, I: np.ndarray, query_text, k: int, allowed: Optional[np.ndarray]):
+        """
+        Reciprocal rank fusion of the dense hits with BM25 hits. Scores stay dense inner
+        products; the RRF scores that ordered the hits are returned alongside.
+        """
+        texts = [query_text] if isinstance(query_text, str) else list(query_text)
+        fused = np.full((len(texts), k), -1, dtype=np.int64)
+        F = np.zeros((len(texts), k), dtype=np.float32)
+        for r, text in enumerate(texts):
+            _, lexical = self.index.lexical_search(text, k, skip=lambda lex: self._lexical_skip(lex, allowed))
+            ids, scores = rrf_fuse([I[r], lexical], k, HYBRID_RRF_K)
+            fused[r, :len(ids)] = ids
+            F[r, :len(ids)] = scores
+        return self._dense_scores(q, fused), fused, F
+
+    def _dense_search(self, q: np.ndarray, k: int, nprobe=None, ef_search=None, flt: Optional[SearchFilter] = None):
+        """Dense top-k (D, I) per row, and the ids the filter allows (None without a filter)."""
+        allowed = None
+        t0 = time.perf_counter()
+        if flt is not None:
+            allowed, rows = self.filter_ids(flt)
+            D, I = self._search_filtered(q, k, allowed, rows, nprobe=nprobe, ef_search=ef_search)
+        elif self.rescoring():
+            # approximate scores only pick candidates; the returned scores are exact inner products
+            # (over-fetch by the number of retired ids so k live hits survive the filter)
+            fetch = k + len(self.retired)
+            _, I = self.index.search(q, fetch * max(1, FAISS_RESCORE_FACTOR), nprobe=nprobe, ef_search=ef_search)
+            I = self._drop_retired(I)
+            D, I = self.vectors.rescore(q, I, k, rows=self.chunks.rows(I))
+        else:
+            D, I = self.index.search(q, k + len(self.retired), nprobe=nprobe, ef_search=ef_search)
+            if len(self.retired):
+                D, I = self._take_live(D, I, k)
+        metrics.record("faiss", time.perf_counter() - t0)
+        return D, I, allowed
+
+    def _hydrate(self, D: np.ndarray, I: np.ndarray, extra: Optional[Dict[str, np.ndarray]] = None):
+        """Hit dicts per query row, hydrated with a single gather; `extra` adds per-hit scores by name."""
+        t0 = time.perf_counter()
+        batch = self.chunks.gather(I)
+        results = []
+
+        for row_idx in range(I.shape[0]):
+            hits = []
+            for col_idx in range(I.shape[1]):
+                j = row_idx * I.shape[1] + col_idx
+                idx = int(I[row_idx, col_idx])
+                if idx == -1:
+                    continue
+
+                meta = batch.meta(j)
+                hit = {
+                    "id": idx,
+                    "score": float(D[row_idx, col_idx]),
+                    "text": batch.text(j),                # chunk content
+                    "source": meta.get("source", ""),     # pdf name
+                    "meta": meta
+                }
+                for name, values in (extra or {}).items():
+                    hit[name] = float(values[row_idx, col_idx])
+                hits.append(hit)
+
+            results.append(hits)
+
+        metrics.record("hydrate", time.perf_counter() - t0)
+        return results
+
+    def search(
+        self,
+        query_emb: np.ndarray,
+        k: int = 5,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None,
+        flt: Optional[SearchFilter] = None,
+        query_text=None,
+    ):
+        """
+        Top-k hits per query row. `flt` restricts the search to some documents / pages;
+        `query_text` (one string per row) adds BM25 hits fused by reciprocal rank.
+        """
         if query_emb.ndim == 1:
             q = query_emb.reshape(1, -1)
         else:
             q = query_emb
 
-        D, I = self.index.search(q, k)
-        results = []
+        D, I, allowed = self._dense_search(q, k, nprobe=nprobe, ef_search=ef_search, flt=flt)
+        if query_text is not None and self.hybrid():
+            with metrics.stage("bm25"):
+                D, I, F = self._fuse(q, I, query_text, k, allowed)
+            return self._hydrate(D, I, {"fused": F})   # RRF score: the order of hybrid hits
+        return self._hydrate(D, I)
 
-        with SqliteDict(self.meta_db_path, autocommit=True) as db:
-            for row_idx in range(I.shape[0]):
-                hits = []
-                for col_idx in range(I.shape[1]):
-                    idx = int(I[row_idx, col_idx])
-                    if idx == -1:
-                        continue
+    # ---- shard side of a sharded search (the router fuses) ----
+    def lexical_stats(self, query_text) -> Optional[List]:
+        """BM25 collection statistics per query row over this store's segments; None if not hybrid."""
+        if not self.hybrid():
+            return None
+        texts = [query_text] if isinstance(query_text, str) else list(query_text)
+        return [self.index.lexical_stats(text) for text in texts]
 
-                    meta_json = db.get(str(idx), None)
-                    meta = json.loads(meta_json) if meta_json else {}
+    def search_parts(
+        self,
+        q: np.ndarray,
+        k: int,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None,
+        flt: Optional[SearchFilter] = None,
+        query_text=None,
+        stats: Optional[List] = None,
+    ) -> List[Dict]:
+        """
+        Unfused top-k per query row: {"dense": hits, "lexical": hits}. Lexical hits are BM25
+        ranked ("bm25") with `stats` (collection statistics summed over every shard) and carry
+        exact dense scores; in hybrid mode dense hits carry theirs as "exact". The router
+        merges each list across shards and fuses them once, like _fuse().
+        """
+        D, I, allowed = self._dense_search(q, k, nprobe=nprobe, ef_search=ef_search, flt=flt)
+        if query_text is None or stats is None or not self.hybrid():
+            return [{"dense": hits, "lexical": []} for hits in self._hydrate(D, I)]
+        with metrics.stage("bm25"):
+            texts = [query_text] if isinstance(query_text, str) else list(query_text)
+            L = np.full((len(texts), k), -1, dtype=np.int64)
+            B = np.zeros((len(texts), k), dtype=np.float32)
+            for r, text in enumerate(texts):
+                scores, ids = self.index.lexical_search(
+                    text, k, skip=lambda lex: self._lexical_skip(lex, allowed), stats=stats[r],
+                )
+                L[r, :len(ids)] = ids
+                B[r, :len(ids)] = scores
+        dense = self._hydrate(D, I, {"exact": self._dense_scores(q, I)})
+        lexical = self._hydrate(self._dense_scores(q, L), L, {"bm25": B})
+        return [{"dense": d, "lexical": l} for d, l in zip(dense, lexical)]
 
-                    hits.append({
-                        "id": idx,
-                        "score": float(D[row_idx, col_idx]),
-                        "text": meta.get("text", ""),         # chunk content
-                        "source": meta.get("source", ""),     # pdf name
-                        "meta": meta
-                    })
 
-                results.append(hits)
+class ResidentStore:
+    """
+    Keeps one FaissStore in memory for the lifetime of the process.
+    The manifest is polled at most every `reload_interval` seconds; when ingestion has
+    published a newer generation a fresh FaissStore is loaded and swapped in by reference,
+    so searches already holding the old store finish against it.
+    A shard worker passes `shard` and keeps only that shard's segments resident.
+    """
 
-        return results
+    def __init__(self, reload_interval: float = INDEX_RELOAD_INTERVAL, shard: Optional[int] = None):
+        self.reload_interval = reload_interval
+        self.shard = shard
+        self._store: Optional[FaissStore] = None
+        self._lock = threading.Lock()
+        self._last_check = 0.0
+        self.reloads = 0
+
+    def get(self, dim: int) -> FaissStore:
+        store = self._store
+        now = time.time()
+        if store is not None and now - self._last_check < self.reload_interval:
+            return store
+
+        self._last_check = now
+        generation = read_manifest().get("generation", 0)
+        if store is not None and store.generation >= generation:
+            return store
+
+        with self._lock:
+            store = self._store
+            if store is None or store.generation < generation:
+                t0 = time.time()
+                try:
+                    store = FaissStore(dim, previous=self._store, shard=self.shard)
+                except FileNotFoundError:
+                    # a segment was merged away between reading the manifest and opening it
+                    store = FaissStore(dim, previous=self._store, shard=self.shard)
+                self._store = store
+                self.reloads += 1
+                logger.info(
+                    f"[STORE] loaded generation {store.generation} "
+                    f"({store.index.ntotal} vectors) in {time.time() - t0:.2f}s"
+                )
+        return store
+
+    def current(self) -> Optional[FaissStore]:
+        """The loaded store, without loading or reloading it (None before the first get())."""
+        return self._store
+
+    def invalidate(self):
+        """Force the next get() to check the manifest."""
+        self._last_check = 0.0
+
+
+# Singleton resident store
+STORE = ResidentStore()
@@ -0,0 +1,85 @@
+import time
+import numpy as np
+import faiss
+from src.app.services import index_factory
+from src.app.services.registry import get_embedder, get_full_store
+from src.evaluation.retrieval_eval import load_eval_queries
+
+
+# ---- Recall vs. latency of approximate index types against the exact (flat) index ----
+
+NPROBE_SWEEP = [1, 4, 8, 16, 32, 64]
+EF_SEARCH_SWEEP = [16, 32, 64, 128, 256]
+
+
+def build_queries(vectors: np.ndarray, n_sample: int = 200, seed: int = 0) -> np.ndarray:
+    """Eval questions plus a sample of corpus vectors (held-out style) as the query set."""
+    embedder = get_embedder()
+    questions = [q["question"] for q in load_eval_queries()]
+    q_embs = embedder.embed_queries(questions)
+    rng = np.random.default_rng(seed)
+    sample = vectors[rng.choice(len(vectors), size=min(n_sample, len(vectors)), replace=False)]
+    return np.ascontiguousarray(np.vstack([q_embs, sample]), dtype=np.float32)
+
+
+def recall_vs_exact(I_exact: np.ndarray, I_approx: np.ndarray, k: int) -> float:
+    hits = 0
+    for row_exact, row_approx in zip(I_exact[:, :k], I_approx[:, :k]):
+        hits += len(set(row_exact.tolist()) & set(row_approx.tolist()))
+    return hits / (I_exact.shape[0] * k)
+
+
+def time_search(index, queries: np.ndarray, k: int, params=None):
+    t0 = time.perf_counter()
+    for q in queries:   # one query at a time, like the API
+        index.search(q.reshape(1, -1), k, params=params)
+    per_query_ms = (time.perf_counter() - t0) / len(queries) * 1000
+    _, I = index.search(queries, k, params=params)
+    return per_query_ms, I
+
+
+def run_report(k: int = 20):
+    store = get_full_store()
+    _, vectors = store.live_vectors()
+    n, dim = vectors.shape
+    if n == 0:
+        print("Index is empty; ingest documents first.")
+        return
+    queries = build_queries(vectors)
+
+    exact = faiss.IndexFlatIP(dim)
+    exact.add(vectors)
+    flat_ms, I_exact = time_search(exact, queries, k)
+
+    print(f"\n===== INDEX TUNING REPORT (n={n}, dim={dim}, queries={len(queries)}, k={k}) =====")
+    print(f"{'index':<28}{'recall@k':>10}{'ms/query':>10}")
+    print(f"{'flat (exact)':<28}{1.0:>10.3f}{flat_ms:>10.3f}")
+
+    params = index_factory.default_params()
+    for kind in ("ivf_flat", "ivf_pq"):
+        if not index_factory.can_build(kind, n, params):
+            print(f"{kind:<28}{'n/a':>10}   (needs more vectors to train)")
+            continue
+        p = dict(params)
+        index = index_factory.build_index(kind, dim, p, train_vectors=vectors)
+        index.add(vectors)
+        for nprobe in NPROBE_SWEEP:
+            if nprobe > p["nlist"]:
+                break
+            sp = faiss.SearchParametersIVF(nprobe=nprobe)
+            ms, I = time_search(index, queries, k, sp)
+            label = f"{kind} nlist={p['nlist']} nprobe={nprobe}"
+            print(f"{label:<28}{recall_vs_exact(I_exact, I, k):>10.3f}{ms:>10.3f}")
+
+    p = dict(params)
+    index = index_factory.build_index("hnsw", dim, p)
+    index.add(vectors)
+    for ef in EF_SEARCH_SWEEP:
+        sp = faiss.SearchParametersHNSW(efSearch=ef)
+        ms, I = time_search(index, queries, k, sp)
+        label = f"hnsw M={p['M']} ef={ef}"
+        print(f"{label:<28}{recall_vs_exact(I_exact, I, k):>10.3f}{ms:>10.3f}")
+
+
+if __name__ == "__main__":
+    run_report()
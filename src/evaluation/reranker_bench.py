@@ -0,0 +1,72 @@
+import sys
+import time
+import statistics
+import numpy as np
+from src.app.services.cache import LRUCache
+from src.app.services.reranker import CrossEncoderReranker
+from src.app.services.registry import get_embedder, get_full_store
+from src.app.api.query import build_candidates
+from src.evaluation.retrieval_eval import load_eval_queries
+from src.utils.config import RERANKER_BATCH_SIZE
+
+
+# ---- Reranker benchmark: PyTorch fp32 baseline vs. an optimized backend ----
+
+def spearman(a, b) -> float:
+    """Rank correlation of two score lists over the same candidates."""
+    ra = np.argsort(np.argsort(a)).astype(np.float64)
+    rb = np.argsort(np.argsort(b)).astype(np.float64)
+    if len(a) < 2 or ra.std() == 0 or rb.std() == 0:
+        return 1.0
+    return float(np.corrcoef(ra, rb)[0, 1])
+
+
+def time_rerank(reranker: CrossEncoderReranker, query: str, candidates: list):
+    t0 = time.perf_counter()
+    scores = reranker.score([query] * len(candidates), [c["text"] for c in candidates], [c.get("id") for c in candidates])
+    return time.perf_counter() - t0, scores
+
+
+def run_benchmark(backend: str = "int8", max_length: int = 256, k: int = 20, top_n: int = 3):
+    embedder = get_embedder()
+    store = get_full_store()
+    workload = []
+    for q in load_eval_queries():
+        candidates = build_candidates(store.search(embedder.embed_query(q["question"]), k=k)[0])
+        if candidates:
+            workload.append((q["question"], candidates))
+
+    baseline = CrossEncoderReranker(backend="torch", max_length=None, batch_size=32, cache=None)
+    optimized = CrossEncoderReranker(backend=backend, max_length=max_length, batch_size=RERANKER_BATCH_SIZE,
+                                     cache=LRUCache(max_items=100000, name="bench"))
+
+    base_ms, cold_ms, warm_ms = [], [], []
+    top1, overlap, rho = [], [], []
+    for query, candidates in workload:
+        t, base_scores = time_rerank(baseline, query, candidates)
+        base_ms.append(t * 1000)
+        t, opt_scores = time_rerank(optimized, query, candidates)
+        cold_ms.append(t * 1000)
+        t, _ = time_rerank(optimized, query.upper() + "?", candidates)   # near-repeat: served from the cache
+        warm_ms.append(t * 1000)
+
+        base_rank, opt_rank = np.argsort(-base_scores), np.argsort(-opt_scores)
+        top1.append(float(base_rank[0] == opt_rank[0]))
+        overlap.append(len(set(base_rank[:top_n]) & set(opt_rank[:top_n])) / min(top_n, len(candidates)))
+        rho.append(spearman(base_scores, opt_scores))
+
+    print("\n===== RERANKER BENCHMARK =====")
+    print("Queries:", len(workload), f"x {k} candidates")
+    print(f"Baseline (torch fp32, full length): {statistics.median(base_ms):.1f} ms median")
+    print(f"{optimized.backend} max_length={max_length} (cold):   {statistics.median(cold_ms):.1f} ms median "
+          f"({statistics.median(base_ms) / max(statistics.median(cold_ms), 1e-6):.1f}x)")
+    print(f"{optimized.backend} near-repeat (cached):         {statistics.median(warm_ms):.2f} ms median")
+    print(f"Top-1 agreement:      {np.mean(top1):.3f}")
+    print(f"Top-{top_n} overlap:        {np.mean(overlap):.3f}")
+    print(f"Spearman rank corr.:  {np.mean(rho):.3f}")
+
+
+if __name__ == "__main__":
+    # python -m src.evaluation.reranker_bench [int8|onnx|torch] [max_length]
+    args = sys.argv[1:]
+    run_benchmark(backend=args[0] if args else "int8", max_length=int(args[1]) if len(args) > 1 else 256)
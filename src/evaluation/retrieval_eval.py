@@ -1,9 +1,12 @@
 import json
 import os
+import sys
 from pathlib import Path
-from src.app.services.embedder import Embedder
-from src.app.services.vector_store import FaissStore
-from src.app.services.reranker import CrossEncoderReranker
+import faiss
+import numpy as np
+from src.app.services import index_factory
+from src.app.services.registry import get_embedder, get_reranker, get_full_store
+from src.utils.config import FAISS_RESCORE_FACTOR
 
 
 # ---------------------------
@@ -44,8 +47,8 @@ def load_eval_queries():
 
 def evaluate_model(top_k=5):
     queries = load_eval_queries()
-    embedder = Embedder()
-    reranker = CrossEncoderReranker()
+    embedder = get_embedder()
+    reranker = get_reranker()
 
     avg_recall, avg_precision, avg_mrr = [], [], []
 
@@ -58,8 +61,7 @@ def evaluate_model(top_k=5):
 
         # embed
         q_emb = embedder.embed_query(q)
-        dim = len(q_emb)
-        store = FaissStore(dim)
+        store = get_full_store()
 
         results = store.search(q_emb, k=50)
         hits = results[0]
@@ -107,5 +109,157 @@ def evaluate_model(top_k=5):
     print("MRR:", sum(avg_mrr) / len(avg_mrr))
 
 
+# ---- COMPRESSED INDEX EVAL ----
+
+def sources_for(store, I_row):
+    batch = store.chunks.gather(I_row)
+    return [normalize_source(batch.source(j)) for j in range(len(batch)) if batch.valid[j]]
+
+
+def compare_compressed(top_k=5, kinds=("sq8", "ivf_pq")):
+    """
+    Memory saved and recall@k delta of each compressed type against the exact flat index,
+    with and without exact re-scoring from the full-precision vector file.
+    """
+    store = get_full_store()
+    if not store.has_exact_vectors():
+        print("Full-precision vector file is incomplete; ingest once to backfill it.")
+        return
+    # evaluation indexes are positional: row i of `vectors` is chunk ids[i]
+    ids, vectors = store.live_vectors()
+    n, dim = vectors.shape
+    if n == 0:
+        print("Index is empty; ingest documents first.")
+        return
+
+    queries = load_eval_queries()
+    gts = [[normalize_source(s) for s in q["relevant_sources"]] for q in queries]
+    q_embs = np.ascontiguousarray(get_embedder().embed_queries([q["question"] for q in queries]), dtype=np.float32)
+
+    def to_ids(I):
+        return np.where(I >= 0, ids[np.maximum(I, 0)], -1)
+
+    def recall(I):
+        I = to_ids(I)
+        return sum(recall_at_k(sources_for(store, row), gt, top_k) for row, gt in zip(I, gts)) / len(gts)
+
+    flat = faiss.IndexFlatIP(dim)
+    flat.add(vectors)
+    flat_bytes = index_factory.index_bytes(flat)
+    _, I = flat.search(q_embs, top_k)
+    flat_recall = recall(I)
+
+    print(f"\n===== COMPRESSED INDEX REPORT (n={n}, dim={dim}, queries={len(queries)}, k={top_k}) =====")
+    print(f"{'index':<18}{'MB':>9}{'saved':>8}{'recall@k':>10}{'delta':>8}")
+    print(f"{'flat':<18}{flat_bytes / 2**20:>9.2f}{'-':>8}{flat_recall:>10.3f}{'-':>8}")
+
+    params = index_factory.default_params()
+    for kind in kinds:
+        if not index_factory.can_build(kind, n, params):
+            print(f"{kind:<18}{'n/a':>9}   (needs more vectors to train)")
+            continue
+        index = index_factory.build_index(kind, dim, dict(params), train_vectors=vectors)
+        index.add(vectors)
+        size = index_factory.index_bytes(index)
+        saved = 1 - size / flat_bytes
+
+        _, I = index.search(q_embs, top_k)
+        r = recall(I)
+        print(f"{kind:<18}{size / 2**20:>9.2f}{saved:>8.0%}{r:>10.3f}{r - flat_recall:>+8.3f}")
+
+        _, I = index.search(q_embs, top_k * max(1, FAISS_RESCORE_FACTOR))
+        _, I = store.vectors.rescore(q_embs, I, top_k, rows=store.chunks.rows(to_ids(I)))
+        r = recall(I)
+        label = f"{kind}+rescore"
+        print(f"{label:<18}{size / 2**20:>9.2f}{saved:>8.0%}{r:>10.3f}{r - flat_recall:>+8.3f}")
+
+
+# ---- RERANK CASCADE EVAL ----
+
+def compare_cascade(top_k=5, k=20):
+    """
+    Full reranking of every candidate vs. the confidence cascade: rerank latency, pairs
+    scored and recall@k / MRR of each, plus how often each cascade mode was chosen.
+    The reranker's score cache is bypassed so both sides pay for every pair they score.
+    """
+    from src.app.api.query import build_candidates
+    from src.app.services.cascade import RerankCascade
+
+    queries = load_eval_queries()
+    embedder = get_embedder()
+    reranker = get_reranker()
+    store = get_full_store()
+    cache, reranker.cache = reranker.cache, None
+    full, cascade = RerankCascade(enabled=False), RerankCascade(enabled=True)
+
+    rows = {"full": [], "cascade": []}
+    try:
+        for qinfo in queries:
+            q = qinfo["question"]
+            gt = [normalize_source(s) for s in qinfo["relevant_sources"]]
+            candidates = build_candidates(store.search(embedder.embed_query(q), k=k)[0])
+            if not candidates:
+                continue
+            for name, runner in (("full", full), ("cascade", cascade)):
+                ranked, decision = runner.rerank(reranker, q, [dict(c) for c in candidates])
+                sources = [normalize_source(c["meta"].get("source")) for c in ranked]
+                rows[name].append((decision, recall_at_k(sources, gt, top_k), mrr(sources, gt)))
+    finally:
+        reranker.cache = cache
+
+    n = len(rows["full"])
+    if not n:
+        print("No candidates for any query; ingest documents first.")
+        return
+    print(f"\n===== RERANK CASCADE REPORT (queries={n}, candidates<={k}, k={top_k}) =====")
+    print(f"{'mode':<10}{'ms/query':>10}{'pairs':>8}{'recall@k':>10}{'MRR':>8}")
+    for name, results in rows.items():
+        ms = sum(d["ms"] for d, _, _ in results) / n
+        pairs = sum(d["reranked"] for d, _, _ in results) / n
+        r = sum(r for _, r, _ in results) / n
+        m = sum(m for _, _, m in results) / n
+        print(f"{name:<10}{ms:>10.1f}{pairs:>8.1f}{r:>10.3f}{m:>8.3f}")
+    print("Cascade decisions:", cascade.stats()["decisions"], "early stops:", cascade.early_stops)
+
+
+# ---- HYBRID RETRIEVAL EVAL ----
+
+def compare_hybrid(candidate_counts=(5, 10, 20)):
+    """
+    Recall@k and MRR of dense-only retrieval vs. dense + BM25 fused by reciprocal rank,
+    at several candidate counts (the reranker's input size).
+    """
+    store = get_full_store()
+    if not store.hybrid():
+        print("No BM25 postings (or HYBRID_SEARCH=0); run `python -m src.app.services.lexical` first.")
+        return
+    queries = load_eval_queries()
+    gts = [[normalize_source(s) for s in q["relevant_sources"]] for q in queries]
+    texts = [q["question"] for q in queries]
+    q_embs = get_embedder().embed_queries(texts)
+
+    print(f"\n===== HYBRID RETRIEVAL REPORT (queries={len(queries)}) =====")
+    print(f"{'candidates':<12}{'dense R@k':>11}{'hybrid R@k':>12}{'dense MRR':>11}{'hybrid MRR':>12}")
+    for k in candidate_counts:
+        row = []
+        for query_text in (None, texts):
+            hits = store.search(q_embs, k=k, query_text=query_text)
+            sources = [[normalize_source(h["source"]) for h in row_hits] for row_hits in hits]
+            row.append((
+                sum(recall_at_k(s, gt, k) for s, gt in zip(sources, gts)) / len(gts),
+                sum(mrr(s, gt) for s, gt in zip(sources, gts)) / len(gts),
+            ))
+        (dr, dm), (hr, hm) = row
+        print(f"{k:<12}{dr:>11.3f}{hr:>12.3f}{dm:>11.3f}{hm:>12.3f}")
+
+
 if __name__ == "__main__":
-    evaluate_model()
+    # python src/evaluation/retrieval_eval.py [--compressed | --cascade | --hybrid]
+    if "--compressed" in sys.argv:
+        compare_compressed()
+    elif "--hybrid" in sys.argv:
+        compare_hybrid()
+    elif "--cascade" in sys.argv:
+        compare_cascade()
+    else:
+        evaluate_model()
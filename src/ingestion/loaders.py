@@ -1,5 +1,5 @@
 from pathlib import Path
-from typing import List, Dict
+from typing import List, Dict, Optional, Tuple
 import pypdf
 
 def load_txt(path: str) -> str:
@@ -11,14 +11,19 @@ def load_md(path: str) -> str:
 
 def load_pdf(path: str) -> List[str]:
     """Memory-safe PDF loader that returns pages instead of 1 huge string."""
+    return load_pdf_range(path, 0, None)[1]
+
+def load_pdf_range(path: str, start: int, stop: Optional[int]) -> Tuple[int, List[str]]:
+    """Text of pages [start, stop) plus the total page count (unit of work for the process pool)."""
     pages = []
     reader = pypdf.PdfReader(path)
-    for page in reader.pages:
+    total = len(reader.pages)
+    for i in range(start, total if stop is None else min(stop, total)):
         try:
-            pages.append(page.extract_text() or "")
+            pages.append(reader.pages[i].extract_text() or "")
         except:
             pages.append("")
-    return pages
+    return total, pages
 
 def load_document(path: str) -> Dict:
     ext = Path(path).suffix.lower()
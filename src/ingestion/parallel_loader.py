@@ -0,0 +1,156 @@
+# src/ingestion/parallel_loader.py
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from src.ingestion.loaders import load_document, load_pdf_range
+from src.utils.config import INGEST_WORKERS, PDF_PAGES_PER_TASK, INGEST_NICE
+from src.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+def _is_pdf(path: str) -> bool:
+    return Path(path).suffix.lower() == ".pdf"
+
+
+def _lower_priority():
+    # parser processes yield the CPU to query serving
+    if INGEST_NICE and hasattr(os, "nice"):
+        os.nice(INGEST_NICE)
+
+
+def _new_pool(workers: int) -> ProcessPoolExecutor:
+    # spawned, not forked: the server process has torch/OpenMP pools and request threads whose
+    # locks a forked child would inherit in whatever state they were in
+    return ProcessPoolExecutor(
+        max_workers=workers, initializer=_lower_priority, mp_context=multiprocessing.get_context("spawn"),
+    )
+
+
+def _run_task(kind: str, path: str, start: int = 0, stop: Optional[int] = None):
+    if kind == "pdf":
+        return load_pdf_range(path, start, stop)
+    return load_document(path)
+
+
+def load_documents_parallel(
+    paths: List[str],
+    workers: int = INGEST_WORKERS,
+    pages_per_task: int = PDF_PAGES_PER_TASK,
+    max_in_flight: Optional[int] = None,
+) -> Iterator[Tuple[str, Optional[Dict], Optional[str]]]:
+    """
+    Yield (path, doc, error) as documents finish loading, in completion order.
+    Each PDF is first read as pages [0, pages_per_task); the rest of a large PDF is then
+    fanned out as further page ranges and reassembled in page order. An exception, or a
+    worker crash, fails only the document it belongs to (doc None, error set).
+    At most `max_in_flight` tasks (default 2 per worker) are submitted at once, so parsed
+    text cannot pile up faster than the consumer splits and embeds it.
+    When a worker crashes, the tasks that were in flight are retried one at a time on a fresh
+    pool, so only the task that crashes on its own is failed.
+    """
+    if workers <= 1:
+        # no pool: same results, loaded in this process
+        for path in paths:
+            try:
+                yield path, load_document(path), None
+            except Exception as e:
+                yield path, None, f"{type(e).__name__}: {e}"
+        return
+
+    parts: Dict[str, Dict[int, List[str]]] = {}     # path -> {start page: texts}
+    remaining: Dict[str, int] = {}                  # path -> outstanding tasks
+    failed = set()
+    pending = {}                                    # future -> task tuple
+    max_in_flight = max_in_flight or workers * 2
+    queue = deque()                                 # tasks not submitted yet
+    suspects = deque()                              # tasks in flight at a crash, retried alone
+
+    pool = _new_pool(workers)
+
+    def submit(task):
+        pending[pool.submit(_run_task, *task)] = task
+
+    def fill():
+        if suspects:
+            # isolate the crash: nothing else runs until every suspect has been retried alone
+            while suspects and not pending:
+                task = suspects.popleft()
+                if task[1] not in failed:
+                    submit(task)
+            return
+        while queue and len(pending) < max_in_flight:
+            task = queue.popleft()
+            if task[1] not in failed:
+                submit(task)
+
+    for path in paths:
+        remaining[path] = 1
+        queue.append(("pdf", path, 0, pages_per_task) if _is_pdf(path) else ("doc", path))
+    fill()
+
+    def fail(path: str, error: str):
+        failed.add(path)
+        parts.pop(path, None)
+        logger.warning(f"[LOAD] failed {path}: {error}")
+        return path, None, error
+
+    try:
+        while pending or queue or suspects:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            broken = []
+            for fut in done:
+                task = pending.pop(fut)
+                path = task[1]
+                try:
+                    result = fut.result()
+                except BrokenProcessPool:
+                    broken.append(task)
+                    continue
+                except Exception as e:
+                    if path not in failed:
+                        yield fail(path, f"{type(e).__name__}: {e}")
+                    continue
+                if path in failed:
+                    continue
+
+                if task[0] == "doc":
+                    yield path, result, None
+                    continue
+
+                total, pages = result
+                start = task[2]
+                parts.setdefault(path, {})[start] = pages
+                remaining[path] -= 1
+                if start == 0:
+                    # first range tells us how many more to submit
+                    # (queued ahead of other documents so this one can finish and be released)
+                    for s in reversed(range(pages_per_task, total, pages_per_task)):
+                        remaining[path] += 1
+                        queue.appendleft(("pdf", path, s, s + pages_per_task))
+                if remaining[path] == 0:
+                    ranges = parts.pop(path)
+                    ordered = [p for s in sorted(ranges) for p in ranges[s]]
+                    yield path, {"source": path, "pages": ordered}, None
+
+            if broken:
+                # a worker died (e.g. segfault in a parser): every in-flight task is lost with it.
+                # A task that was running alone caused the crash; otherwise the culprit is unknown,
+                # so all of them are retried one at a time on a fresh pool
+                broken.extend(pending.values())
+                pending.clear()
+                pool.shutdown(wait=False, cancel_futures=True)
+                pool = _new_pool(workers)
+                if len(broken) == 1:
+                    if broken[0][1] not in failed:
+                        yield fail(broken[0][1], "worker process crashed while parsing")
+                else:
+                    suspects.extend(task for task in broken if task[1] not in failed)
+            fill()
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
@@ -11,13 +11,84 @@ BASE_DIR = Path(__file__).resolve().parent.parent.parent
 # -----------------------------
 # STORAGE FOLDERS
 # -----------------------------
-DATA_DIR = BASE_DIR / "data"
+DATA_DIR = Path(os.getenv("DATA_DIR", BASE_DIR / "data"))
 DATA_DIR.mkdir(exist_ok=True)
 
 FAISS_DIR = DATA_DIR / "faiss_index"
 FAISS_DIR.mkdir(parents=True, exist_ok=True)
 
-METADATA_PATH = DATA_DIR / "metadata.db"  # SQLite DB for chunk metadata
+METADATA_PATH = DATA_DIR / "metadata.db"  # legacy SQLite chunk metadata (migrated on first load)
+
+CHUNK_STORE_DIR = DATA_DIR / "chunks"  # columnar chunk text + metadata addressed by FAISS id
+
+# Ingested documents: file hash + (chunk hash, FAISS id) pairs, for incremental re-ingestion
+DOC_REGISTRY_PATH = DATA_DIR / "documents.json"
+
+# Published index version (generation counter); rewritten atomically after every save
+MANIFEST_PATH = FAISS_DIR / "manifest.json"
+
+# -----------------------------
+# FAISS INDEX TYPE
+# -----------------------------
+# flat | ivf_flat | ivf_pq | hnsw | sq8. Trained types stay flat until enough vectors exist,
+# then the index is migrated during ingestion. Unset = keep the type recorded in the manifest.
+FAISS_INDEX_TYPE = os.getenv("FAISS_INDEX_TYPE")
+FAISS_NLIST = int(os.getenv("FAISS_NLIST", 0))            # IVF lists (0 = ~4*sqrt(n))
+FAISS_NPROBE = int(os.getenv("FAISS_NPROBE", 8))          # IVF lists scanned per query (default)
+FAISS_PQ_M = int(os.getenv("FAISS_PQ_M", 16))             # PQ sub-quantizers (must divide dim)
+FAISS_PQ_NBITS = int(os.getenv("FAISS_PQ_NBITS", 8))
+FAISS_HNSW_M = int(os.getenv("FAISS_HNSW_M", 32))
+FAISS_EF_SEARCH = int(os.getenv("FAISS_EF_SEARCH", 64))   # HNSW search breadth (default)
+FAISS_EF_CONSTRUCTION = int(os.getenv("FAISS_EF_CONSTRUCTION", 80))
+
+# Compressed types (sq8 = int8 scalar quantizer, ivf_pq) keep full-precision vectors in a
+# memory-mapped side file and re-score RESCORE_FACTOR * k candidates exactly
+FAISS_EXACT_RESCORE = os.getenv("FAISS_EXACT_RESCORE", "1") == "1"
+FAISS_RESCORE_FACTOR = int(os.getenv("FAISS_RESCORE_FACTOR", 4))
+
+# Filtered searches matching at most this many chunks are scored exactly from the vector file
+# (no index scan); broader filters are pushed into FAISS as an id bitmap
+FILTER_EXACT_MAX = int(os.getenv("FILTER_EXACT_MAX", 20000))
+
+# Hybrid retrieval: BM25 postings are written with every segment, and searches that pass the
+# query text fuse BM25 and dense hits by reciprocal rank (1 / (HYBRID_RRF_K + rank))
+HYBRID_SEARCH = os.getenv("HYBRID_SEARCH", "1") == "1"
+HYBRID_RRF_K = int(os.getenv("HYBRID_RRF_K", 60))
+BM25_K1 = float(os.getenv("BM25_K1", 1.2))
+BM25_B = float(os.getenv("BM25_B", 0.75))
+# FAISS candidates per query handed to the reranker cascade in /chat
+RETRIEVAL_K = int(os.getenv("RETRIEVAL_K", 20))
+
+# Each ingest batch becomes a small immutable segment; a background merger folds the
+# SEGMENT_MERGE_FANIN smallest ones together whenever there are more than SEGMENT_MAX_COUNT
+SEGMENT_MAX_COUNT = int(os.getenv("SEGMENT_MAX_COUNT", 8))
+SEGMENT_MERGE_FANIN = int(os.getenv("SEGMENT_MERGE_FANIN", 4))
+
+# Sharded retrieval: segments are partitioned across INDEX_SHARDS shard workers (by chunk id
+# when an index is rebuilt, least-loaded shard for each ingest batch). Queries go to every shard
+# in parallel and the per-shard top-k lists are merged; a shard that does not answer within
+# SHARD_TIMEOUT seconds is left out of the result. Workers are spawned locally unless
+# SHARD_ADDRESSES lists running ones (comma-separated host:port or unix socket paths).
+# At startup every shard must load its segments and answer within SHARD_START_TIMEOUT seconds
+# before the API reports ready.
+INDEX_SHARDS = int(os.getenv("INDEX_SHARDS", 1))
+SHARD_ADDRESSES = [a.strip() for a in os.getenv("SHARD_ADDRESSES", "").split(",") if a.strip()]
+SHARD_TIMEOUT = float(os.getenv("SHARD_TIMEOUT", 2.0))
+SHARD_START_TIMEOUT = float(os.getenv("SHARD_START_TIMEOUT", 300.0))
+SHARD_AUTHKEY = os.getenv("SHARD_AUTHKEY", "")
+
+# Background compaction drops deleted/replaced chunks once they exceed this share of the index
+COMPACT_GARBAGE_RATIO = float(os.getenv("COMPACT_GARBAGE_RATIO", 0.2))
+COMPACT_MIN_RETIRED = int(os.getenv("COMPACT_MIN_RETIRED", 100))
+
+# Open index segments memory-mapped (faiss IO_FLAG_MMAP) instead of reading them into each
+# process; `python -m src.app.serve` turns it on so all workers share one page-cache copy
+FAISS_MMAP = os.getenv("FAISS_MMAP", "0") == "1"
+# Worker processes started by `python -m src.app.serve` (models are loaded once, then forked)
+SERVE_WORKERS = int(os.getenv("SERVE_WORKERS", 2))
+
+# How often (seconds) the resident store checks the manifest for a new generation
+INDEX_RELOAD_INTERVAL = float(os.getenv("INDEX_RELOAD_INTERVAL", 1.0))
 
 UPLOAD_DIR = DATA_DIR / "uploads"
 UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
@@ -27,6 +98,93 @@ UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
 # -----------------------------
 # Example in .env → EMBEDDER_MODEL=sentence-transformers/all-MiniLM-L6-v2
 EMBEDDER_MODEL = os.getenv("EMBEDDER_MODEL")
+# torch (fp32) | int8 (dynamic quantization) | onnx (ONNX Runtime, falls back to int8)
+EMBEDDER_BACKEND = os.getenv("EMBEDDER_BACKEND", "torch")
+EMBEDDER_ONNX_FILE = os.getenv("EMBEDDER_ONNX_FILE")   # e.g. onnx/model_qint8_avx512.onnx
+# Concurrent single queries are collected for up to EMBED_BATCH_WAIT_MS and encoded together
+EMBED_BATCH_WAIT_MS = float(os.getenv("EMBED_BATCH_WAIT_MS", 3))
+EMBED_BATCH_MAX = int(os.getenv("EMBED_BATCH_MAX", 32))
+# Ingest texts are encoded in length-sorted sub-batches; queries may run between them
+EMBED_DOC_BATCH_SIZE = int(os.getenv("EMBED_DOC_BATCH_SIZE", 32))
+
+# -----------------------------
+# RERANKER
+# -----------------------------
+RERANKER_MODEL = os.getenv("RERANKER_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+# torch (fp32) | int8 (dynamic quantization) | onnx (ONNX Runtime, falls back to int8)
+RERANKER_BACKEND = os.getenv("RERANKER_BACKEND", "torch")
+RERANKER_ONNX_FILE = os.getenv("RERANKER_ONNX_FILE")   # e.g. onnx/model_qint8_avx512.onnx
+RERANKER_MAX_LENGTH = int(os.getenv("RERANKER_MAX_LENGTH", 0))   # tokens per (query, chunk) pair, 0 = model max
+RERANKER_BATCH_SIZE = int(os.getenv("RERANKER_BATCH_SIZE", 16))
+RERANK_CACHE_SIZE = int(os.getenv("RERANK_CACHE_SIZE", 20000))   # cached (query, chunk id) scores
+
+# Rerank cascade: how many FAISS candidates go through the cross-encoder, from the dense scores.
+# skip when top1 - top2 >= SKIP_MARGIN and the top score's z-score >= SKIP_Z; only the first
+# FEW_N when top1 - top2 >= FEW_MARGIN; else all, in steps of CASCADE_STEP until the top
+# CASCADE_STABLE_K stops changing. Hybrid candidates are ordered by RRF score, so their margins
+# use the FUSED thresholds, in units of a first rank in one list (1 / (HYBRID_RRF_K + 1)):
+# a hit ranked first by both dense and BM25 leads one ranked second by only one of them by ~1.
+RERANK_CASCADE = os.getenv("RERANK_CASCADE", "1") == "1"
+CASCADE_SKIP_MARGIN = float(os.getenv("CASCADE_SKIP_MARGIN", 0.08))
+CASCADE_SKIP_Z = float(os.getenv("CASCADE_SKIP_Z", 2.5))
+CASCADE_FEW_MARGIN = float(os.getenv("CASCADE_FEW_MARGIN", 0.03))
+CASCADE_FEW_N = int(os.getenv("CASCADE_FEW_N", 5))
+CASCADE_FUSED_SKIP_MARGIN = float(os.getenv("CASCADE_FUSED_SKIP_MARGIN", 0.8))
+CASCADE_FUSED_FEW_MARGIN = float(os.getenv("CASCADE_FUSED_FEW_MARGIN", 0.4))
+CASCADE_STEP = int(os.getenv("CASCADE_STEP", 5))
+CASCADE_STABLE_K = int(os.getenv("CASCADE_STABLE_K", 3))
+
+# Context selection after the cascade. Cross-encoder scores of the ms-marco rerankers are logits
+# (unbounded, often negative), so a reranked chunk is kept when its score is at least
+# CONTEXT_RERANK_MIN_SCORE and within CONTEXT_RERANK_MARGIN of the best one. When reranking was
+# skipped, chunks are kept on the score that ordered them: dense cosine >= CONTEXT_MIN_SIMILARITY,
+# and (dense or RRF) >= CONTEXT_RELATIVE_SCORE * the top score.
+CONTEXT_RERANK_MIN_SCORE = float(os.getenv("CONTEXT_RERANK_MIN_SCORE", -2.0))
+CONTEXT_RERANK_MARGIN = float(os.getenv("CONTEXT_RERANK_MARGIN", 4.0))
+CONTEXT_MIN_SIMILARITY = float(os.getenv("CONTEXT_MIN_SIMILARITY", 0.10))
+CONTEXT_RELATIVE_SCORE = float(os.getenv("CONTEXT_RELATIVE_SCORE", 0.45))
+
+# -----------------------------
+# MODEL REGISTRY
+# -----------------------------
+# Comma separated list of models loaded at startup (embedder, reranker, llm)
+WARMUP_MODELS = [m.strip() for m in os.getenv("WARMUP_MODELS", "embedder,reranker,llm").split(",") if m.strip()]
+
+# -----------------------------
+# BATCH ENDPOINTS
+# -----------------------------
+BATCH_MAX_QUERIES = int(os.getenv("BATCH_MAX_QUERIES", 256))
+
+# -----------------------------
+# CACHES
+# -----------------------------
+# Byte budgets (0 = count-limited only)
+EMBED_CACHE_MAX_BYTES = int(os.getenv("EMBED_CACHE_MAX_BYTES", 16 * 1024 * 1024))
+SEARCH_CACHE_MAX_BYTES = int(os.getenv("SEARCH_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+
+# -----------------------------
+# SEMANTIC ANSWER CACHE
+# -----------------------------
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "1") == "1"
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", 0.92))  # cosine similarity for a hit
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", 2048))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", 24 * 3600))
+
+# -----------------------------
+# INGESTION
+# -----------------------------
+# Processes parsing documents (1 = parse in the calling process); large PDFs are split into page ranges
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", max(1, (os.cpu_count() or 2) - 1)))
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", 32))
+# Chunks are embedded and committed to FAISS in micro-batches; a batch is flushed at
+# INGEST_BATCH_SIZE chunks or when its text + embeddings reach INGEST_MAX_BUFFER_MB
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", 256))
+INGEST_MAX_BUFFER_MB = float(os.getenv("INGEST_MAX_BUFFER_MB", 64))
+# Background ingestion jobs: concurrent jobs, waiting jobs before 503, finished jobs kept for polling
+INGEST_MAX_JOBS = int(os.getenv("INGEST_MAX_JOBS", 1))
+INGEST_QUEUE_DEPTH = int(os.getenv("INGEST_QUEUE_DEPTH", 16))
+INGEST_JOB_HISTORY = int(os.getenv("INGEST_JOB_HISTORY", 100))
+INGEST_NICE = int(os.getenv("INGEST_NICE", 10))   # niceness added to parser processes
 
 # -----------------------------
 # CHUNKING CONFIG
@@ -46,6 +204,16 @@ else:
     # fallback if env variable missing
     LLAMA_MODEL_PATH = BASE_DIR / "models" / "llama" / "ggml-model-q4_0.bin"
 
+# -----------------------------
+# LLM INFERENCE SCHEDULER
+# -----------------------------
+LLM_SLOTS = int(os.getenv("LLM_SLOTS", 1))                  # model instances generating concurrently
+LLM_THREADS = int(os.getenv("LLM_THREADS", 8))              # total llama.cpp threads, split across slots
+LLM_QUEUE_DEPTH = int(os.getenv("LLM_QUEUE_DEPTH", 8))      # waiting requests before 503
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", 30))        # max seconds waiting for a slot
+LLM_REQUEST_DEADLINE = float(os.getenv("LLM_REQUEST_DEADLINE", 180))  # max seconds from enqueue to last token
+LLM_PREFIX_CACHE = os.getenv("LLM_PREFIX_CACHE", "1") == "1"   # reuse KV state of the fixed prompt prefix
+
 # -----------------------------
 # APP SECRET KEY (JWT Auth)
 # -----------------------------
@@ -0,0 +1,28 @@
+import atexit
+import os
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+# tests import the app as `src.…` from the repository root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# llm_client reads the model path at import time; no test loads the model
+os.environ.setdefault("LLAMA_MODEL_PATH", "models/test.gguf")
+
+# the index, chunk store and registry live under DATA_DIR; never touch the real one
+os.environ["DATA_DIR"] = tempfile.mkdtemp(prefix="rag-tests-")
+atexit.register(shutil.rmtree, os.environ["DATA_DIR"], True)
+
+
+@pytest.fixture
+def data_dir():
+    """An empty DATA_DIR (index directories recreated as the modules create them on import)."""
+    from src.app.services.segments import SEGMENT_DIR
+    from src.utils.config import DATA_DIR
+    shutil.rmtree(DATA_DIR, ignore_errors=True)
+    SEGMENT_DIR.mkdir(parents=True)
+    return DATA_DIR
@@ -0,0 +1,47 @@
+import numpy as np
+
+from src.app.services.answer_cache import SemanticAnswerCache
+
+
+def unit(seed: int, dim: int = 16) -> np.ndarray:
+    v = np.random.default_rng(seed).standard_normal(dim).astype(np.float32)
+    return v / np.linalg.norm(v)
+
+
+def make() -> SemanticAnswerCache:
+    return SemanticAnswerCache(threshold=0.95, max_items=8, ttl=3600, enabled=True)
+
+
+def test_hit_above_threshold_only():
+    cache = make()
+    cache.store(unit(0), "q", "answer", ["a.pdf"], version=1)
+    hit = cache.lookup(unit(0), version=1)
+    assert hit["answer"] == "answer" and hit["sources"] == ["a.pdf"]
+    assert cache.lookup(unit(1), version=1) is None
+
+
+def test_newer_version_drops_the_cache():
+    cache = make()
+    cache.store(unit(0), "q", "answer", [], version=1)
+    assert cache.lookup(unit(0), version=2) is None
+    assert cache.stats()["entries"] == 0
+    assert cache.stats()["content_version"] == 2
+
+
+def test_older_version_neither_hits_nor_resets():
+    cache = make()
+    cache.store(unit(0), "q", "new answer", [], version=2)
+    assert cache.lookup(unit(0), version=1) is None
+    cache.store(unit(1), "q", "stale answer", [], version=1)   # a request that read before the ingest
+    assert cache.stats() == {"entries": 1, "content_version": 2, "hits": 0, "misses": 1}
+    assert cache.lookup(unit(0), version=2)["answer"] == "new answer"
+    assert cache.lookup(unit(1), version=2) is None
+
+
+def test_eviction_keeps_newest_half():
+    cache = make()
+    for i in range(9):
+        cache.store(unit(i), f"q{i}", f"a{i}", [], version=1)
+    assert cache.stats()["entries"] == 5
+    assert cache.lookup(unit(0), version=1) is None
+    assert cache.lookup(unit(8), version=1)["answer"] == "a8"
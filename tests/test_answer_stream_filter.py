@@ -0,0 +1,65 @@
+import pytest
+
+from src.app.services.llm_client import AnswerStreamFilter, LLMClient
+
+
+def stream(pieces):
+    """What a client shows: token events appended, a reset clearing everything shown so far."""
+    filt = AnswerStreamFilter()
+    shown = ""
+    for piece in pieces:
+        for kind, text in filt.feed(piece):
+            shown = "" if kind == "reset" else shown + text
+    for _, text in filt.flush():
+        shown += text
+    return shown
+
+
+def batch(text):
+    return LLMClient.extract_final_answer(None, text)
+
+
+def splits(text, size):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+TEXTS = [
+    "<think>The user asks about leave.</think>Answer: Employees get **20 days** of leave.",
+    "Final answer: Use the `reset` link &lt;b&gt;today&lt;/b&gt;.",
+    "Submit the form <a href='x'>here</a> and wait for approval.",
+    "  Answer:   Two   weeks,\n\nnot three.  ",
+    "<think>draft</think>first try</think>The real answer is five.",
+]
+
+
+@pytest.mark.parametrize("text", TEXTS)
+@pytest.mark.parametrize("size", [1, 2, 3, 5, 7, 1000])
+def test_stream_matches_batch_cleanup(text, size):
+    assert stream(splits(text, size)) == batch(text)
+
+
+def test_tag_split_across_pieces_is_never_shown():
+    filt = AnswerStreamFilter()
+    shown = [text for piece in ["Click <sp", "an class='x", "'>here</sp", "an> now"] for _, text in filt.feed(piece)]
+    assert not any("<" in text or ">" in text for text in shown)
+    assert "".join(shown) + "".join(t for _, t in filt.flush()) == "Click here now"
+
+
+@pytest.mark.parametrize("pieces", [["Ans", "wer: yes"], ["Final ans", "wer: yes"], ["&l", "t;yes&g", "t;"]])
+def test_labels_and_entities_split_across_pieces(pieces):
+    assert stream(pieces) == "yes"
+
+
+def test_reasoning_block_is_hidden_until_it_ends():
+    filt = AnswerStreamFilter()
+    assert filt.feed("<thi") == []
+    assert filt.feed("nk>step one, step two") == []
+    assert filt.feed("</think> Done.") == [("token", "Done.")]
+
+
+def test_late_end_of_reasoning_resets_the_answer():
+    filt = AnswerStreamFilter()
+    assert filt.feed("Looks like ") == [("token", "Looks like")]
+    events = filt.feed("reasoning</think>Real answer")
+    assert events[0] == ("reset", "")
+    assert "".join(t for kind, t in events if kind == "token") + "".join(t for _, t in filt.flush()) == "Real answer"
@@ -0,0 +1,127 @@
+import threading
+import time
+
+import pytest
+
+from src.app.services import cache as cache_module
+from src.app.services.cache import LRUCache, estimate_size
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(cache_module, "time", clock)
+    return clock
+
+
+def test_lru_eviction_keeps_recently_used():
+    cache = LRUCache(max_items=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1   # "b" is now least recently used
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert cache.evictions == 1
+
+
+def test_ttl_expiry(clock):
+    cache = LRUCache(max_items=10, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2, ttl=5)
+    clock.now += 10
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    clock.now += 60
+    assert cache.get("a", "gone") == "gone"
+    assert cache.expirations == 2
+    assert len(cache) == 0
+
+
+def test_byte_budget_evicts_oldest_and_rejects_oversized():
+    value = "x" * 1000
+    size = estimate_size(value)
+    cache = LRUCache(max_items=100, max_bytes=3 * size)
+    for key in "abcd":
+        cache.set(key, value)
+    assert cache.bytes <= 3 * size
+    assert cache.get("a") is None
+    assert [cache.get(key) for key in "bcd"] == [value] * 3
+
+    cache.set("huge", "x" * (4 * size))
+    assert cache.get("huge") is None
+    assert cache.bytes == 3 * size
+
+
+def test_replacing_a_key_updates_the_byte_count():
+    cache = LRUCache(max_items=10, max_bytes=10 ** 6)
+    cache.set("a", "x" * 1000)
+    cache.set("a", "y")
+    assert cache.bytes == estimate_size("y")
+    cache.delete("a")
+    assert cache.bytes == 0
+
+
+def test_get_or_compute_runs_once_for_concurrent_misses():
+    cache = LRUCache(max_items=10)
+    release = threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        release.wait(5)
+        return "value"
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_compute("k", compute))) for _ in range(8)]
+    for t in threads:
+        t.start()
+    deadline = time.time() + 5
+    while cache.coalesced < 7 and time.time() < deadline:
+        time.sleep(0.01)
+    release.set()
+    for t in threads:
+        t.join(5)
+
+    assert len(calls) == 1
+    assert results == ["value"] * 8
+    assert cache.coalesced == 7
+    assert cache.get_or_compute("k", lambda: "other") == "value"
+
+
+def test_get_or_compute_error_reaches_waiters_and_is_not_cached():
+    cache = LRUCache(max_items=10)
+    release = threading.Event()
+
+    def fail():
+        release.wait(5)
+        raise ValueError("boom")
+
+    errors = []
+
+    def call():
+        try:
+            cache.get_or_compute("k", fail)
+        except ValueError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call) for _ in range(3)]
+    for t in threads:
+        t.start()
+    deadline = time.time() + 5
+    while cache.coalesced < 2 and time.time() < deadline:
+        time.sleep(0.01)
+    release.set()
+    for t in threads:
+        t.join(5)
+
+    assert len(errors) == 3
+    assert cache.get_or_compute("k", lambda: "ok") == "ok"
@@ -0,0 +1,80 @@
+from src.app.services.cascade import ALL, FEW, SKIP, RerankCascade
+
+
+class FakeReranker:
+    """Scores each chunk with a fixed number by id and records the pairs it was asked for."""
+
+    def __init__(self, scores):
+        self.scores = scores
+        self.calls = []
+
+    def score(self, queries, texts, ids):
+        self.calls.append(list(ids))
+        return [self.scores[i] for i in ids]
+
+
+def dense(*scores):
+    return [{"id": i, "text": f"chunk {i}", "faiss_score": s} for i, s in enumerate(scores)]
+
+
+def make(**kwargs) -> RerankCascade:
+    params = dict(
+        enabled=True, skip_margin=0.08, skip_z=2.0, few_margin=0.03, few_n=3,
+        fused_skip_margin=0.8, fused_few_margin=0.4, step=2, stable_k=2,
+    )
+    return RerankCascade(**{**params, **kwargs})
+
+
+def test_decisions_follow_the_retrieval_margin():
+    cascade = make()
+    assert cascade.decide(dense(0.9, 0.5, 0.5, 0.5, 0.5, 0.5))[0] == SKIP
+    assert cascade.decide(dense(0.55, 0.5, 0.5, 0.5, 0.49))[0] == FEW
+    assert cascade.decide(dense(0.51, 0.5, 0.5, 0.49))[0] == ALL
+    assert make(enabled=False).decide(dense(0.9, 0.5, 0.5, 0.5, 0.5, 0.5))[0] == ALL
+
+
+def test_hybrid_candidates_use_fused_scores_and_margins():
+    cascade = make()
+    # RRF scores: first in both lists vs. first in one list; faiss scores would say ALL
+    fused = [
+        {"id": i, "text": "", "faiss_score": 0.5, "fused_score": f}
+        for i, f in enumerate([2 / 61, 1 / 61, 1 / 62, 1 / 63, 1 / 64, 1 / 65])
+    ]
+    mode, conf = cascade.decide(fused)
+    assert conf["fused"] and round(conf["margin"], 6) == 1.0
+    assert mode == SKIP
+
+
+def test_skip_keeps_retrieval_order_without_scoring():
+    reranker = FakeReranker({})
+    ranked, decision = make().rerank(reranker, "q", dense(0.9, 0.5, 0.5, 0.5, 0.5, 0.5))
+    assert reranker.calls == [] and decision["reranked"] == 0
+    assert [c["id"] for c in ranked] == [0, 1, 2, 3, 4, 5]
+    assert all("rerank_score" not in c for c in ranked)
+
+
+def test_few_reranks_only_the_head():
+    reranker = FakeReranker({0: 0.1, 1: 0.9, 2: 0.5})
+    ranked, decision = make().rerank(reranker, "q", dense(0.55, 0.5, 0.5, 0.5, 0.49))
+    assert decision["mode"] == FEW and reranker.calls == [[0, 1, 2]]
+    assert [c["id"] for c in ranked] == [1, 2, 0, 3, 4]
+
+
+def test_all_stops_once_the_top_is_stable():
+    # the second step moves chunk 2 into the top 2, the third changes nothing; 6 and 7 are never scored
+    scores = {0: 5.0, 1: 4.0, 2: 4.5, 3: 0.5, 4: 3.0, 5: 0.0, 6: 9.0, 7: 9.0}
+    reranker = FakeReranker(scores)
+    ranked, decision = make().rerank(reranker, "q", dense(0.51, 0.5, 0.5, 0.5, 0.5, 0.5, 0.5, 0.49))
+    assert decision["mode"] == ALL and decision["early_stop"]
+    assert reranker.calls == [[0, 1], [2, 3], [4, 5]]
+    assert [c["id"] for c in ranked] == [0, 2, 1, 4, 3, 5, 6, 7]
+
+
+def test_batch_scores_every_selected_pair_in_one_pass():
+    reranker = FakeReranker({i: float(i) for i in range(8)})
+    cascade = make()
+    results = cascade.rerank_batch(reranker, ["a", "b"], [dense(0.9, 0.5, 0.5, 0.5, 0.5, 0.5), dense(0.51, 0.5, 0.5, 0.49)])
+    assert reranker.calls == [[0, 1, 2, 3]]
+    assert [d["mode"] for _, d in results] == [SKIP, ALL]
+    assert [c["id"] for c in results[1][0]] == [3, 2, 1, 0]
+    assert cascade.stats()["pairs_skipped"] == 6
@@ -0,0 +1,47 @@
+import numpy as np
+
+from src.app.services.chunk_store import ChunkStore
+
+
+def metas(source: str, n: int, page=None):
+    return [{"source": source, "chunk_index": i, **({"page": page} if page is not None else {})} for i in range(n)]
+
+
+def test_append_and_gather_round_trip(tmp_path):
+    store = ChunkStore(tmp_path)
+    assert store.append(0, ["alpha", "béta", "gamma"], metas("docs/a.pdf", 3, page=2)) == 0
+    assert store.append(3, ["delta"], metas("b.txt", 1)) == 3
+
+    batch = ChunkStore(tmp_path).gather(np.array([[3, 0], [1, 99]]))
+    assert [batch.text(i) for i in range(len(batch))] == ["delta", "alpha", "béta", ""]
+    assert batch.meta(0) == {"source": "b.txt", "chunk_index": 0}
+    assert batch.meta(2) == {"source": "docs/a.pdf", "chunk_index": 1, "page": 2}
+    assert batch.meta(3) == {} and batch.source(3) == ""
+
+
+def test_reader_snapshot_ignores_later_appends(tmp_path):
+    writer = ChunkStore(tmp_path)
+    writer.append(0, ["one"], metas("a", 1))
+    reader = ChunkStore(tmp_path)
+    writer.append(1, ["two"], metas("a", 1))
+    assert len(reader) == 1 and reader.gather([1]).text(0) == ""
+    assert ChunkStore(tmp_path).gather([1]).text(0) == "two"
+
+
+def test_sparse_ids_and_rows_for_sources(tmp_path):
+    store = ChunkStore(tmp_path)
+    store.append(0, ["a0", "b0"], [{"source": "a"}, {"source": "b"}], ids=np.array([0, 5]))
+    store.append(0, ["a1", "c0"], [{"source": "a"}, {"source": "c"}], ids=np.array([7, 9]))
+    assert not store.dense
+    assert store.rows([0, 5, 6, 7, 9, 10]).tolist() == [0, 1, -1, 2, 3, -1]
+    assert store.rows_for_sources(["a", "c", "missing"]).tolist() == [0, 2, 3]
+    assert store.ids_for_source("a").tolist() == [0, 7]
+
+
+def test_append_overwrites_an_uncommitted_tail(tmp_path):
+    store = ChunkStore(tmp_path)
+    store.append(0, ["a", "b", "c"], metas("x", 3))
+    store.append(1, ["B"], metas("y", 1))   # a re-run of an interrupted add from id 1
+    assert len(store) == 2
+    batch = store.gather([0, 1, 2])
+    assert [batch.text(i) for i in range(3)] == ["a", "B", ""]
@@ -0,0 +1,45 @@
+from src.app.services.doc_registry import DocumentRegistry, chunk_hash, file_hash
+
+
+def test_chunk_hash_includes_the_page():
+    assert chunk_hash("text", 1) != chunk_hash("text", 2)
+    assert chunk_hash("text", None) == chunk_hash("text", None)
+
+
+def test_unchanged_file_is_recognized_after_reload(tmp_path):
+    doc = tmp_path / "a.txt"
+    doc.write_text("hello")
+    registry = DocumentRegistry(tmp_path / "documents.json")
+    registry.pending = [str(doc)]
+    registry.record(str(doc), file_hash(str(doc)), [("h0", 0), ("h1", 1)])
+    registry.save()
+
+    reloaded = DocumentRegistry(tmp_path / "documents.json")
+    assert reloaded.is_unchanged(str(doc), file_hash(str(doc)))
+    assert not reloaded.pending and reloaded.live_ids() == 2
+    doc.write_text("hello again")
+    assert not reloaded.is_unchanged(str(doc), file_hash(str(doc)))
+
+
+def test_diff_keeps_matching_chunks_once(tmp_path):
+    registry = DocumentRegistry(tmp_path / "documents.json")
+    registry.record("a.txt", "digest", [("x", 10), ("y", 11), ("x", 12), ("z", 13)])
+    new_positions, kept, retired = registry.diff("a.txt", ["x", "w", "x", "x", "y"])
+    assert kept == {0: 10, 2: 12, 4: 11}
+    assert new_positions == [1, 3]
+    assert retired == [13]
+
+
+def test_diff_of_an_unknown_document_embeds_everything(tmp_path):
+    registry = DocumentRegistry(tmp_path / "documents.json")
+    assert registry.diff("new.txt", ["a", "b"]) == ([0, 1], {}, [])
+    assert registry.diff("old.txt", ["a", "b"], previous=[("b", 4)]) == ([0], {1: 4}, [])
+
+
+def test_forget_by_path_or_file_name(tmp_path):
+    registry = DocumentRegistry(tmp_path / "documents.json")
+    registry.record(str(tmp_path / "docs" / "Report.pdf"), "d1", [])
+    registry.record(str(tmp_path / "other.pdf"), "d2", [])
+    assert registry.forget("report.PDF") == [str(tmp_path / "docs" / "Report.pdf")]
+    assert registry.forget(str(tmp_path / "other.pdf")) == [str(tmp_path / "other.pdf")]
+    assert registry.documents == {}
@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+
+from src.app.services import vector_store
+from src.app.services.filters import make_filter, source_matches
+from src.app.services.vector_store import FaissStore
+
+DIM = 16
+
+
+def test_source_matches_full_path_or_file_name_ignoring_case():
+    assert source_matches("/data/uploads/Report.PDF", "report.pdf")
+    assert source_matches("/data/uploads/Report.PDF", "/DATA/uploads/report.pdf")
+    assert not source_matches("/data/uploads/Report.PDF", "uploads/report.pdf")
+    assert not source_matches("/data/uploads/Report.PDF", "report")
+
+
+def test_make_filter():
+    assert make_filter() is None and make_filter(sources=[" ", ""]) is None
+    flt = make_filter(sources=["b.pdf", " a.pdf "], page_to=3)
+    assert flt.sources == ["a.pdf", "b.pdf"]
+    assert flt.key() == "a.pdf|b.pdf:None:3"
+
+
+@pytest.fixture
+def store(data_dir):
+    """Three documents of 20 chunks; a.pdf and b.pdf have pages 1-5, notes.txt none."""
+    store = FaissStore(DIM)
+    rng = np.random.default_rng(0)
+    for source in ("docs/a.pdf", "docs/B.pdf", "notes.txt"):
+        vecs = rng.standard_normal((20, DIM)).astype(np.float32)
+        vecs /= np.linalg.norm(vecs, axis=1, keepdims=True)
+        metas = [
+            {"source": source, "chunk_index": i, **({"page": i // 4 + 1} if source.endswith(".pdf") else {})}
+            for i in range(20)
+        ]
+        store.add(vecs, metas, [f"{source} {i}" for i in range(20)])
+    return store
+
+
+def brute_force(store: FaissStore, q: np.ndarray, allowed, k: int):
+    ids, rows = store._live()
+    keep = np.isin(ids, allowed)
+    scores = np.asarray(store.vectors.data[rows[keep]]) @ q
+    return ids[keep][np.argsort(-scores)][:k].tolist()
+
+
+@pytest.mark.parametrize("exact_max", [10_000, 0])   # exact scoring vs. an IDSelectorBitmap over FAISS
+def test_filtered_search_matches_brute_force(store, monkeypatch, exact_max):
+    monkeypatch.setattr(vector_store, "FILTER_EXACT_MAX", exact_max)
+    store.retire([21, 22])
+    queries = np.random.default_rng(1).standard_normal((4, DIM)).astype(np.float32)
+    k = 5
+
+    flt = make_filter(sources=["b.pdf", "NOTES.TXT"])
+    allowed = list(range(20, 60))
+    for q, hits in zip(queries, store.search(queries, k=k, flt=flt)):
+        assert [h["id"] for h in hits] == brute_force(store, q, allowed, k)
+
+    flt = make_filter(sources=["a.pdf"], page_from=2, page_to=3)
+    for q, hits in zip(queries, store.search(queries, k=k, flt=flt)):
+        assert [h["id"] for h in hits] == brute_force(store, q, list(range(4, 12)), k)
+        assert all(2 <= h["meta"]["page"] <= 3 for h in hits)
+
+
+def test_page_range_never_matches_chunks_without_pages(store):
+    q = np.ones(DIM, dtype=np.float32)
+    hits = store.search(q, k=60, flt=make_filter(page_from=1))[0]
+    assert len(hits) == 40 and all(h["source"] != "notes.txt" for h in hits)
+    assert store.search(q, k=5, flt=make_filter(sources=["missing.pdf"]))[0] == []
@@ -0,0 +1,115 @@
+import random
+from collections import Counter
+
+import numpy as np
+import pytest
+
+from src.app.services import lexical
+from src.app.services.lexical import bm25_terms, bm25_weights, rrf_fuse, tokenize, write_lexical
+from src.utils.config import BM25_B, BM25_K1
+
+WORDS = [f"w{i}" for i in range(40)]
+
+
+@pytest.fixture(autouse=True)
+def faiss_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(lexical, "FAISS_DIR", tmp_path)
+    return tmp_path
+
+
+def corpus(rng: random.Random, n: int, first_id: int = 0):
+    # skewed term frequencies, so some terms have long postings and low idf
+    weights = [1.0 / (i + 1) for i in range(len(WORDS))]
+    texts = [" ".join(rng.choices(WORDS, weights, k=rng.randint(3, 40))) for _ in range(n)]
+    return list(range(first_id, first_id + n)), texts
+
+
+def brute_force(query: str, ids, texts, terms=None, avgdl=None):
+    """Exhaustive BM25 over every document: {id: score} for documents matching a query term."""
+    if terms is None:
+        docs = [tokenize(t) for t in texts]
+        n, total = len(docs), sum(len(d) for d in docs)
+        dfs = {}
+        for term in set(tokenize(query)):
+            df = sum(term in d for d in docs)
+            if df:
+                dfs[term] = df
+        terms, avgdl = bm25_weights(n, total, dfs)
+    scores = {}
+    for chunk_id, text in zip(ids, texts):
+        tokens = tokenize(text)
+        tf = Counter(tokens)
+        score = sum(
+            idf * tf[t] * (BM25_K1 + 1) / (tf[t] + BM25_K1 * (1 - BM25_B + BM25_B * len(tokens) / avgdl))
+            for t, idf in terms.items() if t in tf
+        )
+        if score > 0:
+            scores[chunk_id] = score
+    return scores
+
+
+def assert_top_k(got_scores, got_ids, expected, k):
+    best = sorted(expected.values(), reverse=True)[:k]
+    np.testing.assert_allclose(got_scores, best, rtol=1e-4)
+    for score, chunk_id in zip(got_scores, got_ids):
+        assert expected[int(chunk_id)] == pytest.approx(float(score), rel=1e-4)
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("k", [1, 5, 20])
+def test_maxscore_matches_brute_force(seed, k):
+    rng = random.Random(seed)
+    ids, texts = corpus(rng, 300)
+    seg = write_lexical(ids, texts)
+    for _ in range(20):
+        query = " ".join(rng.sample(WORDS, rng.randint(1, 5)))
+        terms, avgdl = bm25_terms(query, [seg])
+        scores, found = seg.search(terms, k, avgdl)
+        assert_top_k(scores, found, brute_force(query, ids, texts), k)
+
+
+def test_skip_mask_excludes_documents():
+    rng = random.Random(7)
+    ids, texts = corpus(rng, 200)
+    seg = write_lexical(ids, texts)
+    skip = np.zeros(len(ids), dtype=bool)
+    skip[::3] = True
+    query = "w0 w3 w11"
+    terms, avgdl = bm25_terms(query, [seg])
+    scores, found = seg.search(terms, 10, avgdl, skip=skip)
+
+    expected = brute_force(query, ids, texts, terms, avgdl)
+    expected = {i: s for i, s in expected.items() if not skip[ids.index(i)]}
+    assert not set(int(i) for i in found) & {ids[j] for j in np.flatnonzero(skip)}
+    assert_top_k(scores, found, expected, 10)
+
+
+def test_segments_pruned_by_theta_match_one_collection():
+    # what SegmentedIndex.lexical_search does: global statistics, k-th score carried across segments
+    rng = random.Random(11)
+    ids_a, texts_a = corpus(rng, 250)
+    ids_b, texts_b = corpus(rng, 120, first_id=1000)
+    segments = [write_lexical(ids_a, texts_a), write_lexical(ids_b, texts_b)]
+    k = 8
+    for _ in range(20):
+        query = " ".join(rng.sample(WORDS, rng.randint(1, 4)))
+        terms, avgdl = bm25_terms(query, segments)
+        D, I, theta = np.zeros(0, dtype=np.float32), np.zeros(0, dtype=np.int64), 0.0
+        for seg in segments:
+            d, i = seg.search(terms, k, avgdl, theta=theta)
+            D, I = np.concatenate([D, d]), np.concatenate([I, i])
+            order = np.argsort(-D, kind="stable")[:k]
+            D, I = D[order], I[order]
+            if len(D) >= k:
+                theta = float(D[-1])
+        assert_top_k(D, I, brute_force(query, ids_a + ids_b, texts_a + texts_b), k)
+
+
+def test_identifiers_are_indexed_whole_and_by_parts():
+    assert tokenize("See ERR-4012 in the hr_policy.v2") == ["see", "err-4012", "err", "4012", "hr_policy.v2", "hr", "policy", "v2"]
+
+
+def test_rrf_fuse():
+    ids, scores = rrf_fuse([np.array([1, 2, -1]), np.array([2, 3])], k=3, c=60)
+    assert list(ids) == [2, 1, 3]
+    assert scores[0] == pytest.approx(1 / 62 + 1 / 61)
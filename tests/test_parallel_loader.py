@@ -0,0 +1,44 @@
+import os
+
+import pytest
+
+from src.ingestion import parallel_loader
+
+
+def fake_task(kind, path, start=0, stop=None):
+    # runs in the spawned pool workers, which import it from this module
+    if "crash" in path:
+        os._exit(1)
+    if "error" in path:
+        raise ValueError("unreadable")
+    if kind == "pdf":
+        total = 5
+        return total, [f"page {i}" for i in range(start, min(stop, total))]
+    return {"source": path, "pages": [path]}
+
+
+@pytest.fixture(autouse=True)
+def fake_parser(monkeypatch):
+    monkeypatch.setattr(parallel_loader, "_run_task", fake_task)
+
+
+def load(paths, **kwargs):
+    return {path: (doc, error) for path, doc, error in parallel_loader.load_documents_parallel(paths, **kwargs)}
+
+
+def test_page_ranges_are_reassembled_in_order():
+    results = load(["a.pdf", "b.txt"], workers=2, pages_per_task=2)
+    assert results["a.pdf"] == ({"source": "a.pdf", "pages": [f"page {i}" for i in range(5)]}, None)
+    assert results["b.txt"] == ({"source": "b.txt", "pages": ["b.txt"]}, None)
+
+
+def test_a_crash_fails_only_its_own_document():
+    paths = ["a.txt", "crash.txt", "b.pdf", "error.txt", "c.txt"]
+    results = load(paths, workers=2, pages_per_task=2)
+    assert sorted(results) == sorted(paths)
+    assert results["crash.txt"] == (None, "worker process crashed while parsing")
+    assert results["error.txt"] == (None, "ValueError: unreadable")
+    for path in ("a.txt", "b.pdf", "c.txt"):
+        doc, error = results[path]
+        assert error is None and doc["source"] == path
+    assert len(results["b.pdf"][0]["pages"]) == 5
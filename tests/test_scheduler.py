@@ -0,0 +1,143 @@
+import threading
+import time
+
+import pytest
+
+from src.app.services.llm_client import GenerationCancelled
+from src.app.services.scheduler import InferenceScheduler, QueueFullError, QueueTimeout
+
+
+class FakeClient:
+    def __init__(self, slot):
+        self.slot = slot
+
+
+def make(slots=1, max_queue=2, queue_timeout=5.0, request_deadline=60.0):
+    created = []
+
+    def factory(i):
+        created.append(i)
+        return FakeClient(i)
+
+    return InferenceScheduler(slots, max_queue, queue_timeout, request_deadline, factory=factory), created
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline, "condition not reached"
+        time.sleep(0.01)
+
+
+def hold(sched):
+    """Occupy one slot until the returned release() is called."""
+    cm = sched.slot()
+    lease = cm.__enter__()
+    return lease, lambda: cm.__exit__(None, None, None)
+
+
+def test_slots_are_created_lazily_and_reused():
+    sched, created = make(slots=2)
+    with sched.slot() as a:
+        with sched.slot() as b:
+            assert {a.llm.slot, b.llm.slot} == {0, 1}
+    with sched.slot() as c:
+        assert c.llm.slot in (0, 1)
+    assert created == [0, 1]
+    stats = sched.stats()
+    assert stats["completed"] == 3 and stats["busy"] == 0 and stats["queued"] == 0
+
+
+def test_freed_slot_goes_to_the_oldest_waiter():
+    sched, _ = make(slots=1, max_queue=2)
+    _, release = hold(sched)
+    order = []
+
+    def request(name):
+        with sched.slot():
+            order.append(name)
+
+    first = threading.Thread(target=request, args=("first",))
+    first.start()
+    wait_for(lambda: sched.stats()["queued"] == 1)
+    second = threading.Thread(target=request, args=("second",))
+    second.start()
+    wait_for(lambda: sched.stats()["queued"] == 2)
+    release()
+    first.join(5)
+    second.join(5)
+    assert order == ["first", "second"]
+
+
+def test_full_queue_is_rejected():
+    sched, _ = make(slots=1, max_queue=1)
+    _, release = hold(sched)
+    waiter = threading.Thread(target=lambda: sched.slot().__enter__())
+    waiter.start()
+    wait_for(lambda: sched.stats()["queued"] == 1)
+    with pytest.raises(QueueFullError):
+        with sched.slot():
+            pass
+    assert sched.stats()["rejected"] == 1
+    release()
+    waiter.join(5)
+
+
+def test_queue_timeout():
+    sched, _ = make(slots=1)
+    _, release = hold(sched)
+    t0 = time.time()
+    with pytest.raises(QueueTimeout):
+        with sched.slot(queue_timeout=0.2):
+            pass
+    assert time.time() - t0 < 2
+    stats = sched.stats()
+    assert stats["timed_out"] == 1 and stats["queued"] == 0
+    release()
+    with sched.slot():   # the slot is still usable
+        pass
+
+
+def test_cancel_while_queued():
+    sched, _ = make(slots=1)
+    _, release = hold(sched)
+    cancel = threading.Event()
+    errors = []
+
+    def request():
+        try:
+            with sched.slot(cancel):
+                pass
+        except GenerationCancelled as e:
+            errors.append(e)
+
+    t = threading.Thread(target=request)
+    t.start()
+    wait_for(lambda: sched.stats()["queued"] == 1)
+    cancel.set()
+    t.join(5)
+    assert len(errors) == 1
+    stats = sched.stats()
+    assert stats["cancelled"] == 1 and stats["queued"] == 0
+    release()
+    assert sched.stats()["busy"] == 0
+
+
+def test_cancel_during_generation_releases_the_slot():
+    sched, _ = make(slots=1)
+    cancel = threading.Event()
+    with pytest.raises(GenerationCancelled):
+        with sched.slot(cancel) as lease:
+            assert not lease.should_stop()
+            cancel.set()
+            assert lease.should_stop()
+            raise GenerationCancelled()
+    stats = sched.stats()
+    assert stats["cancelled"] == 1 and stats["busy"] == 0
+
+
+def test_request_deadline_stops_generation():
+    sched, _ = make(slots=1, request_deadline=0.05)
+    with sched.slot() as lease:
+        time.sleep(0.1)
+        assert lease.should_stop()
@@ -0,0 +1,56 @@
+import numpy as np
+
+from src.app.services.segments import SEGMENT_DIR
+from src.app.services.vector_store import FaissStore, read_manifest
+
+DIM = 16
+
+
+def vectors(n: int, seed: int) -> np.ndarray:
+    v = np.random.default_rng(seed).standard_normal((n, DIM)).astype(np.float32)
+    return v / np.linalg.norm(v, axis=1, keepdims=True)
+
+
+def add_batches(store: FaissStore, batches: int, size: int = 3):
+    for b in range(batches):
+        texts = [f"batch {b} chunk {i}" for i in range(size)]
+        store.add(vectors(size, b), [{"source": f"doc{b}.txt", "chunk_index": i} for i in range(size)], texts)
+
+
+def segment_files():
+    return sorted(p.name for p in SEGMENT_DIR.glob("seg-*.faiss"))
+
+
+def test_each_add_writes_one_new_segment(data_dir):
+    store = FaissStore(DIM)
+    add_batches(store, 2)
+    first = [e["file"] for e in read_manifest()["segments"]]
+    add_batches(store, 1)
+    entries = read_manifest()["segments"]
+    assert [e["file"] for e in entries[:2]] == first   # existing segments are not rewritten
+    assert [e["ntotal"] for e in entries] == [3, 3, 3]
+    assert FaissStore(DIM).index.ntotal == 9
+
+
+def test_merge_folds_smallest_segments_and_drops_retired(data_dir):
+    store = FaissStore(DIM)
+    add_batches(store, 5)
+    store.retire([0, 4])
+    queries = vectors(4, 99)
+    before = [[h["id"] for h in hits] for hits in store.search(queries, k=6)]
+    manifest = read_manifest()
+
+    assert store.merge_segments(max_segments=5) is None
+    report = store.merge_segments(max_segments=3, fanin=3)
+    assert report == {"shard": 0, "merged_segments": 3, "vectors": 7, "segments": 3}
+
+    reloaded = read_manifest()
+    assert reloaded["generation"] == manifest["generation"] + 1
+    assert reloaded["content_version"] == manifest["content_version"]   # merges keep result caches
+    reader = FaissStore(DIM)
+    assert reader.index.ntotal == 13
+    assert [[h["id"] for h in hits] for hits in reader.search(queries, k=6)] == before
+    # the previous generation's files are kept for late readers, older ones removed
+    assert len(segment_files()) == 5 + 1
+    reader.publish()
+    assert len(segment_files()) == 3
@@ -0,0 +1,97 @@
+import random
+
+import numpy as np
+import pytest
+
+from src.app.services import vector_store
+from src.app.services.lexical import bm25_terms, bm25_weights, collection_stats, write_lexical
+from src.app.services.shards import ShardRouter
+from src.app.services.vector_store import FaissStore
+
+DIM = 16
+WORDS = [f"w{i}" for i in range(30)]
+
+
+def corpus(rng: random.Random, n: int):
+    return [" ".join(rng.choices(WORDS, k=rng.randint(3, 20))) for _ in range(n)]
+
+
+def test_summed_shard_statistics_equal_the_collection_statistics(data_dir):
+    rng = random.Random(0)
+    a = write_lexical(range(0, 50), corpus(rng, 50))
+    b = write_lexical(range(50, 80), corpus(rng, 30))
+    query = "w1 w7 w29 unseen"
+    n_a, len_a, dfs_a = collection_stats(query, [a])
+    n_b, len_b, dfs_b = collection_stats(query, [b])
+    dfs = {t: dfs_a.get(t, 0) + dfs_b.get(t, 0) for t in set(dfs_a) | set(dfs_b)}
+    assert bm25_weights(n_a + n_b, len_a + len_b, dfs) == bm25_terms(query, [a, b])
+
+    answers = ShardRouter._sum_stats([[(n_a, len_a, dfs_a)], None, [(n_b, len_b, dfs_b)]], rows=1)
+    assert answers == [(n_a + n_b, len_a + len_b, dfs)]
+    assert ShardRouter._sum_stats([None, None], rows=1) is None
+
+
+def test_fuse_keeps_exact_scores_and_orders_by_rrf():
+    dense = [{"id": 1, "score": 0.1, "exact": 0.9}, {"id": 2, "score": 0.1, "exact": 0.8}]
+    lexical = [{"id": 2, "score": 0.8, "bm25": 7.0}, {"id": 3, "score": 0.2, "bm25": 3.0}]
+    hits = ShardRouter._fuse(dense, lexical, k=3)
+    assert [h["id"] for h in hits] == [2, 1, 3]
+    assert [h["score"] for h in hits] == [0.8, 0.9, 0.2]
+    assert all("bm25" not in h and "exact" not in h for h in hits)
+    assert hits[0]["fused"] > hits[1]["fused"] > hits[2]["fused"]
+
+
+@pytest.fixture
+def sharded(data_dir, monkeypatch):
+    """Four ingest batches over two shards, and a router with two local shard workers."""
+    monkeypatch.setenv("INDEX_SHARDS", "2")   # read by the spawned workers
+    monkeypatch.setattr(vector_store, "INDEX_SHARDS", 2)
+    rng = random.Random(1)
+    # distinct document lengths, so no two chunks tie on BM25 score and both orders are unique
+    lengths = rng.sample(range(3, 83), 80)
+    texts = [" ".join(rng.choices(WORDS, k=n)) for n in lengths]
+    vectors = np.random.default_rng(1).standard_normal((80, DIM)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    store = FaissStore(DIM)
+    for b in range(4):
+        rows = slice(20 * b, 20 * (b + 1))
+        store.add(vectors[rows], [{"source": f"doc{b}.txt", "chunk_index": i} for i in range(20)], texts[rows])
+    store.retire([3, 41])
+    assert sorted(seg.shard for seg in store.index.segments) == [0, 0, 1, 1]
+
+    router = ShardRouter(shards=2, addresses=[], timeout=10)
+    assert router.wait_ready(DIM, timeout=60)
+    yield FaissStore(DIM), router
+    for proc in router._procs:
+        proc.kill()
+        proc.join()
+
+
+def test_sharded_search_matches_a_single_store(sharded):
+    store, router = sharded
+    queries = np.random.default_rng(2).standard_normal((3, DIM)).astype(np.float32)
+    texts = ["w0 w5", "w12 w3 w3", "w29"]
+
+    for single, split in zip(store.search(queries, k=6), router.search(queries, k=6)):
+        assert [h["id"] for h in split] == [h["id"] for h in single]
+        assert [h["score"] for h in split] == pytest.approx([h["score"] for h in single])
+
+    for single, split in zip(store.search(queries, k=80, query_text=texts), router.search(queries, k=80, query_text=texts)):
+        # every live chunk is in the dense list, so both fuse the same complete rankings
+        assert {h["id"]: h["fused"] for h in split} == pytest.approx({h["id"]: h["fused"] for h in single})
+        assert {h["id"]: h["score"] for h in split} == pytest.approx({h["id"]: h["score"] for h in single})
+        assert 3 not in {h["id"] for h in split} and 41 not in {h["id"] for h in split}
+    assert router.partial == 0
+
+
+def test_dead_shard_worker_is_restarted(sharded):
+    store, router = sharded
+    proc = router._procs[1]
+    proc.kill()
+    proc.join()
+    assert not router.restart(-1)
+    assert router.restart(proc.pid)
+    assert router._procs[1].pid != proc.pid
+    assert router.wait_ready(DIM, timeout=60)
+    q = np.random.default_rng(3).standard_normal(DIM).astype(np.float32)
+    assert [h["id"] for h in router.search(q, k=5)[0]] == [h["id"] for h in store.search(q, k=5)[0]]
@@ -0,0 +1,57 @@
+import numpy as np
+
+from src.app.services.vector_store import FaissStore, read_manifest
+
+DIM = 16
+
+
+def vectors(n: int, seed: int) -> np.ndarray:
+    v = np.random.default_rng(seed).standard_normal((n, DIM)).astype(np.float32)
+    return v / np.linalg.norm(v, axis=1, keepdims=True)
+
+
+def add(store: FaissStore, source: str, vecs: np.ndarray):
+    texts = [f"{source} chunk {i}" for i in range(len(vecs))]
+    store.add(vecs, [{"source": source, "chunk_index": i} for i in range(len(vecs))], texts)
+
+
+def ids_of(hits):
+    return [h["id"] for h in hits]
+
+
+def test_retired_ids_are_hidden_at_once(data_dir):
+    a, b = vectors(5, 0), vectors(5, 1)
+    store = FaissStore(DIM)
+    add(store, "a.txt", a)
+    add(store, "b.txt", b)
+    version = read_manifest()["content_version"]
+
+    store.retire(store.chunks.ids_for_source("a.txt"))
+    reader = FaissStore(DIM)
+    assert read_manifest()["content_version"] == version + 1
+    assert reader.garbage_ratio() == 0.5
+    for q in a:
+        hits = reader.search(q, k=10)[0]
+        assert len(hits) == 5 and all(h["source"] == "b.txt" for h in hits)
+
+
+def test_compaction_drops_retired_chunks_and_keeps_ids(data_dir):
+    a, b = vectors(6, 0), vectors(4, 1)
+    store = FaissStore(DIM)
+    add(store, "a.txt", a)
+    add(store, "b.txt", b)
+    store.retire([0, 2, 4])
+    before = [ids_of(h) for h in store.search(b, k=5)]
+    version = read_manifest()["content_version"]
+
+    report = store.compact()
+    assert report["before"]["ntotal"] == 10 and report["after"]["ntotal"] == 7
+    reader = FaissStore(DIM)
+    assert len(reader.retired) == 0 and len(reader.chunks) == 7
+    assert reader.chunks.ids.tolist() == [1, 3, 5, 6, 7, 8, 9]
+    assert [ids_of(h) for h in reader.search(b, k=5)] == before
+    assert reader.search(a[1], k=1)[0][0]["id"] == 1
+    assert read_manifest()["content_version"] == version   # same searchable content
+
+    add(reader, "c.txt", vectors(1, 2))   # ids are never reused
+    assert FaissStore(DIM).chunks.ids.tolist()[-1] == 10
@@ -1,7 +1,9 @@
 import streamlit as st
 import requests
 import html
+import json
 import re
+import time
 
 # ---------------------------
 # CONFIG
@@ -9,6 +11,7 @@ import re
 API_BASE = "http://127.0.0.1:8000"
 LOGIN_ENDPOINT = f"{API_BASE}/login"
 CHAT_ENDPOINT = f"{API_BASE}/chat"
+CHAT_STREAM_ENDPOINT = f"{API_BASE}/chat/stream"
 INGEST_ENDPOINT = f"{API_BASE}/ingest"
 
 st.set_page_config(
@@ -27,6 +30,8 @@ if "messages" not in st.session_state:
     st.session_state.messages = []
 if "current_page" not in st.session_state:
     st.session_state.current_page = "chat"
+if "stream" not in st.session_state:
+    st.session_state.stream = True
 
 # ---------------------------
 # FLOATING SIDEBAR TOGGLE
@@ -132,6 +137,53 @@ def sanitize_text(text: str) -> str:
     return re.sub(r"<[^>]+>", "", text).strip()
 
 
+def iter_sse(resp):
+    """Yield (event, data) pairs from a text/event-stream response."""
+    event, data = "message", []
+    for line in resp.iter_lines(decode_unicode=True):
+        if line is None:
+            continue
+        if line == "":
+            if data:
+                yield event, json.loads("\n".join(data))
+            event, data = "message", []
+        elif line.startswith("event:"):
+            event = line[len("event:"):].strip()
+        elif line.startswith("data:"):
+            data.append(line[len("data:"):].strip())
+
+
+def stream_answer(query: str, placeholder):
+    """Render tokens into `placeholder` as they arrive; returns (answer, sources)."""
+    answer, sources = "", []
+    with requests.get(
+        CHAT_STREAM_ENDPOINT,
+        params={"q": query},
+        headers={"Authorization": f"Bearer {st.session_state.token}"},
+        stream=True,
+    ) as resp:
+        if resp.status_code != 200:
+            raise RuntimeError("Server error")
+        for event, data in iter_sse(resp):
+            if event == "sources":
+                sources = data.get("sources", [])
+            elif event == "token":
+                answer += data.get("text", "")
+            elif event == "reset":
+                answer = ""
+            elif event == "done":
+                answer = data.get("answer", answer)
+                sources = data.get("sources", sources)
+            elif event == "error":
+                raise RuntimeError(data.get("detail", "Server error"))
+            shown = html.escape(sanitize_text(answer)).replace("\n", "<br>")
+            placeholder.markdown(
+                f'<div class="assistant-message"><b>Assistant</b><br>{shown}</div>',
+                unsafe_allow_html=True
+            )
+    return answer, sources
+
+
 # ---------------------------
 # LOGIN
 # ---------------------------
@@ -182,6 +234,8 @@ with st.sidebar:
 
     st.markdown("---")
 
+    st.session_state.stream = st.toggle("Stream responses", value=st.session_state.stream)
+
     if st.button("🗑 Clear Chat", use_container_width=True):
         st.session_state.messages = []
         st.rerun()
@@ -226,25 +280,37 @@ if st.session_state.current_page == "chat":
     with st.form("chat_form", clear_on_submit=True):
         query = st.text_input("Ask something...")
         if st.form_submit_button("Send") and query.strip():
-            with st.spinner("Thinking..."):
+            if st.session_state.stream:
                 try:
-                    resp = requests.get(
-                        CHAT_ENDPOINT,
-                        params={"q": query},
-                        headers={"Authorization": f"Bearer {st.session_state.token}"}
-                    )
-                    if resp.status_code == 200:
-                        data = resp.json()
-                        st.session_state.messages.append({
-                            "question": query,
-                            "answer": sanitize_text(data["answer"]),
-                            "sources": data.get("sources", [])
-                        })
-                        st.rerun()
-                    else:
-                        st.error("Server error")
+                    answer, sources = stream_answer(query, st.empty())
+                    st.session_state.messages.append({
+                        "question": query,
+                        "answer": sanitize_text(answer),
+                        "sources": sources
+                    })
+                    st.rerun()
                 except Exception as e:
                     st.error(str(e))
+            else:
+                with st.spinner("Thinking..."):
+                    try:
+                        resp = requests.get(
+                            CHAT_ENDPOINT,
+                            params={"q": query},
+                            headers={"Authorization": f"Bearer {st.session_state.token}"}
+                        )
+                        if resp.status_code == 200:
+                            data = resp.json()
+                            st.session_state.messages.append({
+                                "question": query,
+                                "answer": sanitize_text(data["answer"]),
+                                "sources": data.get("sources", [])
+                            })
+                            st.rerun()
+                        else:
+                            st.error("Server error")
+                    except Exception as e:
+                        st.error(str(e))
 
 # ---------------------------
 # UPLOAD PAGE
@@ -272,8 +338,27 @@ elif st.session_state.current_page == "upload":
                         headers={"Authorization": f"Bearer {st.session_state.token}"}
                     )
                     if resp.status_code == 200:
-                        st.success("Documents ingested successfully!")
-                        st.json(resp.json())
+                        job_id = resp.json()["job_id"]
+                        status_box = st.empty()
+                        while True:
+                            job = requests.get(
+                                f"{INGEST_ENDPOINT}/{job_id}",
+                                headers={"Authorization": f"Bearer {st.session_state.token}"}
+                            ).json()
+                            p = job["progress"]
+                            status_box.info(
+                                f"{job['status']}: {p['documents']}/{p['total_documents']} documents, "
+                                f"{p['parsed_pages']} pages, {p['chunks']} chunks, "
+                                f"{p['embedded']} embedded, {p['indexed']} indexed"
+                            )
+                            if job["status"] in ("done", "failed", "cancelled"):
+                                break
+                            time.sleep(1)
+                        if job["status"] == "done":
+                            st.success("Documents ingested successfully!")
+                        else:
+                            st.error(f"Ingestion {job['status']}: {job.get('error') or ''}")
+                        st.json(job)
                     else:
                         st.error("Failed to ingest documents")
                 except Exception as e: